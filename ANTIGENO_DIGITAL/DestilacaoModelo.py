@@ -0,0 +1,210 @@
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from transformers import AutoTokenizer, AutoConfig, AutoModelForSequenceClassification, TrainingArguments, Trainer, DataCollatorWithPadding
+from datasets import Dataset, DatasetDict
+import torch
+import torch.nn.functional as F
+import numpy as np
+import time
+from sklearn.metrics import precision_recall_fscore_support
+import os
+os.environ["WANDB_DISABLED"] = "true"
+
+# Destilação de conhecimento: treina um modelo ALUNO compacto (menos camadas) usando o
+# modelo_detector_injecao_v3 como PROFESSOR. O aluno aprende com os labels do CSV e com as
+# probabilidades suaves do professor, e é salvo no mesmo formato dos outros modelos, para que
+# classifier/model.py o carregue via MODEL_NAME (ou ANTIGENO_MODEL_NAME).
+# Execute a partir da raiz do repositório: python ANTIGENO_DIGITAL/DestilacaoModelo.py
+
+# --- 1. Configurações Iniciais ---
+CAMINHO_DO_SEU_CSV = "ANTIGENO_DIGITAL/dataset_treino_final_embaralhado.csv"
+COLUNA_TEXTO = "prompt_text"
+COLUNA_LABEL_ORIGINAL = "classificacao_esperada"
+
+MODELO_PROFESSOR = "ANTIGENO_DIGITAL/modelo_detector_injecao_v3"
+NOME_DO_MODELO_ALUNO = "integração/classifier/modelo_detector_injecao_destilado"
+
+NUM_CAMADAS_ALUNO = 4 # O professor (BERTimbau-base) tem 12
+TAMANHO_OCULTO_ALUNO = None # None = mantém 768 e copia pesos do professor; outro valor = aluno inicializado do zero
+TEMPERATURA_DESTILACAO = 2.0
+PESO_PERDA_DESTILACAO = 0.7 # ALFA: peso da KL com o professor; (1 - ALFA) fica com a entropia cruzada dos labels
+
+NUM_EPOCHS_TREINO = 5
+TAMANHO_BATCH_TREINO = 16
+TAMANHO_BATCH_AVALIACAO = 64
+TAXA_APRENDIZAGEM = 5e-5
+PROPORCAO_TESTE = 0.1
+PROPORCAO_VALIDACAO = 0.1
+MAX_TOKENS = 512
+AMOSTRAS_LATENCIA = 100 # Prompts usados na medição de latência (batch de 1, CPU)
+
+# --- 2. Carregar e Preparar o Dataset (mesma limpeza e divisão do FineTuningModelo.py) ---
+print(f"Carregando dataset de: {CAMINHO_DO_SEU_CSV}")
+try:
+    df_completo = pd.read_csv(CAMINHO_DO_SEU_CSV, encoding="utf-8")
+except Exception as e:
+    print(f"ERRO ao carregar o CSV: {e}")
+    exit()
+
+df_completo[COLUNA_LABEL_ORIGINAL] = df_completo[COLUNA_LABEL_ORIGINAL].astype(str).str.replace('\xa0', '', regex=False).str.strip().str.upper()
+df_completo[COLUNA_LABEL_ORIGINAL] = df_completo[COLUNA_LABEL_ORIGINAL].replace({'SEGUR': 'SEGURO'})
+label_map = {"SEGURO": 0, "INSEGURO": 1, "INJECAO": 1}
+df_para_dataset = pd.DataFrame({
+    'text': df_completo[COLUNA_TEXTO],
+    'label': df_completo[COLUNA_LABEL_ORIGINAL].map(label_map),
+}).dropna()
+df_para_dataset['label'] = df_para_dataset['label'].astype(int)
+
+df_treino_val, df_teste = train_test_split(
+    df_para_dataset, test_size=PROPORCAO_TESTE, random_state=42, stratify=df_para_dataset['label']
+)
+df_treino, df_validacao = train_test_split(
+    df_treino_val, test_size=PROPORCAO_VALIDACAO / (1.0 - PROPORCAO_TESTE),
+    random_state=42, stratify=df_treino_val['label']
+)
+dataset_dict = DatasetDict({
+    'train': Dataset.from_pandas(df_treino, preserve_index=False),
+    'validation': Dataset.from_pandas(df_validacao, preserve_index=False),
+    'test': Dataset.from_pandas(df_teste, preserve_index=False),
+})
+print(dataset_dict)
+
+# --- 3. Professor e Aluno ---
+print(f"\nCarregando professor: {MODELO_PROFESSOR}")
+try:
+    tokenizer = AutoTokenizer.from_pretrained(MODELO_PROFESSOR)
+    professor = AutoModelForSequenceClassification.from_pretrained(MODELO_PROFESSOR).eval()
+except Exception as e:
+    print(f"ERRO ao carregar o professor: {e}")
+    exit()
+
+config_aluno = AutoConfig.from_pretrained(MODELO_PROFESSOR)
+config_aluno.num_hidden_layers = NUM_CAMADAS_ALUNO
+
+if TAMANHO_OCULTO_ALUNO is None:
+    aluno = AutoModelForSequenceClassification.from_config(config_aluno)
+    # Inicializa o aluno com camadas espaçadas do professor (ex: 4 de 12 -> camadas 2, 5, 8, 11),
+    # além de embeddings, pooler e cabeça de classificação.
+    passo = professor.config.num_hidden_layers // NUM_CAMADAS_ALUNO
+    camadas_copiadas = [passo * (i + 1) - 1 for i in range(NUM_CAMADAS_ALUNO)]
+    estado_aluno = {}
+    for nome, tensor in professor.state_dict().items():
+        if ".encoder.layer." in nome:
+            prefixo, resto = nome.split(".encoder.layer.", 1)
+            indice_camada, sufixo = resto.split(".", 1)
+            if int(indice_camada) not in camadas_copiadas:
+                continue
+            nome = f"{prefixo}.encoder.layer.{camadas_copiadas.index(int(indice_camada))}.{sufixo}"
+        estado_aluno[nome] = tensor.clone()
+    aluno.load_state_dict(estado_aluno, strict=False)
+    print(f"Aluno com {NUM_CAMADAS_ALUNO} camadas inicializado a partir das camadas {camadas_copiadas} do professor.")
+else:
+    config_aluno.hidden_size = TAMANHO_OCULTO_ALUNO
+    config_aluno.intermediate_size = TAMANHO_OCULTO_ALUNO * 4
+    config_aluno.num_attention_heads = max(TAMANHO_OCULTO_ALUNO // 64, 1)
+    aluno = AutoModelForSequenceClassification.from_config(config_aluno)
+    print(f"AVISO: aluno com hidden_size={TAMANHO_OCULTO_ALUNO} é inicializado do zero (pesos do professor não são compatíveis).")
+
+# --- 4. Tokenização e rótulos suaves do professor ---
+print("\nTokenizando os datasets...")
+def tokenizar_funcao(exemplos):
+    return tokenizer(exemplos["text"], truncation=True, max_length=MAX_TOKENS)
+dataset_tokenizado = dataset_dict.map(tokenizar_funcao, batched=True)
+
+print("Calculando os rótulos suaves (logits) do professor para o conjunto de treino...")
+def logits_professor_funcao(exemplos):
+    entradas = tokenizer.pad(
+        {chave: exemplos[chave] for chave in ("input_ids", "attention_mask", "token_type_ids")},
+        return_tensors="pt",
+    )
+    with torch.inference_mode():
+        return {"logits_professor": professor(**entradas).logits.tolist()}
+dataset_tokenizado["train"] = dataset_tokenizado["train"].map(logits_professor_funcao, batched=True, batch_size=TAMANHO_BATCH_AVALIACAO)
+dataset_tokenizado = dataset_tokenizado.remove_columns(["text"])
+
+# --- 5. Treinamento com perda de destilação ---
+class TrainerDestilacao(Trainer):
+    """Perda = ALFA * KL(aluno || professor, com temperatura) + (1 - ALFA) * entropia cruzada com os labels."""
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        logits_professor = inputs.pop("logits_professor", None)
+        saidas = model(**inputs)
+        perda = saidas.loss
+        if logits_professor is not None:
+            perda_destilacao = F.kl_div(
+                F.log_softmax(saidas.logits / TEMPERATURA_DESTILACAO, dim=-1),
+                F.softmax(logits_professor / TEMPERATURA_DESTILACAO, dim=-1),
+                reduction="batchmean",
+            ) * (TEMPERATURA_DESTILACAO ** 2)
+            perda = PESO_PERDA_DESTILACAO * perda_destilacao + (1.0 - PESO_PERDA_DESTILACAO) * saidas.loss
+        return (perda, saidas) if return_outputs else perda
+
+def compute_metrics(eval_pred):
+    logits, labels = eval_pred
+    predictions = np.argmax(logits, axis=-1)
+    precision, recall, f1, _ = precision_recall_fscore_support(labels, predictions, average='binary', pos_label=1, zero_division=0)
+    return {'precision': precision, 'recall': recall, 'f1': f1}
+
+training_args = TrainingArguments(
+    output_dir=f"{NOME_DO_MODELO_ALUNO}_checkpoints",
+    num_train_epochs=NUM_EPOCHS_TREINO,
+    per_device_train_batch_size=TAMANHO_BATCH_TREINO,
+    learning_rate=TAXA_APRENDIZAGEM,
+    warmup_steps=100,
+    weight_decay=0.01,
+    logging_steps=50,
+    remove_unused_columns=False, # Mantém 'logits_professor' nos lotes
+)
+trainer = TrainerDestilacao(
+    model=aluno, args=training_args,
+    train_dataset=dataset_tokenizado["train"], eval_dataset=dataset_tokenizado["validation"],
+    tokenizer=tokenizer, data_collator=DataCollatorWithPadding(tokenizer), compute_metrics=compute_metrics,
+)
+
+print("\nIniciando a destilação...")
+try:
+    trainer.train()
+    print("Destilação concluída!")
+except Exception as e_train:
+    print(f"ERRO durante a destilação: {e_train}")
+    exit()
+
+print(f"\nSalvando o aluno em: {NOME_DO_MODELO_ALUNO}")
+try:
+    trainer.save_model(NOME_DO_MODELO_ALUNO)
+    tokenizer.save_pretrained(NOME_DO_MODELO_ALUNO)
+except Exception as e_save:
+    print(f"ERRO ao salvar o aluno: {e_save}")
+
+# --- 6. Relatório: professor x aluno (qualidade e latência) ---
+def avaliar(modelo, nome):
+    modelo = modelo.eval().to("cpu")
+    textos, labels = dataset_dict["test"]["text"], dataset_dict["test"]["label"]
+    predicoes = []
+    with torch.inference_mode():
+        for inicio in range(0, len(textos), TAMANHO_BATCH_AVALIACAO):
+            entradas = tokenizer(textos[inicio:inicio + TAMANHO_BATCH_AVALIACAO], padding=True, truncation=True, max_length=MAX_TOKENS, return_tensors="pt")
+            predicoes.extend(modelo(**entradas).logits.argmax(dim=-1).tolist())
+        precision, recall, _, _ = precision_recall_fscore_support(labels, predicoes, average='binary', pos_label=1, zero_division=0)
+
+        latencias_ms = []
+        for texto in textos[:AMOSTRAS_LATENCIA]:
+            entradas = tokenizer(texto, truncation=True, max_length=MAX_TOKENS, return_tensors="pt")
+            inicio = time.perf_counter()
+            modelo(**entradas)
+            latencias_ms.append((time.perf_counter() - inicio) * 1000)
+    return {
+        "modelo": nome,
+        "camadas": modelo.config.num_hidden_layers,
+        "parametros_M": sum(p.numel() for p in modelo.parameters()) / 1e6,
+        "recall": recall,
+        "precisao": precision,
+        "latencia_p50_ms": float(np.percentile(latencias_ms, 50)),
+        "latencia_p95_ms": float(np.percentile(latencias_ms, 95)),
+    }
+
+print("\n--- Professor x Aluno no Conjunto de Teste (CPU, batch de 1 para latência) ---")
+relatorio = pd.DataFrame([avaliar(professor, "professor (v3)"), avaliar(trainer.model, "aluno (destilado)")])
+print(relatorio.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+ganho = relatorio["latencia_p50_ms"].iloc[0] / relatorio["latencia_p50_ms"].iloc[1]
+print(f"\nAluno {ganho:.1f}x mais rápido (p50).")
+print(f"Para usá-lo no bot: ANTIGENO_MODEL_NAME={os.path.basename(NOME_DO_MODELO_ALUNO)}")
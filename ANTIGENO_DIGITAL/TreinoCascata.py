@@ -0,0 +1,153 @@
+import pandas as pd
+import numpy as np
+import joblib
+import os
+from sklearn.model_selection import train_test_split
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import precision_score, recall_score
+from transformers.pipelines import pipeline
+
+# Treina o PRIMEIRO ESTÁGIO da cascata (modelo linear sobre n-gramas de caracteres)
+# e escolhe os limiares de decisão antecipada de forma que o recall da cascata
+# completa (linear + BERT na faixa incerta) não fique abaixo do recall do BERT sozinho.
+# O conjunto separado pelo FineTuningModelo.py é dividido em dois: os limiares são
+# escolhidos na validação e os números salvos no artefato são medidos no teste.
+# Os limiares respeitam o limiar de bloqueio do Antígeno: o estágio 1 só declara
+# INJECAO com p >= LIMIAR_PROB_INJECAO_BLOQUEIO e SEGURO com p abaixo dele
+# (integração/classifier/cascata.py recusa artefatos que não respeitem isso).
+# Execute a partir da raiz do repositório: python ANTIGENO_DIGITAL/TreinoCascata.py
+
+# --- 1. Configurações Iniciais ---
+CAMINHO_DO_SEU_CSV = "ANTIGENO_DIGITAL/dataset_treino_final_embaralhado.csv"
+COLUNA_TEXTO = "prompt_text"
+COLUNA_LABEL_ORIGINAL = "classificacao_esperada"
+
+MODELO_BERT = "integração/classifier/modelo_detector_injecao_v3" # Estágio 2 (o mesmo usado pelo bot)
+CAMINHO_SAIDA_CASCATA = "integração/classifier/modelo_cascata/cascata.joblib"
+
+PROPORCAO_TESTE = 0.1 # Mesma divisão (e semente) usada no FineTuningModelo.py
+PROPORCAO_VALIDACAO = 0.5 # Fração do conjunto separado usada para escolher os limiares
+LIMIAR_PROB_INJECAO_BLOQUEIO = 0.5 # Mesmo limiar de antigeno_digital.py
+TOLERANCIA_PRECISAO = 0.01 # Queda máxima de precisão aceita em troca de cobertura do estágio 1
+TAMANHO_BATCH_BERT = 32
+
+# --- 2. Carregar e Preparar o Dataset ---
+print(f"Carregando dataset de: {CAMINHO_DO_SEU_CSV}")
+try:
+    df_completo = pd.read_csv(CAMINHO_DO_SEU_CSV, encoding="utf-8")
+except Exception as e:
+    print(f"ERRO ao carregar o CSV: {e}")
+    exit()
+
+df_completo[COLUNA_LABEL_ORIGINAL] = df_completo[COLUNA_LABEL_ORIGINAL].astype(str).str.replace('\xa0', '', regex=False).str.strip().str.upper()
+df_completo[COLUNA_LABEL_ORIGINAL] = df_completo[COLUNA_LABEL_ORIGINAL].replace({'SEGUR': 'SEGURO'})
+label_map = {"SEGURO": 0, "INSEGURO": 1, "INJECAO": 1}
+df_completo['label'] = df_completo[COLUNA_LABEL_ORIGINAL].map(label_map)
+df_completo = df_completo.dropna(subset=['label', COLUNA_TEXTO])
+df_completo['label'] = df_completo['label'].astype(int)
+
+df_treino, df_teste = train_test_split(
+    df_completo, test_size=PROPORCAO_TESTE, random_state=42, stratify=df_completo['label']
+)
+df_validacao, df_teste = train_test_split(
+    df_teste, test_size=1 - PROPORCAO_VALIDACAO, random_state=42, stratify=df_teste['label']
+)
+print(f"Tamanho do dataset de Treino (estágio 1): {len(df_treino)}")
+print(f"Tamanho do dataset de Validação (escolha dos limiares): {len(df_validacao)}")
+print(f"Tamanho do dataset de Teste (números do artefato): {len(df_teste)}")
+
+# --- 3. Treinar o Estágio 1 (TF-IDF de n-gramas de caracteres + Regressão Logística) ---
+print("\nTreinando o modelo linear do estágio 1...")
+vetorizador = TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 5), min_df=2, sublinear_tf=True)
+classificador = LogisticRegression(max_iter=2000, class_weight="balanced", C=4.0)
+classificador.fit(vetorizador.fit_transform(df_treino[COLUNA_TEXTO]), df_treino['label'])
+
+textos_validacao = df_validacao[COLUNA_TEXTO].tolist()
+labels_validacao = df_validacao['label'].to_numpy()
+textos_teste = df_teste[COLUNA_TEXTO].tolist()
+labels_teste = df_teste['label'].to_numpy()
+probs_cascata_validacao = classificador.predict_proba(vetorizador.transform(textos_validacao))[:, 1]
+probs_cascata_teste = classificador.predict_proba(vetorizador.transform(textos_teste))[:, 1]
+print(f"Recall do estágio 1 sozinho (limiar 0.5, validação): {recall_score(labels_validacao, probs_cascata_validacao >= 0.5):.4f}")
+
+# --- 4. Referência: BERT sozinho na validação e no teste ---
+print(f"\nAvaliando o BERT ({MODELO_BERT}) na validação e no teste...")
+try:
+    detector_bert = pipeline("text-classification", model=MODELO_BERT, top_k=None)
+except Exception as e:
+    print(f"ERRO ao carregar o modelo BERT: {e}")
+    exit()
+
+def preds_do_bert(textos):
+    resultados_bert = detector_bert(textos, batch_size=TAMANHO_BATCH_BERT, truncation=True, max_length=512)
+    probs_bert = np.array([
+        next(item['score'] for item in resultado if item['label'] in ("LABEL_1", "INJECAO"))
+        for resultado in resultados_bert
+    ])
+    return (probs_bert >= LIMIAR_PROB_INJECAO_BLOQUEIO).astype(int)
+
+def preds_da_cascata(probs_cascata, preds_bert, limiar_seguro, limiar_injecao):
+    # p <= limiar_seguro -> SEGURO; p >= limiar_injecao -> INJECAO; senão, decisão do BERT.
+    return np.where(probs_cascata <= limiar_seguro, 0, np.where(probs_cascata >= limiar_injecao, 1, preds_bert))
+
+preds_bert_validacao = preds_do_bert(textos_validacao)
+preds_bert_teste = preds_do_bert(textos_teste)
+recall_bert_validacao = recall_score(labels_validacao, preds_bert_validacao)
+precisao_bert_validacao = precision_score(labels_validacao, preds_bert_validacao, zero_division=0)
+recall_bert = recall_score(labels_teste, preds_bert_teste)
+precisao_bert = precision_score(labels_teste, preds_bert_teste, zero_division=0)
+print(f"BERT sozinho (validação) -> Recall: {recall_bert_validacao:.4f} | Precisão: {precisao_bert_validacao:.4f}")
+print(f"BERT sozinho (teste)     -> Recall: {recall_bert:.4f} | Precisão: {precisao_bert:.4f}")
+
+# --- 5. Escolher os limiares da cascata (na validação) ---
+# Entre os pares que mantêm recall >= BERT (e precisão dentro da tolerância), fica o que decide mais prompts no estágio 1.
+# Só entram limiares do lado certo do limiar de bloqueio: SEGURO abaixo dele, INJECAO a partir dele.
+print("\nProcurando limiares que preservam o recall do BERT...")
+candidatos = np.unique(probs_cascata_validacao)
+limiares_seguro = np.concatenate(([-1.0], candidatos[candidatos < LIMIAR_PROB_INJECAO_BLOQUEIO]))   # -1.0 = nunca decide SEGURO no estágio 1
+limiares_injecao = np.concatenate((candidatos[candidatos >= LIMIAR_PROB_INJECAO_BLOQUEIO], [2.0]))   #  2.0 = nunca decide INJECAO no estágio 1
+
+melhor = {"cobertura": -1.0}
+for limiar_seguro in limiares_seguro:
+    for limiar_injecao in limiares_injecao:
+        preds_combinadas = preds_da_cascata(probs_cascata_validacao, preds_bert_validacao, limiar_seguro, limiar_injecao)
+        recall_combinado = recall_score(labels_validacao, preds_combinadas)
+        precisao_combinada = precision_score(labels_validacao, preds_combinadas, zero_division=0)
+        if recall_combinado < recall_bert_validacao or precisao_combinada < precisao_bert_validacao - TOLERANCIA_PRECISAO:
+            continue
+        cobertura = float(np.mean((probs_cascata_validacao <= limiar_seguro) | (probs_cascata_validacao >= limiar_injecao)))
+        if cobertura > melhor["cobertura"]:
+            melhor = {"cobertura": cobertura, "limiar_seguro": float(limiar_seguro), "limiar_injecao": float(limiar_injecao)}
+
+# --- 6. Medir a cascata escolhida no teste ---
+preds_combinadas = preds_da_cascata(probs_cascata_teste, preds_bert_teste, melhor["limiar_seguro"], melhor["limiar_injecao"])
+recall_combinado = recall_score(labels_teste, preds_combinadas)
+precisao_combinada = precision_score(labels_teste, preds_combinadas, zero_division=0)
+cobertura_teste = float(np.mean((probs_cascata_teste <= melhor["limiar_seguro"]) | (probs_cascata_teste >= melhor["limiar_injecao"])))
+
+print(f"Limiar SEGURO (estágio 1):  p <= {melhor['limiar_seguro']:.4f}")
+print(f"Limiar INJECAO (estágio 1): p >= {melhor['limiar_injecao']:.4f}")
+print(f"Prompts decididos no estágio 1 (teste): {cobertura_teste:.2%}")
+print(f"Cascata (teste) -> Recall: {recall_combinado:.4f} (BERT: {recall_bert:.4f}) | "
+      f"Precisão: {precisao_combinada:.4f} (BERT: {precisao_bert:.4f})")
+if recall_combinado < recall_bert:
+    print("AVISO: no teste, o recall da cascata ficou abaixo do recall do BERT sozinho. Avalie antes de publicar o artefato.")
+
+# --- 7. Salvar o artefato usado por integração/classifier/cascata.py ---
+os.makedirs(os.path.dirname(CAMINHO_SAIDA_CASCATA), exist_ok=True)
+joblib.dump({
+    "vetorizador": vetorizador,
+    "classificador": classificador,
+    "limiar_seguro": melhor["limiar_seguro"],
+    "limiar_injecao": melhor["limiar_injecao"],
+    "limiar_bloqueio": LIMIAR_PROB_INJECAO_BLOQUEIO,
+    # Medidos no teste (os limiares saíram da validação)
+    "recall_bert": float(recall_bert),
+    "recall_combinado": float(recall_combinado),
+    "precisao_bert": float(precisao_bert),
+    "precisao_combinada": float(precisao_combinada),
+    "cobertura_estagio_1": cobertura_teste,
+    "modelo_bert": MODELO_BERT,
+}, CAMINHO_SAIDA_CASCATA)
+print(f"\nCascata salva em: {CAMINHO_SAIDA_CASCATA}")
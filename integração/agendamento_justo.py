@@ -0,0 +1,194 @@
+# agendamento_justo.py
+"""
+Justiça entre usuários no bot: limite de taxa por usuário e por canal (balde de
+tokens) e um agendador round-robin na frente da fila do classificador.
+
+- LimitadorTaxa: cada usuário e cada canal têm um balde que enche a uma taxa fixa
+  até a capacidade (a rajada permitida). Cada mensagem consome tokens proporcionais
+  ao tamanho do prompt; sem tokens, a mensagem é recusada com o tempo de espera.
+- AgendadorJusto: as requisições esperam em filas por usuário e são despachadas
+  alternando entre os usuários com trabalho pendente, até `max_concorrencia` ao
+  mesmo tempo. Um usuário com 20 prompts na fila não atrasa em 20 posições o
+  primeiro prompt de outro usuário.
+"""
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+
+from executores import ExecutorOcupadoErro
+from metricas import HISTOGRAMA_ESPERA_FILA
+from rastreamento import registrar_espera
+
+
+class BaldeTokens:
+
+    def __init__(self, capacidade: float, taxa_por_s: float):
+        self.capacidade = capacidade
+        self.taxa_por_s = taxa_por_s
+        self.tokens = capacidade
+        self._instante = time.monotonic()
+
+    def _reabastecer(self):
+        agora = time.monotonic()
+        self.tokens = min(self.capacidade, self.tokens + (agora - self._instante) * self.taxa_por_s)
+        self._instante = agora
+
+    def espera_para(self, custo: float) -> float:
+        """Segundos até haver `custo` tokens (0.0 se já há)."""
+        self._reabastecer()
+        falta = min(custo, self.capacidade) - self.tokens
+        if falta <= 0:
+            return 0.0
+        return falta / self.taxa_por_s if self.taxa_por_s > 0 else float("inf")
+
+    def consumir(self, custo: float):
+        self.tokens -= min(custo, self.capacidade)
+
+
+class LimitadorTaxa:
+    """Baldes de tokens por usuário e por canal. Usado só no event loop (sem locks)."""
+
+    def __init__(self, capacidade_usuario: float, por_minuto_usuario: float,
+                 capacidade_canal: float, por_minuto_canal: float,
+                 caracteres_por_token: int = 1000, max_baldes: int = 10000):
+        self.capacidade_usuario = capacidade_usuario
+        self.taxa_usuario = por_minuto_usuario / 60.0
+        self.capacidade_canal = capacidade_canal
+        self.taxa_canal = por_minuto_canal / 60.0
+        self.caracteres_por_token = max(int(caracteres_por_token), 1)
+        self.max_baldes = max_baldes
+        self._baldes = OrderedDict() # (escopo, id) -> BaldeTokens, em ordem de uso (LRU)
+        self.permitidas = 0
+        self.limitadas = {"usuario": 0, "canal": 0}
+        self.limitadas_por_usuario = OrderedDict() # id -> recusas, em ordem de recusa (LRU, até max_baldes usuários)
+
+    def _balde(self, escopo: str, identificador) -> BaldeTokens:
+        chave = (escopo, identificador)
+        balde = self._baldes.get(chave)
+        if balde is None:
+            if escopo == "usuario":
+                balde = BaldeTokens(self.capacidade_usuario, self.taxa_usuario)
+            else:
+                balde = BaldeTokens(self.capacidade_canal, self.taxa_canal)
+            self._baldes[chave] = balde
+            if len(self._baldes) > self.max_baldes: # Descarta o balde usado há mais tempo (provavelmente cheio)
+                self._baldes.popitem(last=False)
+        self._baldes.move_to_end(chave)
+        return balde
+
+    def custo(self, prompt: str) -> float:
+        """Prompts longos custam mais: 1 token + 1 a cada `caracteres_por_token` caracteres."""
+        return 1.0 + len(prompt) // self.caracteres_por_token
+
+    def permitir(self, id_usuario, id_canal, prompt: str = ""):
+        """
+        Retorna (permitido, espera_s, escopo). Os tokens só são consumidos se os dois
+        baldes permitirem; `escopo` ("usuario" ou "canal") diz qual limite foi atingido.
+        """
+        custo = self.custo(prompt)
+        balde_usuario = self._balde("usuario", id_usuario)
+        balde_canal = self._balde("canal", id_canal)
+        for escopo, balde in (("usuario", balde_usuario), ("canal", balde_canal)):
+            espera_s = balde.espera_para(custo)
+            if espera_s > 0:
+                self.limitadas[escopo] += 1
+                self._contar_limitada(id_usuario)
+                return False, espera_s, escopo
+        balde_usuario.consumir(custo)
+        balde_canal.consumir(custo)
+        self.permitidas += 1
+        return True, 0.0, None
+
+    def _contar_limitada(self, id_usuario):
+        self.limitadas_por_usuario[id_usuario] = self.limitadas_por_usuario.get(id_usuario, 0) + 1
+        self.limitadas_por_usuario.move_to_end(id_usuario)
+        if len(self.limitadas_por_usuario) > self.max_baldes: # Esquece quem não é limitado há mais tempo
+            self.limitadas_por_usuario.popitem(last=False)
+
+    def estatisticas(self, top: int = 5) -> dict:
+        mais_limitados = sorted(self.limitadas_por_usuario.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            "permitidas": self.permitidas,
+            "limitadas_usuario": self.limitadas["usuario"],
+            "limitadas_canal": self.limitadas["canal"],
+            "usuarios_mais_limitados": mais_limitados,
+        }
+
+
+class AgendadorJusto:
+    """Filas por usuário despachadas em round-robin, com no máximo `max_concorrencia` em execução."""
+
+    def __init__(self, max_concorrencia: int, max_pendentes_por_usuario: int = 5, nome: str = "agendador"):
+        self.nome = nome
+        self.max_concorrencia = max(int(max_concorrencia), 1)
+        self.max_pendentes_por_usuario = max(int(max_pendentes_por_usuario), 1)
+        self._filas = {}        # usuário -> deque de (future, fabrica_corrotina, instante_chegada, contexto)
+        self._rodizio = deque() # usuários com trabalho pendente, na ordem da vez
+        self._em_execucao = 0
+        self.despachadas = 0
+        self.rejeitadas = 0
+        self.maior_espera_s = 0.0
+
+    async def executar(self, chave_usuario, fabrica_corrotina):
+        """
+        Espera a vez do usuário e então executa `await fabrica_corrotina()`.
+        Levanta ExecutorOcupadoErro se o usuário já tem `max_pendentes_por_usuario` na fila.
+        """
+        fila = self._filas.get(chave_usuario)
+        if fila is not None and len(fila) >= self.max_pendentes_por_usuario:
+            self.rejeitadas += 1
+            raise ExecutorOcupadoErro(f"Usuário {chave_usuario} já tem {len(fila)} prompts aguardando análise.")
+        if fila is None:
+            fila = self._filas[chave_usuario] = deque()
+            self._rodizio.append(chave_usuario)
+        futuro = asyncio.get_running_loop().create_future()
+        fila.append((futuro, fabrica_corrotina, time.monotonic(), contextvars.copy_context()))
+        self._despachar()
+        return await futuro
+
+    def _despachar(self):
+        while self._em_execucao < self.max_concorrencia and self._rodizio:
+            chave_usuario = self._rodizio.popleft()
+            fila = self._filas[chave_usuario]
+            futuro, fabrica_corrotina, instante_chegada, contexto = fila.popleft()
+            if fila:
+                self._rodizio.append(chave_usuario) # Volta para o fim da vez
+            else:
+                del self._filas[chave_usuario]
+            if futuro.cancelled(): # O chamador desistiu enquanto esperava
+                continue
+            espera_s = time.monotonic() - instante_chegada
+            HISTOGRAMA_ESPERA_FILA.observar(espera_s, self.nome)
+            contexto.run(registrar_espera, f"fila_{self.nome}", espera_s)
+            self.maior_espera_s = max(self.maior_espera_s, espera_s)
+            self._em_execucao += 1
+            self.despachadas += 1
+            # A tarefa herda o contexto de quem enfileirou (não o de quem liberou a vaga): mantém o rastro certo
+            contexto.run(asyncio.ensure_future, self._rodar(futuro, fabrica_corrotina))
+
+    async def _rodar(self, futuro, fabrica_corrotina):
+        try:
+            resultado = await fabrica_corrotina()
+        except asyncio.CancelledError:
+            futuro.cancel()
+            raise
+        except Exception as erro:
+            if not futuro.done():
+                futuro.set_exception(erro)
+        else:
+            if not futuro.done():
+                futuro.set_result(resultado)
+        finally:
+            self._em_execucao -= 1
+            self._despachar()
+
+    def estatisticas(self) -> dict:
+        return {
+            "em_execucao": self._em_execucao,
+            "aguardando": sum(len(fila) for fila in self._filas.values()),
+            "usuarios_aguardando": len(self._filas),
+            "despachadas": self.despachadas,
+            "rejeitadas": self.rejeitadas,
+            "maior_espera_ms": self.maior_espera_s * 1000,
+        }
@@ -1,41 +1,140 @@
 # antigeno_digital.py
-from classifier.model import analisar_prompt_pela_ia # Importa a função que retorna o dicionário
+from classifier.model import analisar_prompt_longo_pela_ia, analisar_prompts_em_lote, obter_identidade_modelo, pode_exceder_limite_tokens # Importa as funções que retornam o dicionário
+from classifier.cascata import decidir_pela_cascata, identidade_cascata
+from cache_veredictos import CacheVeredictos, gerar_chave
 from utils_antigeno import detectar_por_regras_simples
-from groq_client import query_groq
-# import time # Descomente se quiser medir o tempo
+from groq_client import consultar_cache_llm, guardar_cache_llm, query_groq
+from config import verificar_configuracao
+from especulacao import ESPECULACAO_ATIVA, METRICAS_ESPECULACAO, ChamadaEspeculativaSync
+from metricas import HISTOGRAMA_ETAPAS, Cronometro, registrar_cache, registrar_veredicto
+from rastreamento import rastreado, rastros_ativos
+from registro_decisoes import registrar_decisao
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
 
 # LIMIAR_PROB_INJECAO_BLOQUEIO = 0.7 # Exemplo: bloquear se prob. de injeção >= 70%
 # Ajuste este limiar conforme os resultados e sua tolerância a falsos positivos/negativos.
 # Um limiar mais alto = menos bloqueios (mais tolerante), mais baixo = mais bloqueios (mais sensível).
 LIMIAR_PROB_INJECAO_BLOQUEIO = 0.5 # Começar com 0.5 pode ser um bom ponto de partida
 
+# Erros da IA que NÃO liberam o prompt (os demais ERRO_* seguem a política de falha segura abaixo).
+# São falhas de capacidade ou de infraestrutura, não do prompt: liberá-las deixaria uma injeção passar só por inundar o bot.
+LABELS_ERRO_FALHA_FECHADA = {"ERRO_SERVICO_INDISPONIVEL", "ERRO_POOL_ESGOTADO", "ERRO_TIMEOUT_WORKER", "ERRO_WORKER_INDISPONIVEL"}
+
+# Cache de veredictos: prompts repetidos (spam, retentativas) não passam de novo pelo modelo.
+# ANTIGENO_CACHE_TAMANHO=0 desativa; ANTIGENO_CACHE_TTL_S define a validade (0 = sem expiração).
+CACHE_VEREDICTOS = CacheVeredictos(
+    tamanho_max=int(os.getenv("ANTIGENO_CACHE_TAMANHO", "10000")),
+    ttl_s=float(os.getenv("ANTIGENO_CACHE_TTL_S", "0")),
+)
+registrar_cache("veredictos", CACHE_VEREDICTOS)
+
+def _chave_cache(prompt_usuario: str):
+    """Chave do cache para o prompt, ou None se o cache estiver desativado. Invalida o cache se o modelo mudou."""
+    if not CACHE_VEREDICTOS.ativo:
+        return None
+    identidade_modelo = f"{obter_identidade_modelo()}:{identidade_cascata()}"
+    CACHE_VEREDICTOS.sincronizar_identidade(identidade_modelo)
+    return gerar_chave(prompt_usuario, identidade_modelo, LIMIAR_PROB_INJECAO_BLOQUEIO)
+
+def _guardar_no_cache(chave, analise: dict):
+    # Só guarda veredictos válidos da IA: erros devem ser reavaliados na próxima tentativa.
+    detalhes_ia = analise.get("detalhes_ia") or {}
+    if chave is not None and detalhes_ia.get("label_ia") in ("SEGURO", "INJECAO"):
+        CACHE_VEREDICTOS.guardar(chave, analise)
+
+def _concluir_analise(analise: dict, inicio: float) -> dict:
+    """
+    Registra a duração e o veredicto da análise nas métricas (ver metricas.py). Se a
+    requisição estiver sendo rastreada (rastreamento.py), devolve uma cópia com
+    "tempo_analise_ms": total e tempo por etapa (o cache guarda a análise sem ele).
+    """
+    fim = time.perf_counter()
+    HISTOGRAMA_ETAPAS.observar(fim - inicio, "analise")
+    registrar_veredicto(analise)
+    rastros = rastros_ativos()
+    if rastros:
+        analise = dict(analise, tempo_analise_ms=dict(rastros[0].duracoes_ms(inicio), total=round((fim - inicio) * 1000, 2)))
+    return analise
+
+@rastreado()
 def obter_analise_antigeno(prompt_usuario: str) -> dict:
     """
     Analisa o prompt do usuário usando regras e o modelo de IA.
     Retorna um dicionário com:
         - "classificacao_final": "SEGURO" ou "INJECAO"
         - "prob_injecao": float (estimativa da probabilidade de ser uma injeção)
-        - "motivo_deteccao": str (origem da decisão: REGRAS, IA, ou ERRO)
+        - "motivo_deteccao": str (origem da decisão: REGRAS, CASCATA_ESTAGIO_1, IA (estágio 2), ou ERRO)
         - "detalhes_ia": dict (o resultado bruto de analisar_prompt_pela_ia, para log/debug)
+        - "tempo_analise_ms": dict (só em requisições rastreadas, ver rastreamento.py)
     """
-    # start_time = time.time() # Descomente para medir o tempo
+    inicio = time.perf_counter()
 
     # 1. Verificar por Regras Simples (prioridade máxima)
-    if detectar_por_regras_simples(prompt_usuario):
-        # end_time = time.time() # Descomente para medir o tempo
-        return {
-            "classificacao_final": "INJECAO",
-            "prob_injecao": 1.0,  # Regras são consideradas detecção com 100% de certeza
-            "motivo_deteccao": "REGRAS_MANUAIS",
-            "detalhes_ia": None, # IA não foi consultada ou não é o motivo primário
-            # "tempo_analise_ms": round((end_time - start_time) * 1000, 2) # Descomente
-        }
+    with Cronometro("regras"):
+        barrado_por_regras = detectar_por_regras_simples(prompt_usuario)
+    if barrado_por_regras:
+        return _concluir_analise(_montar_analise_regras(), inicio)
 
-    # 2. Se não pego por regras, consultar a IA 
-    analise_ia = analisar_prompt_pela_ia(prompt_usuario)
+    # 2. Prompt repetido com o mesmo modelo e limiar: reaproveita o veredicto (sem tokenização nem forward)
+    with Cronometro("cache") as cronometro:
+        chave_cache = _chave_cache(prompt_usuario)
+        analise_em_cache = CACHE_VEREDICTOS.obter(chave_cache) if chave_cache is not None else None
+        cronometro.anotar(acerto=analise_em_cache is not None)
+    if analise_em_cache is not None:
+        return _concluir_analise(analise_em_cache, inicio)
+
+    # 3. Cascata: o modelo linear decide sozinho os casos claramente seguros ou claramente injeção
+    with Cronometro("cascata"):
+        decisao_cascata, prob_cascata = _consultar_cascata(prompt_usuario)
+    if decisao_cascata is not None:
+        analise = _montar_analise_cascata(decisao_cascata, prob_cascata)
+        _guardar_no_cache(chave_cache, analise)
+        return _concluir_analise(analise, inicio)
+
+    # 4. Se não pego por regras, cache nem cascata, consultar a IA 
+    # Prompts acima de 512 tokens são avaliados em janelas sobrepostas em vez de truncados.
+    analise_ia = analisar_prompt_longo_pela_ia(prompt_usuario, LIMIAR_PROB_INJECAO_BLOQUEIO)
     #DESATIVEI ISSO MAS N VOU TIRAR 
     # analise_ia é um dict: {"label_ia": "SEGURO"|"INJECAO"|ERRO_..., "score_ia": float}
+    analise = _montar_analise_ia(analise_ia, escalado_pela_cascata=prob_cascata is not None)
+    _guardar_no_cache(chave_cache, analise)
+    return _concluir_analise(analise, inicio)
+
+
+def _montar_analise_regras() -> dict:
+    return {
+        "classificacao_final": "INJECAO",
+        "prob_injecao": 1.0,  # Regras são consideradas detecção com 100% de certeza
+        "motivo_deteccao": "REGRAS_MANUAIS",
+        "detalhes_ia": None, # IA não foi consultada ou não é o motivo primário
+    }
+
+
+def _consultar_cascata(prompt_usuario: str):
+    # Prompts longos sempre vão para o BERT em janelas: o modelo linear vê o texto inteiro de uma vez
+    # e poderia diluir uma injeção no fim de um preâmbulo benigno.
+    if pode_exceder_limite_tokens(prompt_usuario):
+        return None, None
+    return decidir_pela_cascata(prompt_usuario, LIMIAR_PROB_INJECAO_BLOQUEIO)
 
+
+def _montar_analise_cascata(decisao: str, prob_injecao: float) -> dict:
+    return {
+        "classificacao_final": decisao,
+        "prob_injecao": float(prob_injecao),
+        "motivo_deteccao": f"CASCATA_ESTAGIO_1 (Modelo linear, Prob. Injeção: {prob_injecao:.4f})",
+        "detalhes_ia": {
+            "label_ia": decisao,
+            "score_ia": float(prob_injecao if decisao == "INJECAO" else 1.0 - prob_injecao),
+            "estagio": "CASCATA_ESTAGIO_1",
+        },
+    }
+
+
+def _montar_analise_ia(analise_ia: dict, escalado_pela_cascata: bool = False) -> dict:
+    """Converte o resultado bruto da IA na análise final do Antígeno (aplica o limiar de bloqueio)."""
     label_da_ia = analise_ia.get("label_ia", "ERRO_INESPERADO_IA")
     score_da_ia = analise_ia.get("score_ia", 0.0)
     
@@ -52,30 +151,34 @@ def obter_analise_antigeno(prompt_usuario: str) -> dict:
         probabilidade_estimada_injecao = 1.0 - score_da_ia
         classificacao_derivada_ia = "SEGURO" # Mantém, pois a IA primariamente disse SEGURO
                                           # A prob_injecao será usada para o limiar.
+    elif label_da_ia in LABELS_ERRO_FALHA_FECHADA:
+        # O classificador nem chegou a avaliar o prompt (serviço fora do ar, sem réplica livre): recusa em vez de liberar sem triagem.
+        return {
+            "classificacao_final": "ERRO_ANTIGENO",
+            "prob_injecao": 0.0,
+            "motivo_deteccao": f"IA_INDISPONIVEL: {label_da_ia}",
+            "detalhes_ia": analise_ia,
+        }
     elif label_da_ia.startswith("ERRO_"):
         # Em caso de erro da IA, podemos assumir uma probabilidade de injeção conservadora (ex: 0.0 ou 0.5)
         # ou até mesmo tratar como bloqueio dependendo da política de falha segura.
         # Por ora, vamos assumir que não é uma injeção detectada pela IA.
         probabilidade_estimada_injecao = 0.0 # Falha segura (não bloqueia por erro da IA)
         classificacao_derivada_ia = "SEGURO" # Ou um estado de erro específico
-        # end_time = time.time() # Descomente para medir o tempo
         return {
             "classificacao_final": "SEGURO", # Ou "ERRO_ANTIGENO"
             "prob_injecao": probabilidade_estimada_injecao,
             "motivo_deteccao": f"IA_RETORNOU_ERRO: {label_da_ia}",
             "detalhes_ia": analise_ia,
-            # "tempo_analise_ms": round((end_time - start_time) * 1000, 2) # Descomente
         }
     else: # Label desconhecido ou não mapeado
         probabilidade_estimada_injecao = 0.0
         classificacao_derivada_ia = "SEGURO"
-        # end_time = time.time() # Descomente para medir o tempo
         return {
             "classificacao_final": "SEGURO", # Ou "ANTIGENO_IA_DESCONHECIDO"
             "prob_injecao": probabilidade_estimada_injecao,
             "motivo_deteccao": f"IA_LABEL_DESCONHECIDO: {label_da_ia}",
             "detalhes_ia": analise_ia,
-            # "tempo_analise_ms": round((end_time - start_time) * 1000, 2) # Descomente
         }
 
     # A classificação final do Antígeno será baseada na prob_injecao e no limiar
@@ -85,20 +188,65 @@ def obter_analise_antigeno(prompt_usuario: str) -> dict:
     if probabilidade_estimada_injecao >= LIMIAR_PROB_INJECAO_BLOQUEIO:
         classificacao_antigeno_final = "INJECAO"
     
-    # end_time = time.time() # Descomente para medir o tempo
     return {
         "classificacao_final": classificacao_antigeno_final,
         "prob_injecao": float(probabilidade_estimada_injecao),
-        "motivo_deteccao": f"IA_MODELO_FINETUNADO (Label IA: {label_da_ia}, Score IA: {score_da_ia:.4f})",
+        "motivo_deteccao": f"IA_MODELO_FINETUNADO{' [CASCATA_ESTAGIO_2]' if escalado_pela_cascata else ''} (Label IA: {label_da_ia}, Score IA: {score_da_ia:.4f})",
         "detalhes_ia": analise_ia,
-        # "tempo_analise_ms": round((end_time - start_time) * 1000, 2) # Descomente
     }
 
 
+@rastreado()
+def obter_analises_antigeno(prompts_usuario: list, batch_size: int = 32) -> list:
+    """
+    Versão em lote de obter_analise_antigeno, para re-triagens com muitos prompts.
+    Os prompts não barrados pelas regras são classificados pela IA em lotes agrupados
+    por comprimento. Retorna uma lista de análises na mesma ordem de `prompts_usuario`.
+    """
+    prompts_usuario = list(prompts_usuario)
+    analises = [None] * len(prompts_usuario)
+    chaves_cache = [None] * len(prompts_usuario)
+    indices_para_ia = []
+    escalados_pela_cascata = set()
+    for i, prompt_usuario in enumerate(prompts_usuario):
+        if detectar_por_regras_simples(prompt_usuario):
+            analises[i] = _montar_analise_regras()
+            continue
+        chaves_cache[i] = _chave_cache(prompt_usuario)
+        if chaves_cache[i] is not None:
+            analises[i] = CACHE_VEREDICTOS.obter(chaves_cache[i])
+        if analises[i] is not None:
+            continue
+        decisao_cascata, prob_cascata = _consultar_cascata(prompt_usuario)
+        if decisao_cascata is not None:
+            analises[i] = _montar_analise_cascata(decisao_cascata, prob_cascata)
+            _guardar_no_cache(chaves_cache[i], analises[i])
+        else:
+            indices_para_ia.append(i)
+            if prob_cascata is not None:
+                escalados_pela_cascata.add(i)
+
+    resultados_ia = analisar_prompts_em_lote(
+        [prompts_usuario[i] for i in indices_para_ia],
+        batch_size=batch_size,
+        limiar_bloqueio_janelas=LIMIAR_PROB_INJECAO_BLOQUEIO,
+    )
+    for i, analise_ia in zip(indices_para_ia, resultados_ia):
+        analises[i] = _montar_analise_ia(analise_ia, escalado_pela_cascata=i in escalados_pela_cascata)
+        _guardar_no_cache(chaves_cache[i], analises[i])
+    for analise in analises:
+        registrar_veredicto(analise)
+    return analises
+
+
 def main():
+    verificar_configuracao()
     print("Bem-vindo ao Antígeno Digital (Modo de Teste Interativo)!")
     print("O modelo de IA será carregado na primeira análise de prompt.")
     print(f"Limiar de probabilidade de injeção para bloqueio: {LIMIAR_PROB_INJECAO_BLOQUEIO*100:.0f}%")
+    executor_llm = ThreadPoolExecutor(max_workers=1) if ESPECULACAO_ATIVA else None
+    if ESPECULACAO_ATIVA:
+        print("Modo especulativo ativo: o Groq é consultado em paralelo, e a resposta só é exibida se o prompt for SEGURO.")
     
     # Chama uma vez para "aquecer" e carregar o modelo, se desejado.
     # obter_analise_antigeno("Teste inicial para carregar modelo.") 
@@ -114,23 +262,34 @@ def main():
             print("Prompt vazio, por favor digite algo.")
             continue
 
+        resposta_em_cache = consultar_cache_llm(prompt_usuario) if ESPECULACAO_ATIVA else None
+        especulacao = None
+        if ESPECULACAO_ATIVA and resposta_em_cache is None: # Só guarda no cache se a resposta for liberada
+            especulacao = ChamadaEspeculativaSync(executor_llm, query_groq, prompt_usuario, False, False)
+        inicio_analise = time.perf_counter()
         analise_completa = obter_analise_antigeno(prompt_usuario)
+        registrar_decisao(prompt_usuario, analise_completa, (time.perf_counter() - inicio_analise) * 1000, "cli")
         
         classificacao = analise_completa["classificacao_final"]
         prob_injecao = analise_completa["prob_injecao"]
         motivo = analise_completa["motivo_deteccao"]
         # detalhes_ia_log = analise_completa["detalhes_ia"] # Para log mais detalhado se precisar
-        # tempo_ms = analise_completa.get("tempo_analise_ms", "N/A")
+        tempo_ms = analise_completa.get("tempo_analise_ms") # Só com ANTIGENO_TRACE_AMOSTRAGEM > 0
 
         print("\n--- Análise do Antígeno Digital ---")
         print(f"  Prompt: '{prompt_usuario}'")
-        # print(f"  Tempo de Análise: {tempo_ms} ms") # Descomente se medir tempo
+        if tempo_ms is not None:
+            print(f"  Tempo de Análise (ms): {tempo_ms}")
         print(f"  Classificação Final do Antígeno: {classificacao}")
         print(f"  Probabilidade Estimada de Injeção: {prob_injecao:.2%}") # Mostra como porcentagem
         print(f"  Motivo/Detalhe da Detecção: {motivo}")
         # print(f"  Detalhes IA (bruto): {detalhes_ia_log}") # Para debug
         print("---------------------------------")
         
+        if especulacao is not None and classificacao != "SEGURO":
+            especulacao.descartar() # A resposta retida nunca é exibida
+            print(f"Resposta especulativa do Groq descartada. Métricas: {METRICAS_ESPECULACAO.estatisticas()}")
+
         if classificacao == "INJECAO": # A decisão de bloqueio agora é direta pela classificacao_final
             print("------------------------------------------------------")
             print(">>> ALERTA DO ANTÍGENO DIGITAL <<<")
@@ -141,7 +300,14 @@ def main():
         elif classificacao == "SEGURO":
             print("Antígeno Digital: Prompt parece seguro. Enviando para o modelo principal (Groq)...")
             try:
-                resposta_groq = query_groq(prompt_usuario)
+                if resposta_em_cache is not None:
+                    resposta_groq = resposta_em_cache
+                elif especulacao is not None:
+                    resposta_groq = especulacao.liberar()
+                    guardar_cache_llm(prompt_usuario, resposta_groq)
+                    print(f"(Resposta especulativa liberada. Métricas: {METRICAS_ESPECULACAO.estatisticas()})")
+                else:
+                    resposta_groq = query_groq(prompt_usuario)
                 print("\nResposta do Modelo Principal (Groq):")
                 print(resposta_groq)
             except Exception as e_groq:
@@ -0,0 +1,140 @@
+# benchmark_http.py
+"""
+Benchmark local do servico_http.py: N clientes concorrentes (laço fechado, conexões
+keep-alive) enviando prompts de prompts_para_testar.csv a /analyze, ou a
+/analyze/batch com --lote. Relata vazão (prompts/s), p50/p95/p99 da latência e a
+contagem de respostas por status HTTP.
+
+Os prompts são sorteados com reposição: com o cache de veredictos do serviço ligado,
+a maior parte das requisições mediria o cache, não o classificador. Por isso o
+benchmark recusa um serviço com o cache ativo (inicie-o com ANTIGENO_CACHE_TAMANHO=0),
+a menos que --com-cache seja passado; a taxa de acerto do cache no período é relatada.
+
+Uso (a partir da pasta integração/, com o serviço já PRONTO):
+    ANTIGENO_CACHE_TAMANHO=0 python servico_http.py --porta 8080 --warmup
+    python benchmark_http.py --url http://127.0.0.1:8080 --concorrencia 64 --requisicoes 5000
+    python benchmark_http.py --lote 32 --requisicoes 200 --saida benchmark_http.json
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import time
+
+CAMINHO_CSV_PADRAO = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ANTIGENO_DIGITAL", "prompts_para_testar.csv"))
+
+
+def percentil(valores: list, p: float):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(int(round(p / 100.0 * (len(ordenados) - 1))), len(ordenados) - 1)]
+
+
+def _taxa_acerto_no_periodo(antes: dict, depois: dict):
+    """Acertos/consultas do cache de veredictos entre duas leituras de /stats (None se o cache está desativado)."""
+    if not antes or not depois:
+        return None
+    acertos = depois["acertos"] - antes["acertos"]
+    consultas = acertos + depois["falhas"] - antes["falhas"]
+    return {"acertos": acertos, "consultas": consultas, "taxa_acerto": acertos / consultas if consultas else 0.0}
+
+
+async def executar_benchmark(url: str, prompts: list, concorrencia: int, requisicoes: int, lote: int, semente: int, com_cache: bool = False) -> dict:
+    import httpx
+    aleatorio = random.Random(semente)
+    contador = iter(range(requisicoes))
+    latencias_ms = []
+    status = {}
+    classificacoes = {}
+
+    async def cliente(http):
+        for _ in contador: # Iterador compartilhado: cada requisição é feita por um só cliente
+            if lote > 0:
+                rota, corpo = "/analyze/batch", {"prompts": [aleatorio.choice(prompts) for _ in range(lote)]}
+            else:
+                rota, corpo = "/analyze", {"prompt": aleatorio.choice(prompts)}
+            inicio = time.perf_counter()
+            try:
+                resposta = await http.post(rota, json=corpo)
+            except httpx.HTTPError as e:
+                status[type(e).__name__] = status.get(type(e).__name__, 0) + 1
+                continue
+            latencias_ms.append((time.perf_counter() - inicio) * 1000)
+            status[resposta.status_code] = status.get(resposta.status_code, 0) + 1
+            if resposta.status_code == 200:
+                dados = resposta.json()
+                for analise in dados.get("resultados", [dados]):
+                    classificacoes[analise["classificacao_final"]] = classificacoes.get(analise["classificacao_final"], 0) + 1
+
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=60.0) as http:
+        pronto = await http.get("/ready")
+        if pronto.status_code != 200:
+            raise SystemExit(f"Serviço não está pronto: {pronto.text}")
+        cache_antes = (await http.get("/stats")).json().get("cache_veredictos")
+        if cache_antes and not com_cache:
+            raise SystemExit("O cache de veredictos do serviço está ativo: com prompts repetidos o benchmark mediria o cache. "
+                             "Inicie o serviço com ANTIGENO_CACHE_TAMANHO=0 ou passe --com-cache.")
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente(http) for _ in range(concorrencia)))
+        duracao_s = time.perf_counter() - inicio
+        estatisticas_servico = (await http.get("/stats")).json()
+
+    prompts_analisados = sum(classificacoes.values())
+    return {
+        "requisicoes": requisicoes,
+        "concorrencia": concorrencia,
+        "lote": lote,
+        "duracao_s": duracao_s,
+        "requisicoes_por_s": len(latencias_ms) / duracao_s if duracao_s else 0.0,
+        "prompts_por_s": prompts_analisados / duracao_s if duracao_s else 0.0,
+        "latencia_ms": {"p50": percentil(latencias_ms, 50), "p95": percentil(latencias_ms, 95), "p99": percentil(latencias_ms, 99)},
+        "status": {str(codigo): quantidade for codigo, quantidade in status.items()},
+        "classificacoes": classificacoes,
+        "cache_veredictos": _taxa_acerto_no_periodo(cache_antes, estatisticas_servico.get("cache_veredictos")),
+        "servico": estatisticas_servico,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local do serviço HTTP do Antígeno Digital.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--concorrencia", type=int, default=32, help="Clientes simultâneos (cada um espera a resposta antes de enviar outra).")
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--lote", type=int, default=0, help="Prompts por requisição em /analyze/batch (0 = /analyze).")
+    parser.add_argument("--csv", default=CAMINHO_CSV_PADRAO, help="CSV com a coluna 'prompt_text'.")
+    parser.add_argument("--com-cache", action="store_true", help="Aceita o serviço com o cache de veredictos ativo (mede o cache junto).")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", default=None, help="Arquivo JSON para salvar o resultado.")
+    args = parser.parse_args()
+
+    with open(args.csv, mode="r", encoding="utf-8", newline="") as arquivo_csv:
+        prompts = [linha["prompt_text"].strip() for linha in csv.DictReader(arquivo_csv) if linha.get("prompt_text", "").strip()]
+
+    resultado = asyncio.run(executar_benchmark(args.url, prompts, args.concorrencia, args.requisicoes, args.lote, args.semente, args.com_cache))
+    latencia = resultado["latencia_ms"]
+    print(f"\n--- Benchmark HTTP: {args.requisicoes} requisições, {args.concorrencia} clientes"
+          f"{f', lotes de {args.lote}' if args.lote else ''} ---")
+    print(f"Duração: {resultado['duracao_s']:.2f}s | {resultado['requisicoes_por_s']:.1f} req/s | {resultado['prompts_por_s']:.1f} prompts/s")
+    if latencia["p50"] is not None:
+        print(f"Latência (ms): p50 {latencia['p50']:.1f} | p95 {latencia['p95']:.1f} | p99 {latencia['p99']:.1f}")
+    print(f"Status HTTP: {resultado['status']}")
+    print(f"Classificações: {resultado['classificacoes']}")
+    cache = resultado["cache_veredictos"]
+    if cache is None:
+        print("Cache de veredictos do serviço: desativado")
+    else:
+        print(f"Cache de veredictos do serviço: {cache['acertos']} acertos / {cache['consultas']} consultas ({cache['taxa_acerto']:.1%})")
+    print(f"Serviço: {resultado['servico']['executor']} | admissão: {resultado['servico']['admissao']['estado']}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+        print(f"Resultado salvo em: {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
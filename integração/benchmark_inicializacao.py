@@ -0,0 +1,121 @@
+# benchmark_inicializacao.py
+"""
+Mede a inicialização a frio do Antígeno Digital, para acompanhar entre versões:
+    - importação: tempo para importar antigeno_digital (e discord_bot, se o discord.py estiver instalado)
+    - carga do modelo: inicializar_classificador()
+    - aquecimento: aquecer_classificador() (só com --warmup)
+    - primeiro veredicto: primeira chamada a obter_analise_antigeno(), e a segunda para comparação
+
+Cada repetição roda em um processo Python novo (importações e caches realmente frios).
+Uso (a partir da pasta integração/):
+    python benchmark_inicializacao.py --repeticoes 5 --warmup --saida benchmarks_inicializacao.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROMPT_PRIMEIRO_VEREDICTO = "Qual a capital da França e quantos habitantes ela tem?"
+ETAPAS = ["importacao_s", "importacao_bot_s", "carga_modelo_s", "aquecimento_s", "primeiro_veredicto_s", "segundo_veredicto_s"]
+
+
+def medir_uma_vez(aquecer: bool) -> dict:
+    """Executa as etapas no processo atual (que deve ser novo) e retorna os tempos em segundos."""
+    medidas = {}
+    inicio = time.perf_counter()
+    import antigeno_digital
+    from classifier import model
+    medidas["importacao_s"] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    try:
+        import discord_bot # noqa: F401 (só o custo da importação interessa)
+        medidas["importacao_bot_s"] = time.perf_counter() - inicio
+    except ImportError:
+        medidas["importacao_bot_s"] = None
+
+    inicio = time.perf_counter()
+    model.inicializar_classificador()
+    medidas["carga_modelo_s"] = time.perf_counter() - inicio
+    medidas["estado_classificador"] = model.obter_estado_classificador()
+
+    medidas["aquecimento_s"] = model.aquecer_classificador() if aquecer else None
+
+    inicio = time.perf_counter()
+    analise = antigeno_digital.obter_analise_antigeno(PROMPT_PRIMEIRO_VEREDICTO)
+    medidas["primeiro_veredicto_s"] = time.perf_counter() - inicio
+    medidas["motivo_primeiro_veredicto"] = analise["motivo_deteccao"]
+
+    antigeno_digital.CACHE_VEREDICTOS.limpar() # A segunda chamada mede o modelo já quente, não o cache
+    inicio = time.perf_counter()
+    antigeno_digital.obter_analise_antigeno(PROMPT_PRIMEIRO_VEREDICTO)
+    medidas["segundo_veredicto_s"] = time.perf_counter() - inicio
+    return medidas
+
+
+def executar_repeticoes(repeticoes: int, aquecer: bool) -> list:
+    comando = [sys.executable, os.path.abspath(__file__), "--medir-uma-vez"] + (["--warmup"] if aquecer else [])
+    execucoes = []
+    for i in range(repeticoes):
+        print(f"Repetição {i + 1}/{repeticoes}...")
+        saida = subprocess.run(comando, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        linhas_json = [linha for linha in saida.stdout.splitlines() if linha.startswith("{")]
+        if saida.returncode != 0 or not linhas_json:
+            print(f"ERRO na repetição {i + 1} (código {saida.returncode}):\n{saida.stderr[-2000:]}")
+            continue
+        execucoes.append(json.loads(linhas_json[-1]))
+    return execucoes
+
+
+def resumir(execucoes: list) -> dict:
+    resumo = {}
+    for etapa in ETAPAS:
+        valores = [execucao[etapa] for execucao in execucoes if execucao.get(etapa) is not None]
+        if valores:
+            resumo[etapa] = {"mediana": statistics.median(valores), "min": min(valores), "max": max(valores)}
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de inicialização a frio do Antígeno Digital.")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Número de processos novos medidos.")
+    parser.add_argument("--warmup", action="store_true", help="Inclui aquecer_classificador() antes do primeiro veredicto.")
+    parser.add_argument("--saida", default=None, help="Arquivo JSONL onde o resumo desta execução é acrescentado.")
+    parser.add_argument("--medir-uma-vez", action="store_true", help=argparse.SUPPRESS) # Usado pelos processos filhos
+    args = parser.parse_args()
+
+    if args.medir_uma_vez:
+        print(json.dumps(medir_uma_vez(args.warmup)))
+        return
+
+    execucoes = executar_repeticoes(max(args.repeticoes, 1), args.warmup)
+    if not execucoes:
+        print("Nenhuma repetição concluída.")
+        sys.exit(1)
+
+    resumo = resumir(execucoes)
+    print(f"\n--- Inicialização a frio ({len(execucoes)} repetição(ões), estado do classificador: {execucoes[-1]['estado_classificador']}) ---")
+    print(f"{'etapa':<24}{'mediana':>10}{'min':>10}{'max':>10}")
+    for etapa, valores in resumo.items():
+        print(f"{etapa:<24}{valores['mediana']:>9.3f}s{valores['min']:>9.3f}s{valores['max']:>9.3f}s")
+    print(f"Primeiro veredicto decidido por: {execucoes[-1]['motivo_primeiro_veredicto']}")
+
+    if args.saida:
+        registro = {
+            "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "modelo": os.getenv("ANTIGENO_MODEL_NAME", "modelo_detector_injecao_v3"),
+            "backend": os.getenv("ANTIGENO_BACKEND", "pytorch"),
+            "warmup": args.warmup,
+            "repeticoes": len(execucoes),
+            "resumo": resumo,
+        }
+        with open(args.saida, "a", encoding="utf-8") as arquivo:
+            arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        print(f"Resumo acrescentado em: {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# cache_respostas_llm.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from cache_veredictos import normalizar_prompt
+
+
+class CacheRespostasLLM:
+    """
+    Cache em disco (SQLite) das respostas do LLM para prompts seguros repetidos.
+    A chave é (modelo, temperatura, hash do prompt normalizado). Despejo por idade
+    (`idade_max_s`) e por tamanho (remove as menos acessadas recentemente).
+    Temperaturas acima de `temperatura_max` não usam o cache (respostas variadas
+    são esperadas). Consultas são locais e rápidas: podem rodar no event loop.
+    """
+
+    def __init__(self, caminho: str, tamanho_max: int = 5000, idade_max_s: float = 7 * 24 * 3600,
+                 temperatura_max: float = 0.7):
+        self.caminho = caminho
+        self.tamanho_max = max(int(tamanho_max), 1)
+        self.idade_max_s = idade_max_s if idade_max_s and idade_max_s > 0 else None
+        self.temperatura_max = temperatura_max
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.ignoradas_temperatura = 0
+        self.despejos = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS respostas ("
+            " modelo TEXT NOT NULL, temperatura REAL NOT NULL, hash_prompt TEXT NOT NULL,"
+            " resposta TEXT NOT NULL, criado_em REAL NOT NULL, acessado_em REAL NOT NULL,"
+            " PRIMARY KEY (modelo, temperatura, hash_prompt))"
+        )
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_respostas_acessado_em ON respostas (acessado_em)")
+
+    @staticmethod
+    def hash_prompt(prompt: str) -> str:
+        return hashlib.sha256(normalizar_prompt(prompt).encode("utf-8")).hexdigest()
+
+    def usa_cache(self, temperatura: float) -> bool:
+        return temperatura <= self.temperatura_max
+
+    def obter(self, modelo: str, temperatura: float, prompt: str):
+        """Resposta guardada, ou None (ausente, expirada ou temperatura acima do limite)."""
+        if not self.usa_cache(temperatura):
+            with self._lock:
+                self.ignoradas_temperatura += 1
+            return None
+        agora = time.time()
+        chave = (modelo, float(temperatura), self.hash_prompt(prompt))
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT resposta, criado_em FROM respostas WHERE modelo = ? AND temperatura = ? AND hash_prompt = ?", chave
+            ).fetchone()
+            if linha is None or (self.idade_max_s is not None and agora - linha[1] > self.idade_max_s):
+                self.falhas += 1
+                return None
+            self._conexao.execute(
+                "UPDATE respostas SET acessado_em = ? WHERE modelo = ? AND temperatura = ? AND hash_prompt = ?", (agora,) + chave
+            )
+            self.acertos += 1
+            return linha[0]
+
+    def guardar(self, modelo: str, temperatura: float, prompt: str, resposta: str):
+        if not self.usa_cache(temperatura) or not resposta:
+            return
+        agora = time.time()
+        with self._lock:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO respostas (modelo, temperatura, hash_prompt, resposta, criado_em, acessado_em) VALUES (?, ?, ?, ?, ?, ?)",
+                (modelo, float(temperatura), self.hash_prompt(prompt), resposta, agora, agora),
+            )
+            self._despejar(agora)
+
+    def _despejar(self, agora: float):
+        removidas = 0
+        if self.idade_max_s is not None:
+            removidas += self._conexao.execute("DELETE FROM respostas WHERE criado_em < ?", (agora - self.idade_max_s,)).rowcount
+        excesso = self._conexao.execute("SELECT COUNT(*) FROM respostas").fetchone()[0] - self.tamanho_max
+        if excesso > 0:
+            removidas += self._conexao.execute(
+                "DELETE FROM respostas WHERE rowid IN (SELECT rowid FROM respostas ORDER BY acessado_em LIMIT ?)", (excesso,)
+            ).rowcount
+        self.despejos += removidas
+
+    def limpar(self):
+        with self._lock:
+            self._conexao.execute("DELETE FROM respostas")
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                "tamanho": self._conexao.execute("SELECT COUNT(*) FROM respostas").fetchone()[0],
+                "tamanho_max": self.tamanho_max,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": (self.acertos / total) if total else 0.0,
+                "ignoradas_temperatura": self.ignoradas_temperatura,
+                "despejos": self.despejos,
+            }
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
@@ -0,0 +1,97 @@
+# cache_veredictos.py
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalizar_prompt(prompt: str) -> str:
+    """Normaliza o prompt para a chave do cache (Unicode NFC e espaços colapsados). Não muda maiúsculas: o modelo é 'cased'."""
+    return " ".join(unicodedata.normalize("NFC", prompt).split())
+
+
+def gerar_chave(prompt: str, identidade_modelo: str, limiar: float) -> str:
+    """Hash do prompt normalizado + identidade do modelo + limiar de bloqueio."""
+    conteudo = f"{identidade_modelo}\x00{limiar!r}\x00{normalizar_prompt(prompt)}"
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+class CacheVeredictos:
+    """
+    Cache em memória de análises do Antígeno, com despejo LRU por tamanho,
+    TTL opcional e contadores de acertos/falhas. Seguro para uso entre threads.
+
+    `sincronizar_identidade` esvazia o cache quando o modelo muda, para que
+    nenhum veredicto de uma versão anterior seja servido.
+    """
+
+    def __init__(self, tamanho_max: int = 10000, ttl_s: float = None):
+        self.tamanho_max = max(int(tamanho_max), 0)
+        self.ttl_s = ttl_s if ttl_s and ttl_s > 0 else None
+        self._itens = OrderedDict() # chave -> (instante_insercao, valor)
+        self._lock = threading.Lock()
+        self._identidade = None
+        self.acertos = 0
+        self.falhas = 0
+        self.despejos = 0
+        self.invalidacoes = 0
+
+    @property
+    def ativo(self) -> bool:
+        return self.tamanho_max > 0
+
+    def obter(self, chave: str):
+        if not self.ativo:
+            return None
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.falhas += 1
+                return None
+            instante, valor = item
+            if self.ttl_s is not None and time.monotonic() - instante > self.ttl_s:
+                del self._itens[chave]
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return dict(valor)
+
+    def guardar(self, chave: str, valor: dict):
+        if not self.ativo:
+            return
+        with self._lock:
+            self._itens[chave] = (time.monotonic(), dict(valor))
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_max:
+                self._itens.popitem(last=False)
+                self.despejos += 1
+
+    def sincronizar_identidade(self, identidade: str):
+        """Esvazia o cache se a identidade do modelo mudou desde a última chamada."""
+        if identidade == self._identidade:
+            return
+        with self._lock:
+            if identidade != self._identidade:
+                if self._identidade is not None:
+                    self.invalidacoes += 1
+                self._itens.clear()
+                self._identidade = identidade
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                "tamanho": len(self._itens),
+                "tamanho_max": self.tamanho_max,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": (self.acertos / total) if total else 0.0,
+                "despejos": self.despejos,
+                "invalidacoes": self.invalidacoes,
+            }
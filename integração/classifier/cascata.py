@@ -0,0 +1,94 @@
+# classifier/cascata.py
+"""
+Primeiro estágio da cascata: um modelo linear sobre n-gramas de caracteres
+(TF-IDF + regressão logística), muito mais barato que o BERT.
+
+Prompts com probabilidade de injeção <= limiar_seguro ou >= limiar_injecao são
+decididos aqui; só a faixa incerta segue para o modelo fine-tunado. O artefato
+(e os limiares) é gerado por ANTIGENO_DIGITAL/TreinoCascata.py, que escolhe os
+limiares na validação mantendo recall combinado >= recall do BERT sozinho e grava
+os números medidos no teste.
+
+A busca dos limiares já respeita o limiar de bloqueio do Antígeno (INJECAO só com
+p >= limiar de bloqueio, SEGURO só abaixo dele). Um artefato que não respeite o
+limiar de bloqueio em uso é recusado na carga: mexer nos limiares aqui invalidaria
+o recall medido no treino.
+"""
+import os
+import threading
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_CASCATA = os.path.join(SCRIPT_DIR, "modelo_cascata", "cascata.joblib")
+CASCATA_ATIVA = os.getenv("ANTIGENO_CASCATA", "1") != "0"
+
+_ARTEFATO_CASCATA = None # dict carregado do joblib, ou "INDISPONIVEL"
+_LOCK_CASCATA = threading.Lock()
+
+
+def _violacao_limiares(artefato: dict, limiar_bloqueio: float):
+    """Motivo pelo qual os limiares do artefato contradizem o limiar de bloqueio, ou None."""
+    if artefato["limiar_injecao"] < limiar_bloqueio:
+        return f"limiar_injecao ({artefato['limiar_injecao']:.4f}) abaixo do limiar de bloqueio ({limiar_bloqueio:.4f})"
+    if artefato["limiar_seguro"] >= limiar_bloqueio:
+        return f"limiar_seguro ({artefato['limiar_seguro']:.4f}) não está abaixo do limiar de bloqueio ({limiar_bloqueio:.4f})"
+    return None
+
+
+def _carregar_cascata(limiar_bloqueio: float):
+    global _ARTEFATO_CASCATA
+    if _ARTEFATO_CASCATA is not None:
+        return _ARTEFATO_CASCATA
+    with _LOCK_CASCATA:
+        if _ARTEFATO_CASCATA is not None:
+            return _ARTEFATO_CASCATA
+        if not os.path.isfile(CAMINHO_CASCATA):
+            print(f"AVISO (Cascata): artefato não encontrado em '{CAMINHO_CASCATA}'. Todos os prompts irão direto para o BERT.")
+            _ARTEFATO_CASCATA = "INDISPONIVEL"
+            return _ARTEFATO_CASCATA
+        try:
+            import joblib
+            artefato = joblib.load(CAMINHO_CASCATA)
+            violacao = _violacao_limiares(artefato, limiar_bloqueio)
+            if violacao is not None:
+                print(f"AVISO (Cascata): artefato em '{CAMINHO_CASCATA}' recusado: {violacao}. "
+                      f"Gere-o de novo com ANTIGENO_DIGITAL/TreinoCascata.py. Todos os prompts irão direto para o BERT.")
+                _ARTEFATO_CASCATA = "INDISPONIVEL"
+                return _ARTEFATO_CASCATA
+            print(f"Cascata carregada: limiar_seguro={artefato['limiar_seguro']:.4f}, limiar_injecao={artefato['limiar_injecao']:.4f} "
+                  f"(no teste: recall combinado {artefato['recall_combinado']:.4f}, recall BERT {artefato['recall_bert']:.4f})")
+            _ARTEFATO_CASCATA = artefato
+        except Exception as e:
+            print(f"ERRO ao carregar a cascata de '{CAMINHO_CASCATA}': {e}. Todos os prompts irão direto para o BERT.")
+            _ARTEFATO_CASCATA = "INDISPONIVEL"
+    return _ARTEFATO_CASCATA
+
+
+def identidade_cascata() -> str:
+    """Identifica a versão do artefato em uso (entra na chave do cache de veredictos)."""
+    if not CASCATA_ATIVA:
+        return "desativada"
+    try:
+        info = os.stat(CAMINHO_CASCATA)
+        return f"{info.st_size}:{info.st_mtime_ns}"
+    except OSError:
+        return "indisponivel"
+
+
+def decidir_pela_cascata(prompt: str, limiar_bloqueio: float):
+    """
+    Retorna (decisao, prob_injecao), onde decisao é "SEGURO", "INJECAO" ou None
+    (faixa incerta, ou cascata desativada/indisponível: o BERT decide).
+    `limiar_bloqueio` (fixo no processo) valida os limiares do artefato na primeira chamada.
+    """
+    if not CASCATA_ATIVA:
+        return None, None
+    artefato = _carregar_cascata(limiar_bloqueio)
+    if artefato == "INDISPONIVEL":
+        return None, None
+
+    prob_injecao = float(artefato["classificador"].predict_proba(artefato["vetorizador"].transform([prompt]))[0][1])
+    if prob_injecao <= artefato["limiar_seguro"]:
+        return "SEGURO", prob_injecao
+    if prob_injecao >= artefato["limiar_injecao"]:
+        return "INJECAO", prob_injecao
+    return None, prob_injecao
@@ -0,0 +1,123 @@
+# classifier/exportar_onnx.py
+"""
+Exporta o modelo do classificador (MODEL_PATH) para ONNX, aplica as fusões de
+BERT do ONNX Runtime (atenção, GELU, LayerNorm) e verifica a paridade dos scores
+com o PyTorch em prompts_para_testar.csv.
+
+Uso (a partir da pasta integração/):
+    python -m classifier.exportar_onnx                  # exporta + verifica paridade
+    python -m classifier.exportar_onnx --apenas-verificar
+Depois, ative o backend com ANTIGENO_BACKEND=onnx.
+"""
+import argparse
+import csv
+import os
+import sys
+
+from classifier.model import MODEL_PATH, ONNX_MODEL_PATH, ClassificadorOnnx
+
+CAMINHO_CSV_PARIDADE = os.path.abspath(os.path.join(os.path.dirname(MODEL_PATH), "..", "..", "ANTIGENO_DIGITAL", "prompts_para_testar.csv"))
+COLUNA_TEXTO = "prompt_text"
+NOMES_ENTRADA = ["input_ids", "attention_mask", "token_type_ids"]
+OPSET_ONNX = 14
+
+
+def exportar(caminho_saida: str = ONNX_MODEL_PATH):
+    import torch
+    from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+    from onnxruntime.transformers.optimizer import optimize_model
+
+    os.makedirs(os.path.dirname(caminho_saida), exist_ok=True)
+    caminho_bruto = caminho_saida.replace(".onnx", "_bruto.onnx")
+
+    print(f"Carregando modelo PyTorch de: {MODEL_PATH}")
+    config = AutoConfig.from_pretrained(MODEL_PATH)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+    modelo = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH).eval()
+
+    exemplo = tokenizer(["Exemplo de prompt para exportação do grafo."], return_tensors="pt")
+    eixos_dinamicos = {nome: {0: "lote", 1: "sequencia"} for nome in NOMES_ENTRADA}
+    eixos_dinamicos["logits"] = {0: "lote"}
+
+    print(f"Exportando grafo ONNX (opset {OPSET_ONNX}) para: {caminho_bruto}")
+    with torch.inference_mode():
+        torch.onnx.export(
+            modelo,
+            tuple(exemplo[nome] for nome in NOMES_ENTRADA),
+            caminho_bruto,
+            input_names=NOMES_ENTRADA,
+            output_names=["logits"],
+            dynamic_axes=eixos_dinamicos,
+            opset_version=OPSET_ONNX,
+            do_constant_folding=True,
+        )
+
+    print("Otimizando o grafo (fusão de atenção, GELU e LayerNorm)...")
+    modelo_otimizado = optimize_model(
+        caminho_bruto,
+        model_type="bert",
+        num_heads=config.num_attention_heads,
+        hidden_size=config.hidden_size,
+    )
+    modelo_otimizado.save_model_to_file(caminho_saida)
+    os.remove(caminho_bruto)
+    print(f"Operadores fundidos: {modelo_otimizado.get_fused_operator_statistics()}")
+    print(f"Grafo ONNX otimizado salvo em: {caminho_saida}")
+
+
+def ler_prompts_csv(caminho_csv: str) -> list:
+    with open(caminho_csv, mode="r", encoding="utf-8", newline='') as arquivo_csv:
+        return [linha[COLUNA_TEXTO].strip() for linha in csv.DictReader(arquivo_csv) if linha.get(COLUNA_TEXTO, "").strip()]
+
+
+def verificar_paridade(caminho_onnx: str = ONNX_MODEL_PATH, caminho_csv: str = CAMINHO_CSV_PARIDADE,
+                       tolerancia: float = 1e-3, batch_size: int = 32) -> bool:
+    """Compara as probabilidades do PyTorch e do ONNX Runtime prompt a prompt. Retorna True se dentro da tolerância."""
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    prompts = ler_prompts_csv(caminho_csv)
+    print(f"Verificando paridade PyTorch x ONNX em {len(prompts)} prompts de '{caminho_csv}' (tolerância {tolerancia})...")
+
+    modelo_pt = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH).eval()
+    classificador_onnx = ClassificadorOnnx(caminho_onnx, MODEL_PATH)
+    tokenizer = classificador_onnx.tokenizer
+    max_tokens = modelo_pt.config.max_position_embeddings
+
+    maior_diferenca = 0.0
+    labels_divergentes = 0
+    for inicio in range(0, len(prompts), batch_size):
+        lote = prompts[inicio:inicio + batch_size]
+        with torch.inference_mode():
+            entradas_pt = tokenizer(lote, padding=True, truncation=True, max_length=max_tokens, return_tensors="pt")
+            probs_pt = torch.softmax(modelo_pt(**entradas_pt).logits, dim=-1).tolist()
+        entradas_np = tokenizer(lote, padding=True, truncation=True, max_length=max_tokens, return_tensors="np")
+        probs_onnx = classificador_onnx.inferir_probabilidades(dict(entradas_np))
+
+        for p_pt, p_onnx in zip(probs_pt, probs_onnx):
+            maior_diferenca = max(maior_diferenca, max(abs(a - b) for a, b in zip(p_pt, p_onnx)))
+            if p_pt.index(max(p_pt)) != p_onnx.index(max(p_onnx)):
+                labels_divergentes += 1
+
+    aprovado = maior_diferenca <= tolerancia and labels_divergentes == 0
+    print(f"Maior diferença absoluta de probabilidade: {maior_diferenca:.2e}")
+    print(f"Prompts com label divergente: {labels_divergentes}")
+    print("PARIDADE OK: o backend ONNX pode substituir o PyTorch." if aprovado else "PARIDADE FALHOU: não troque o backend.")
+    return aprovado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta o classificador do Antígeno Digital para ONNX e verifica a paridade.")
+    parser.add_argument("--saida", default=ONNX_MODEL_PATH, help="Caminho do grafo ONNX otimizado.")
+    parser.add_argument("--csv", default=CAMINHO_CSV_PARIDADE, help="CSV com a coluna 'prompt_text' usado na verificação.")
+    parser.add_argument("--tolerancia", type=float, default=1e-3, help="Diferença absoluta máxima aceita por probabilidade.")
+    parser.add_argument("--apenas-verificar", action="store_true", help="Não exporta; só verifica um grafo já existente.")
+    args = parser.parse_args()
+
+    if not args.apenas_verificar:
+        exportar(args.saida)
+    sys.exit(0 if verificar_paridade(args.saida, args.csv, args.tolerancia) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+# classifier/registro_modelos.py
+"""
+Troca da versão do modelo sem reiniciar o bot e sem deixar de atender.
+
+`trocar_modelo(nome)`:
+  1. carrega a nova versão em segundo plano (o tráfego segue na versão ativa);
+  2. aquece todas as réplicas dela (classifier.model.aquecer_versao);
+  3. roda o canário: uma amostra fixa de prompts_para_testar.csv classificada pela nova
+     versão e pela ativa. A troca é recusada se a nova tiver algum ERRO_*, acurácia abaixo
+     de ANTIGENO_CANARIO_ACURACIA_MIN ou mais de ANTIGENO_CANARIO_TOLERANCIA abaixo da ativa;
+  4. troca: uma atribuição (classifier.model.ativar_versao). Lotes em andamento terminam nas
+     réplicas da versão anterior; o cache de veredictos muda de chave junto (identidade do modelo).
+
+A versão anterior fica carregada por ANTIGENO_ROLLBACK_JANELA_S segundos (padrão 300):
+`reverter_modelo()` nesse intervalo é outra atribuição, instantânea. Depois disso (ou na
+troca seguinte) ela é liberada assim que a última réplica emprestada volta ao pool;
+um rollback tardio recarrega a versão anterior do disco (sem canário: ela já estava em uso).
+
+Os nomes são diretórios com config.json dentro de classifier/ ou de uma das pastas de
+ANTIGENO_DIRETORIOS_MODELOS (separadas por os.pathsep), ou um caminho direto.
+
+Gatilhos: "!antigeno-admin" no bot (discord_bot.py), /admin/* no servico_http.py e sinais
+(instalar_sinais): SIGHUP recarrega o modelo nomeado em ANTIGENO_MODELO_ALVO_ARQUIVO (ou o
+atual, se o arquivo não existir: útil para um re-treino gravado no mesmo diretório) e
+SIGUSR2 faz o rollback.
+
+Só o backend "threads" troca em processo. Com ANTIGENO_BACKEND_EXECUCAO=processos a troca é
+recusada (reinicie os workers); no modo cliente, troque no servico_classificador.py.
+"""
+import csv
+import gc
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from collections import deque
+
+from classifier import model
+from metricas import CONTADOR_TROCAS_MODELO
+
+DIRETORIOS_MODELOS = [model.SCRIPT_DIR] + [d for d in os.getenv("ANTIGENO_DIRETORIOS_MODELOS", "").split(os.pathsep) if d]
+CAMINHO_CANARIO = os.getenv("ANTIGENO_CANARIO_CSV", os.path.abspath(os.path.join(model.SCRIPT_DIR, "..", "..", "ANTIGENO_DIGITAL", "prompts_para_testar.csv")))
+CANARIO_TAMANHO = int(os.getenv("ANTIGENO_CANARIO_TAMANHO", "64"))
+CANARIO_ACURACIA_MIN = float(os.getenv("ANTIGENO_CANARIO_ACURACIA_MIN", "0.85"))
+CANARIO_TOLERANCIA = float(os.getenv("ANTIGENO_CANARIO_TOLERANCIA", "0.02"))
+JANELA_ROLLBACK_S = float(os.getenv("ANTIGENO_ROLLBACK_JANELA_S", "300"))
+ARQUIVO_MODELO_ALVO = os.getenv("ANTIGENO_MODELO_ALVO_ARQUIVO", "")
+
+_LOCK_TROCA = threading.Lock() # Uma troca (ou rollback) por vez
+VERSAO_RESERVA = None # Versão anterior, ainda carregada, para rollback instantâneo
+_EXPIRACAO_RESERVA = None # threading.Timer que libera a reserva
+_NOME_ANTERIOR = None # Para o rollback depois que a reserva foi liberada
+_AMOSTRA_CANARIO = None
+HISTORICO_TROCAS = deque(maxlen=20)
+
+
+class TrocaModeloErro(Exception):
+    """A troca foi recusada (canário, modo sem suporte, outra troca em andamento) ou falhou ao carregar."""
+
+
+def resolver_caminho(nome: str) -> str:
+    if os.path.isabs(nome) or os.sep in nome:
+        caminho = os.path.abspath(nome)
+        if os.path.isfile(os.path.join(caminho, "config.json")):
+            return caminho
+    else:
+        for diretorio in DIRETORIOS_MODELOS:
+            caminho = os.path.abspath(os.path.join(diretorio, nome))
+            if os.path.isfile(os.path.join(caminho, "config.json")):
+                return caminho
+    raise TrocaModeloErro(f"Modelo '{nome}' não encontrado (procurado em: {DIRETORIOS_MODELOS}).")
+
+
+def listar_versoes() -> list:
+    """Nomes dos diretórios de modelo disponíveis para troca."""
+    nomes = set()
+    for diretorio in DIRETORIOS_MODELOS:
+        try:
+            nomes.update(nome for nome in os.listdir(diretorio) if os.path.isfile(os.path.join(diretorio, nome, "config.json")))
+        except OSError:
+            pass
+    return sorted(nomes)
+
+
+def _verificar_modo():
+    if model.CLIENTE_SERVICO is not None:
+        raise TrocaModeloErro("Modo cliente: a troca de modelo é feita no servico_classificador.py.")
+    if model.POOL_PROCESSOS is not None:
+        raise TrocaModeloErro("Backend 'processos' não troca o modelo em execução: reinicie com ANTIGENO_MODEL_NAME.")
+    if not model.classificador_pronto() or model.VERSAO_ATIVA is None:
+        raise TrocaModeloErro(f"Classificador não está pronto (estado: {model.obter_estado_classificador()}).")
+
+
+# --- Canário ---
+def _obter_amostra_canario() -> list:
+    """(prompt, classificação esperada): a mesma amostra em todas as trocas, para comparar versões."""
+    global _AMOSTRA_CANARIO
+    if _AMOSTRA_CANARIO is None:
+        with open(CAMINHO_CANARIO, mode="r", encoding="utf-8", newline="") as arquivo_csv:
+            linhas = [
+                (linha["prompt_text"].strip(), linha["classificacao_esperada"].strip().upper())
+                for linha in csv.DictReader(arquivo_csv)
+                if (linha.get("prompt_text") or "").strip() and (linha.get("classificacao_esperada") or "").strip().upper() in ("SEGURO", "INJECAO")
+            ]
+        _AMOSTRA_CANARIO = random.Random(0).sample(linhas, min(CANARIO_TAMANHO, len(linhas)))
+    return _AMOSTRA_CANARIO
+
+
+def _avaliar_canario(versao, amostra: list) -> dict:
+    inicio = time.perf_counter()
+    resultados = model._classificar_ordenado([prompt for prompt, _ in amostra], model.MICROLOTE_TAMANHO_MAX, versao)
+    acertos = sum(1 for resultado, (_, esperado) in zip(resultados, amostra) if resultado["label_ia"] == esperado)
+    return {
+        "acuracia": round(acertos / len(amostra), 4) if amostra else 1.0,
+        "erros": sum(1 for resultado in resultados if resultado["label_ia"].startswith("ERRO")),
+        "duracao_ms": round((time.perf_counter() - inicio) * 1000, 1),
+    }
+
+
+def _motivo_reprovacao(canario_nova: dict, canario_ativa: dict):
+    if canario_nova["erros"]:
+        return f"{canario_nova['erros']} prompt(s) com erro de análise"
+    if canario_nova["acuracia"] < CANARIO_ACURACIA_MIN:
+        return f"acurácia {canario_nova['acuracia']:.2%} abaixo do mínimo de {CANARIO_ACURACIA_MIN:.2%}"
+    if canario_nova["acuracia"] < canario_ativa["acuracia"] - CANARIO_TOLERANCIA:
+        return f"acurácia {canario_nova['acuracia']:.2%} contra {canario_ativa['acuracia']:.2%} da versão ativa"
+    return None
+
+
+# --- Reserva e liberação ---
+def _liberar_versao(versao, timeout_s: float = None):
+    """Espera os lotes em andamento devolverem as réplicas e solta os pesos (roda numa thread própria)."""
+    prazo = time.monotonic() + (model.TIMEOUT_EMPRESTIMO_S * 2 if timeout_s is None else timeout_s)
+    while not versao.pool.ociosa() and time.monotonic() < prazo:
+        time.sleep(0.05)
+    if not versao.pool.ociosa():
+        print(f"AVISO: réplicas de '{versao.nome}' ainda em uso após o prazo; os pesos serão soltos quando elas voltarem.")
+    versao.pool.descartar()
+    gc.collect()
+    torch = sys.modules.get("torch") # Só se já foi importado: a liberação não deve carregar o torch
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    print(f"Versão '{versao.nome}' ({versao.identidade}) liberada da memória.")
+
+
+def _liberar_em_segundo_plano(versao):
+    threading.Thread(target=_liberar_versao, args=(versao,), name="antigeno-liberar-modelo", daemon=True).start()
+
+
+def _guardar_reserva(anterior):
+    """Mantém `anterior` para rollback instantâneo por JANELA_ROLLBACK_S; a reserva que havia é liberada."""
+    global VERSAO_RESERVA, _EXPIRACAO_RESERVA, _NOME_ANTERIOR
+    _descartar_reserva()
+    if anterior is None:
+        return
+    _NOME_ANTERIOR = anterior.nome
+    if JANELA_ROLLBACK_S <= 0:
+        _liberar_em_segundo_plano(anterior)
+        return
+    VERSAO_RESERVA = anterior
+    _EXPIRACAO_RESERVA = threading.Timer(JANELA_ROLLBACK_S, _expirar_reserva, args=(anterior,))
+    _EXPIRACAO_RESERVA.daemon = True
+    _EXPIRACAO_RESERVA.start()
+
+
+def _descartar_reserva():
+    global VERSAO_RESERVA, _EXPIRACAO_RESERVA
+    if _EXPIRACAO_RESERVA is not None:
+        _EXPIRACAO_RESERVA.cancel()
+        _EXPIRACAO_RESERVA = None
+    if VERSAO_RESERVA is not None:
+        _liberar_em_segundo_plano(VERSAO_RESERVA)
+        VERSAO_RESERVA = None
+
+
+def _expirar_reserva(versao):
+    global VERSAO_RESERVA, _EXPIRACAO_RESERVA
+    with _LOCK_TROCA:
+        if VERSAO_RESERVA is not versao: # Já usada num rollback ou substituída
+            return
+        VERSAO_RESERVA = None
+        _EXPIRACAO_RESERVA = None
+    _liberar_versao(versao)
+
+
+# --- Troca e rollback ---
+def _adquirir_lock():
+    if not _LOCK_TROCA.acquire(blocking=False):
+        raise TrocaModeloErro("Já há uma troca de modelo em andamento.")
+
+
+def _carregar_e_aquecer(nome: str, caminho: str):
+    inicio = time.perf_counter()
+    try:
+        versao = model.carregar_versao(nome, caminho)
+        tempo_carga_s = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        model.aquecer_versao(versao)
+    except Exception as e:
+        raise TrocaModeloErro(f"Falha ao carregar '{nome}' de '{caminho}': {e}")
+    return versao, {"carga_s": round(tempo_carga_s, 2), "aquecimento_s": round(time.perf_counter() - inicio, 2)}
+
+
+def _registrar_troca(operacao: str, anterior, nova, detalhes: dict) -> dict:
+    registro = dict(detalhes, operacao=operacao, instante=time.time(), anterior=anterior.nome if anterior else None,
+                    nova=nova.nome, identidade=nova.identidade)
+    HISTORICO_TROCAS.append(registro)
+    CONTADOR_TROCAS_MODELO.inc(operacao, "ok")
+    print(f"Modelo trocado ({operacao}): '{registro['anterior']}' -> '{nova.nome}' ({nova.identidade}). {detalhes}")
+    return registro
+
+
+def trocar_modelo(nome: str) -> dict:
+    """
+    Carrega, aquece, valida no canário e ativa a versão `nome`. Bloqueia até terminar
+    (segundos: chame fora do loop de eventos). Levanta TrocaModeloErro se a troca for recusada.
+    """
+    _adquirir_lock()
+    resultado = "erro"
+    try:
+        _verificar_modo()
+        caminho = resolver_caminho(nome)
+        nome = os.path.basename(os.path.normpath(nome))
+        print(f"Carregando '{nome}' de '{caminho}' para troca (o tráfego continua em '{model.VERSAO_ATIVA.nome}')...")
+        candidata, detalhes = _carregar_e_aquecer(nome, caminho)
+        try:
+            amostra = _obter_amostra_canario()
+            detalhes["canario"] = _avaliar_canario(candidata, amostra)
+            detalhes["canario_ativa"] = _avaliar_canario(model.VERSAO_ATIVA, amostra)
+            motivo = _motivo_reprovacao(detalhes["canario"], detalhes["canario_ativa"])
+        except Exception as e:
+            motivo = f"canário não pôde ser executado: {e}"
+        if motivo is not None:
+            _liberar_em_segundo_plano(candidata)
+            resultado = "recusada"
+            raise TrocaModeloErro(f"Troca para '{nome}' recusada pelo canário: {motivo}.")
+        anterior = model.ativar_versao(candidata)
+        _guardar_reserva(anterior)
+        return _registrar_troca("troca", anterior, candidata, detalhes)
+    except TrocaModeloErro:
+        CONTADOR_TROCAS_MODELO.inc("troca", resultado)
+        raise
+    finally:
+        _LOCK_TROCA.release()
+
+
+def reverter_modelo() -> dict:
+    """
+    Volta para a versão anterior: instantâneo dentro da janela de rollback (a anterior ainda
+    está carregada); depois dela, recarrega a anterior do disco.
+    """
+    global VERSAO_RESERVA
+    _adquirir_lock()
+    try:
+        _verificar_modo()
+        if VERSAO_RESERVA is not None:
+            reserva, VERSAO_RESERVA = VERSAO_RESERVA, None
+            _EXPIRACAO_RESERVA.cancel()
+            detalhes = {"instantaneo": True}
+        elif _NOME_ANTERIOR is not None:
+            reserva, detalhes = _carregar_e_aquecer(_NOME_ANTERIOR, resolver_caminho(_NOME_ANTERIOR))
+            detalhes["instantaneo"] = False
+        else:
+            raise TrocaModeloErro("Nenhuma versão anterior para reverter.")
+        anterior = model.ativar_versao(reserva)
+        _guardar_reserva(anterior) # Rollback do rollback também é instantâneo
+        return _registrar_troca("rollback", anterior, reserva, detalhes)
+    except TrocaModeloErro:
+        CONTADOR_TROCAS_MODELO.inc("rollback", "erro")
+        raise
+    finally:
+        _LOCK_TROCA.release()
+
+
+def estatisticas() -> dict:
+    ativa, reserva = model.VERSAO_ATIVA, VERSAO_RESERVA
+    return {
+        "ativa": ativa.descricao() if ativa is not None else None,
+        "reserva_rollback": reserva.descricao() if reserva is not None else None,
+        "janela_rollback_s": JANELA_ROLLBACK_S,
+        "troca_em_andamento": _LOCK_TROCA.locked(),
+        "disponiveis": listar_versoes(),
+        "historico": list(HISTORICO_TROCAS),
+    }
+
+
+# --- Sinais ---
+def _executar_em_segundo_plano(funcao, *args):
+    def alvo():
+        try:
+            funcao(*args)
+        except TrocaModeloErro as e:
+            print(f"AVISO: {e}")
+        except Exception as e:
+            print(f"ERRO inesperado na troca de modelo: {e}")
+    threading.Thread(target=alvo, name="antigeno-troca-modelo", daemon=True).start()
+
+
+def _recarregar_por_sinal():
+    nome = model.VERSAO_ATIVA.nome if model.VERSAO_ATIVA is not None else model.MODEL_NAME
+    if ARQUIVO_MODELO_ALVO and os.path.isfile(ARQUIVO_MODELO_ALVO):
+        with open(ARQUIVO_MODELO_ALVO, "r", encoding="utf-8") as arquivo:
+            nome = arquivo.read().strip() or nome
+    trocar_modelo(nome)
+
+
+def instalar_sinais(loop):
+    """SIGHUP troca o modelo e SIGUSR2 reverte, em segundo plano. Sem efeito onde não há esses sinais (Windows)."""
+    if not hasattr(signal, "SIGHUP") or not hasattr(signal, "SIGUSR2"):
+        return
+    loop.add_signal_handler(signal.SIGHUP, _executar_em_segundo_plano, _recarregar_por_sinal)
+    loop.add_signal_handler(signal.SIGUSR2, _executar_em_segundo_plano, reverter_modelo)
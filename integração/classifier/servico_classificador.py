@@ -0,0 +1,383 @@
+# classifier/servico_classificador.py
+"""
+Classificador como serviço local, compartilhado por vários processos do bot (shards).
+
+Um único processo carrega o modelo (qualquer backend: threads, processos, ONNX) e
+atende os clientes por socket Unix ou TCP local. Cada bot configurado com
+ANTIGENO_SERVICO_CLASSIFICADOR=<endereço> usa o modo cliente de classifier/model.py
+em vez de carregar a própria cópia do modelo.
+
+Protocolo binário (big-endian), várias requisições em voo por conexão:
+    requisição: cabeçalho "!IBfI" (id, tipo, limiar, tamanho_corpo) + corpo
+        TIPO_PROMPT: corpo = prompt UTF-8
+        TIPO_LONGO:  corpo = prompt UTF-8 (avaliado em janelas com `limiar`)
+        TIPO_LOTE:   corpo = "!II" (batch_size, quantidade) + quantidade x ("!I" tamanho + prompt UTF-8);
+                     limiar NaN = sem janelas
+        TIPO_ESTADO: corpo vazio
+    resposta: cabeçalho "!IBI" (id, status, tamanho_corpo) + corpo
+        STATUS_OK para análises: "!I" quantidade + quantidade x ("!fHHB" score, janelas_avaliadas,
+                                 janelas_total, tamanho_label + label UTF-8)
+        STATUS_OK para TIPO_ESTADO: JSON UTF-8; STATUS_ERRO: mensagem UTF-8
+
+O agrupamento em lotes fica no servidor: requisições simultâneas de todos os
+clientes rodam em threads e caem no AgendadorMicroLotes (ou nos workers de
+POOL_PROCESSOS), que as juntam em um único forward pass.
+
+Uso (a partir da pasta integração/):
+    python -m classifier.servico_classificador --endereco unix:/tmp/antigeno.sock --warmup
+    ANTIGENO_SERVICO_CLASSIFICADOR=unix:/tmp/antigeno.sock python discord_bot.py
+    # Com --porta-metricas 9101, GET http://127.0.0.1:9101/metrics expõe as métricas (ver metricas.py)
+    # Troca do modelo para todos os shards, sem reiniciar (ver classifier/registro_modelos.py):
+    echo modelo_detector_injecao_v2 > alvo.txt; ANTIGENO_MODELO_ALVO_ARQUIVO=alvo.txt ...; kill -HUP <pid>  (kill -USR2 reverte)
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+CABECALHO_REQUISICAO = struct.Struct("!IBfI")
+CABECALHO_RESPOSTA = struct.Struct("!IBI")
+CABECALHO_LOTE = struct.Struct("!II")
+TAMANHO = struct.Struct("!I")
+RESULTADO = struct.Struct("!fHHB")
+TAMANHO_MAX_CORPO = 64 * 1024 * 1024
+
+TIPO_PROMPT, TIPO_LONGO, TIPO_LOTE, TIPO_ESTADO = 1, 2, 3, 4
+STATUS_OK, STATUS_ERRO = 0, 1
+
+
+class ErroServicoClassificador(Exception):
+    """Serviço inacessível, conexão perdida ou requisição sem resposta no prazo."""
+
+
+def interpretar_endereco(endereco: str):
+    """'unix:/caminho.sock' -> (AF_UNIX, caminho); 'tcp:host:porta' ou 'host:porta' -> (AF_INET, (host, porta))."""
+    if endereco.startswith("unix:"):
+        return socket.AF_UNIX, endereco[len("unix:"):]
+    if endereco.startswith("tcp:"):
+        endereco = endereco[len("tcp:"):]
+    host, _, porta = endereco.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(porta))
+
+
+# --- Codificação ---
+def _codificar_textos(textos: list) -> bytes:
+    partes = []
+    for texto in textos:
+        dados = texto.encode("utf-8")
+        partes.append(TAMANHO.pack(len(dados)) + dados)
+    return b"".join(partes)
+
+
+def _decodificar_textos(corpo: bytes, quantidade: int, posicao: int = 0) -> list:
+    textos = []
+    for _ in range(quantidade):
+        (tamanho,) = TAMANHO.unpack_from(corpo, posicao)
+        posicao += TAMANHO.size
+        textos.append(corpo[posicao:posicao + tamanho].decode("utf-8"))
+        posicao += tamanho
+    return textos
+
+
+def codificar_resultados(resultados: list) -> bytes:
+    partes = [TAMANHO.pack(len(resultados))]
+    for resultado in resultados:
+        label = resultado.get("label_ia", "ERRO_INESPERADO_IA").encode("utf-8")[:255]
+        partes.append(RESULTADO.pack(
+            float(resultado.get("score_ia", 0.0)),
+            min(int(resultado.get("janelas_avaliadas", 0)), 0xFFFF),
+            min(int(resultado.get("janelas_total", 0)), 0xFFFF),
+            len(label),
+        ) + label)
+    return b"".join(partes)
+
+
+def decodificar_resultados(corpo: bytes) -> list:
+    (quantidade,) = TAMANHO.unpack_from(corpo, 0)
+    posicao = TAMANHO.size
+    resultados = []
+    for _ in range(quantidade):
+        score, janelas_avaliadas, janelas_total, tamanho_label = RESULTADO.unpack_from(corpo, posicao)
+        posicao += RESULTADO.size
+        resultado = {"label_ia": corpo[posicao:posicao + tamanho_label].decode("utf-8"), "score_ia": score}
+        posicao += tamanho_label
+        if janelas_total:
+            resultado.update({"janelas_avaliadas": janelas_avaliadas, "janelas_total": janelas_total})
+        resultados.append(resultado)
+    return resultados
+
+
+# --- Servidor ---
+class ServicoClassificador:
+
+    def __init__(self, endereco: str, max_threads: int = 32):
+        self.endereco = endereco
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="antigeno-servico")
+        self.conexoes_ativas = 0
+        self.requisicoes = 0
+        self.erros = 0
+
+    async def iniciar(self):
+        familia, alvo = interpretar_endereco(self.endereco)
+        if familia == socket.AF_UNIX:
+            if os.path.exists(alvo):
+                os.unlink(alvo) # Socket de uma execução anterior
+            return await asyncio.start_unix_server(self._atender, path=alvo)
+        return await asyncio.start_server(self._atender, host=alvo[0], port=alvo[1])
+
+    def _processar(self, tipo: int, limiar: float, corpo: bytes):
+        """Roda em uma thread do executor. Retorna (status, corpo da resposta)."""
+        from classifier import model
+        if tipo == TIPO_ESTADO:
+            return STATUS_OK, json.dumps(self.estado()).encode("utf-8")
+        if tipo == TIPO_PROMPT:
+            resultados = [model.analisar_prompt_pela_ia(corpo.decode("utf-8"))]
+        elif tipo == TIPO_LONGO:
+            resultados = [model.analisar_prompt_longo_pela_ia(corpo.decode("utf-8"), limiar)]
+        elif tipo == TIPO_LOTE:
+            batch_size, quantidade = CABECALHO_LOTE.unpack_from(corpo, 0)
+            prompts = _decodificar_textos(corpo, quantidade, CABECALHO_LOTE.size)
+            resultados = model.analisar_prompts_em_lote(prompts, batch_size, None if math.isnan(limiar) else limiar)
+        else:
+            return STATUS_ERRO, f"Tipo de requisição desconhecido: {tipo}".encode("utf-8")
+        return STATUS_OK, codificar_resultados(resultados)
+
+    async def _responder(self, escritor, lock_escrita, id_requisicao: int, tipo: int, limiar: float, corpo: bytes):
+        try:
+            status, corpo_resposta = await asyncio.get_running_loop().run_in_executor(self._executor, self._processar, tipo, limiar, corpo)
+        except Exception as e:
+            self.erros += 1
+            print(f"Erro no serviço do classificador (requisição tipo {tipo}): {e}")
+            status, corpo_resposta = STATUS_ERRO, str(e).encode("utf-8")
+        async with lock_escrita:
+            escritor.write(CABECALHO_RESPOSTA.pack(id_requisicao, status, len(corpo_resposta)) + corpo_resposta)
+            await escritor.drain()
+
+    async def _atender(self, leitor, escritor):
+        self.conexoes_ativas += 1
+        lock_escrita = asyncio.Lock()
+        tarefas = set()
+        try:
+            while True:
+                cabecalho = await leitor.readexactly(CABECALHO_REQUISICAO.size)
+                id_requisicao, tipo, limiar, tamanho_corpo = CABECALHO_REQUISICAO.unpack(cabecalho)
+                if tamanho_corpo > TAMANHO_MAX_CORPO:
+                    print(f"AVISO: requisição de {tamanho_corpo} bytes recusada; conexão encerrada.")
+                    break
+                corpo = await leitor.readexactly(tamanho_corpo)
+                self.requisicoes += 1
+                tarefa = asyncio.ensure_future(self._responder(escritor, lock_escrita, id_requisicao, tipo, limiar, corpo))
+                tarefas.add(tarefa)
+                tarefa.add_done_callback(tarefas.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass # Cliente desconectou
+        finally:
+            for tarefa in tarefas:
+                tarefa.cancel()
+            self.conexoes_ativas -= 1
+            escritor.close()
+
+    def estado(self) -> dict:
+        from classifier import model
+        return {
+            "estado": model.obter_estado_classificador(),
+            "max_tokens": model.MAX_TOKENS_MODELO,
+            "identidade_modelo": model.obter_identidade_modelo(),
+            "conexoes_ativas": self.conexoes_ativas,
+            "requisicoes": self.requisicoes,
+            "erros": self.erros,
+        }
+
+
+# --- Cliente ---
+class ClienteServicoClassificador:
+    """
+    Cliente síncrono e thread-safe: uma conexão compartilhada, requisições multiplexadas
+    por id e uma thread que lê as respostas. Se a conexão cai, as requisições em voo
+    falham com ErroServicoClassificador e a próxima chamada reconecta (após uma tentativa
+    que falhou, a seguinte só depois de `espera_reconexao_s`).
+    """
+
+    def __init__(self, endereco: str, timeout_conexao_s: float = 2.0, timeout_requisicao_s: float = 30.0,
+                 espera_reconexao_s: float = 1.0):
+        self.endereco = endereco
+        self.timeout_conexao_s = timeout_conexao_s
+        self.timeout_requisicao_s = timeout_requisicao_s
+        self.espera_reconexao_s = espera_reconexao_s
+        self._socket = None
+        self._pendentes = {} # id -> Future
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._lock_escrita = threading.Lock()
+        self._ultima_falha_conexao = float("-inf")
+        self.reconexoes = 0
+        self.falhas = 0
+
+    def _conectar(self):
+        """Retorna o socket conectado (chamado com self._lock adquirido)."""
+        if self._socket is not None:
+            return self._socket
+        if time.monotonic() - self._ultima_falha_conexao < self.espera_reconexao_s:
+            raise ErroServicoClassificador(f"Serviço do classificador indisponível em '{self.endereco}' (aguardando para reconectar).")
+        familia, alvo = interpretar_endereco(self.endereco)
+        conexao = socket.socket(familia, socket.SOCK_STREAM)
+        conexao.settimeout(self.timeout_conexao_s)
+        try:
+            conexao.connect(alvo)
+        except OSError as e:
+            conexao.close()
+            self._ultima_falha_conexao = time.monotonic()
+            raise ErroServicoClassificador(f"Não foi possível conectar ao serviço do classificador em '{self.endereco}': {e}")
+        conexao.settimeout(None)
+        if familia == socket.AF_INET:
+            conexao.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._socket = conexao
+        self.reconexoes += 1
+        threading.Thread(target=self._loop_leitura, args=(conexao,), name="antigeno-cliente-servico", daemon=True).start()
+        return conexao
+
+    def _ler_exato(self, conexao, tamanho: int) -> bytes:
+        dados = bytearray()
+        while len(dados) < tamanho:
+            pedaco = conexao.recv(tamanho - len(dados))
+            if not pedaco:
+                raise ConnectionError("Conexão encerrada pelo serviço.")
+            dados.extend(pedaco)
+        return bytes(dados)
+
+    def _loop_leitura(self, conexao):
+        try:
+            while True:
+                id_requisicao, status, tamanho_corpo = CABECALHO_RESPOSTA.unpack(self._ler_exato(conexao, CABECALHO_RESPOSTA.size))
+                corpo = self._ler_exato(conexao, tamanho_corpo)
+                with self._lock:
+                    futuro = self._pendentes.pop(id_requisicao, None)
+                if futuro is not None and not futuro.done():
+                    futuro.set_result((status, corpo))
+        except (OSError, ConnectionError, struct.error) as e:
+            self._desconectar(conexao, f"Conexão com o serviço do classificador perdida: {e}")
+
+    def _desconectar(self, conexao, mensagem: str):
+        with self._lock:
+            if self._socket is conexao:
+                self._socket = None
+            pendentes, self._pendentes = self._pendentes, {}
+        try:
+            conexao.shutdown(socket.SHUT_RDWR) # Só close() não acorda o recv() da thread de leitura nem avisa o serviço
+        except OSError:
+            pass
+        try:
+            conexao.close()
+        except OSError:
+            pass
+        for futuro in pendentes.values():
+            if not futuro.done():
+                futuro.set_exception(ErroServicoClassificador(mensagem))
+
+    def _requisitar(self, tipo: int, limiar: float, corpo: bytes) -> bytes:
+        futuro = Future()
+        with self._lock:
+            conexao = self._conectar()
+            id_requisicao = next(self._ids) & 0xFFFFFFFF
+            self._pendentes[id_requisicao] = futuro
+        try:
+            with self._lock_escrita:
+                conexao.sendall(CABECALHO_REQUISICAO.pack(id_requisicao, tipo, limiar, len(corpo)) + corpo)
+        except OSError as e:
+            self._desconectar(conexao, f"Falha ao enviar ao serviço do classificador: {e}")
+        try:
+            status, corpo_resposta = futuro.result(timeout=self.timeout_requisicao_s)
+        except FuturesTimeoutError:
+            with self._lock:
+                self._pendentes.pop(id_requisicao, None)
+            self.falhas += 1
+            raise ErroServicoClassificador(f"Serviço do classificador não respondeu em {self.timeout_requisicao_s:g}s.")
+        except ErroServicoClassificador:
+            self.falhas += 1
+            raise
+        if status != STATUS_OK:
+            raise ErroServicoClassificador(f"Serviço do classificador retornou erro: {corpo_resposta.decode('utf-8', 'replace')}")
+        return corpo_resposta
+
+    def analisar(self, prompt: str) -> dict:
+        return decodificar_resultados(self._requisitar(TIPO_PROMPT, 0.0, prompt.encode("utf-8")))[0]
+
+    def analisar_longo(self, prompt: str, limiar_bloqueio: float) -> dict:
+        return decodificar_resultados(self._requisitar(TIPO_LONGO, limiar_bloqueio, prompt.encode("utf-8")))[0]
+
+    def analisar_lote(self, prompts: list, batch_size: int, limiar_bloqueio_janelas: float = None) -> list:
+        corpo = CABECALHO_LOTE.pack(max(int(batch_size), 1), len(prompts)) + _codificar_textos(prompts)
+        limiar = float("nan") if limiar_bloqueio_janelas is None else limiar_bloqueio_janelas
+        return decodificar_resultados(self._requisitar(TIPO_LOTE, limiar, corpo))
+
+    def consultar_estado(self) -> dict:
+        return json.loads(self._requisitar(TIPO_ESTADO, 0.0, b"").decode("utf-8"))
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "endereco": self.endereco,
+                "conectado": self._socket is not None,
+                "em_voo": len(self._pendentes),
+                "reconexoes": self.reconexoes,
+                "falhas": self.falhas,
+            }
+
+    def fechar(self):
+        with self._lock:
+            conexao = self._socket
+        if conexao is not None:
+            self._desconectar(conexao, "Cliente do serviço do classificador encerrado.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço local do classificador do Antígeno Digital.")
+    parser.add_argument("--endereco", default=os.getenv("ANTIGENO_SERVICO_CLASSIFICADOR") or "unix:/tmp/antigeno_classificador.sock",
+                        help="unix:/caminho.sock ou tcp:127.0.0.1:8765")
+    parser.add_argument("--threads", type=int, default=32, help="Requisições analisadas ao mesmo tempo (agrupadas em micro-lotes).")
+    parser.add_argument("--warmup", action="store_true", help="Aquece o modelo antes de aceitar conexões.")
+    parser.add_argument("--porta-metricas", type=int, default=int(os.getenv("ANTIGENO_METRICAS_PORTA", "0")),
+                        help="Porta do GET /metrics (Prometheus); 0 = desativado.")
+    args = parser.parse_args()
+
+    from classifier import model
+    model.ENDERECO_SERVICO = "" # O serviço carrega o modelo; nunca é cliente de si mesmo
+    model.inicializar_classificador()
+    if not model.classificador_pronto():
+        print(f"ERRO CRÍTICO: classificador não carregou (estado {model.obter_estado_classificador()}). Serviço não iniciado.")
+        raise SystemExit(1)
+    if args.warmup:
+        print(f"Aquecimento concluído em {model.aquecer_classificador():.2f}s.")
+
+    async def servir():
+        servico = ServicoClassificador(args.endereco, args.threads)
+        servidor = await servico.iniciar()
+        print(f"Serviço do classificador ouvindo em {args.endereco} (Ctrl+C para encerrar)")
+        from classifier.registro_modelos import instalar_sinais
+        instalar_sinais(asyncio.get_running_loop()) # Os clientes veem a nova identidade_modelo no próximo TIPO_ESTADO
+        servidor_metricas = None
+        if args.porta_metricas:
+            from metricas import iniciar_servidor_metricas
+            servidor_metricas = await iniciar_servidor_metricas(os.getenv("ANTIGENO_METRICAS_HOST", "127.0.0.1"), args.porta_metricas)
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            if servidor_metricas is not None:
+                servidor_metricas.close()
+
+    try:
+        asyncio.run(servir())
+    except KeyboardInterrupt:
+        print("\nServiço do classificador encerrado.")
+
+
+if __name__ == "__main__":
+    main()
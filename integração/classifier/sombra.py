@@ -0,0 +1,405 @@
+# classifier/sombra.py
+"""
+Avaliação sombra de um modelo candidato no tráfego real, antes de promovê-lo
+(ver classifier/registro_modelos.py para a troca).
+
+Com ANTIGENO_SOMBRA_MODELO definido, uma fração ANTIGENO_SOMBRA_AMOSTRAGEM dos prompts que
+passam por analisar_prompt_pela_ia é também classificada pelo candidato. O veredicto que vale
+é sempre o do modelo ativo: o prompt, o resultado e a latência do ativo vão para uma fila
+limitada (put_nowait) e uma única thread em segundo plano faz o resto. Ela:
+  - sobe o candidato num processo próprio (spawn), com prioridade baixa (nice
+    ANTIGENO_SOMBRA_NICE) e ANTIGENO_SOMBRA_THREADS threads de inferência: o forward do
+    candidato não divide o pool de threads do PyTorch com o do ativo;
+  - cede a vez ao ativo: só envia um prompt ao candidato depois que o ativo está sem
+    trabalho (micro-lote vazio e sem lote em andamento, nenhuma réplica emprestada,
+    nenhuma requisição nos workers) há ANTIGENO_SOMBRA_JANELA_OCIOSA_MS; sob carga contínua
+    a fila enche e as amostras são descartadas (e contadas), nunca o ativo espera;
+  - classifica cada prompt sozinho (lote de 1) e mede a latência do candidato;
+  - acrescenta um registro por prompt em ANTIGENO_SOMBRA_ARQUIVO (JSONL; ao passar de
+    ANTIGENO_SOMBRA_ARQUIVO_MAX_MB, vira <arquivo>.1 e outro começa).
+Com a fila cheia (ANTIGENO_SOMBRA_FILA_MAX), a amostra é descartada e contada.
+
+A amostra não é o tráfego inteiro: só entram os prompts que chegaram ao BERT, ou seja, os que
+não foram decididos pelas regras, pelo cache de veredictos nem pela cascata (e, sob carga,
+os que chegaram nos intervalos do tráfego). A concordância vale para essa população, em
+geral a mais difícil; ela é indicada em `estatisticas()["populacao"]` e no relatório.
+
+A latência do ativo inclui a espera no micro-lote (é a que o bot vê); a do candidato é só o
+forward de um prompt, com poucas threads. Prompts longos avaliados em janelas não entram na
+amostra (o candidato veria só o início truncado).
+
+Configuração:
+    ANTIGENO_SOMBRA_MODELO=modelo_detector_injecao_v4   nome (ou caminho) do candidato; vazio = desativado
+    ANTIGENO_SOMBRA_AMOSTRAGEM=0.1                      fração dos prompts avaliada pelo candidato
+    ANTIGENO_SOMBRA_ARQUIVO=sombra.jsonl
+    ANTIGENO_SOMBRA_INCLUIR_PROMPT=1                    grava o texto do prompt (padrão: só o hash)
+    ANTIGENO_SOMBRA_THREADS=1                           threads de inferência do processo do candidato
+    ANTIGENO_SOMBRA_NICE=10                             prioridade do processo do candidato (0 = igual à do bot)
+    ANTIGENO_SOMBRA_JANELA_OCIOSA_MS=50                 tempo sem trabalho do ativo antes de cada prompt sombra
+
+Relatório (concordância, diferenças de score, razão de latências), a partir da pasta integração/:
+    python -m classifier.sombra sombra.jsonl sombra.jsonl.1 [--json]
+"""
+import argparse
+import atexit
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import random
+import threading
+import time
+
+from cache_veredictos import normalizar_prompt
+from classifier import model
+
+MODELO_SOMBRA = os.getenv("ANTIGENO_SOMBRA_MODELO", "")
+AMOSTRAGEM = float(os.getenv("ANTIGENO_SOMBRA_AMOSTRAGEM", "0.1"))
+ARQUIVO_SOMBRA = os.getenv("ANTIGENO_SOMBRA_ARQUIVO", "sombra.jsonl")
+THREADS_SOMBRA = int(os.getenv("ANTIGENO_SOMBRA_THREADS", "1"))
+NICE_SOMBRA = int(os.getenv("ANTIGENO_SOMBRA_NICE", "10"))
+JANELA_OCIOSA_S = float(os.getenv("ANTIGENO_SOMBRA_JANELA_OCIOSA_MS", "50")) / 1000.0
+POPULACAO_AMOSTRA = "prompts decididos pelo BERT (exclui regras, cache de veredictos e cascata)"
+AVALIADOR_SOMBRA = None
+_LOCK_AVALIADOR = threading.Lock()
+
+
+def percentil(valores: list, p: float):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(int(round(p / 100.0 * (len(ordenados) - 1))), len(ordenados) - 1)]
+
+
+def _prob_injecao(resultado: dict) -> float:
+    score = float(resultado.get("score_ia", 0.0))
+    return score if resultado.get("label_ia") == "INJECAO" else 1.0 - score
+
+
+def _loop_processo_sombra(conexao, nome_modelo: str, threads: int, nice: int):
+    """Corpo do processo do candidato: carrega o modelo e responde (resultado, latência_s) a cada prompt recebido."""
+    if nice > 0 and hasattr(os, "nice"):
+        os.nice(nice)
+    if threads > 0:
+        model.ORT_THREADS_INTRA_OP = threads
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    from classifier.registro_modelos import resolver_caminho
+    try:
+        caminho = resolver_caminho(nome_modelo)
+        versao = model.carregar_versao(os.path.basename(os.path.normpath(nome_modelo)), caminho, num_replicas=1)
+        model.aquecer_versao(versao, ((1, 16), (1, 128)))
+    except Exception as e:
+        conexao.send(("erro", str(e)))
+        return
+    conexao.send(("pronto", versao.nome, versao.identidade))
+
+    while True:
+        prompt = conexao.recv()
+        if prompt is None:
+            return
+        inicio = time.perf_counter()
+        try:
+            # Direto no forward (sem Cronometro): as métricas por etapa continuam sendo só as do modelo ativo
+            with versao.pool.emprestar() as classificador:
+                lote = classificador.tokenizer([prompt], truncation=True, max_length=versao.max_tokens, return_tensors=classificador.framework)
+                probabilidades = model._inferir_probabilidades(classificador, lote)[0]
+            resultado = model._resultado_de_probabilidades(probabilidades, versao.id2label)
+        except Exception as e:
+            print(f"Erro na avaliação sombra ('{prompt[:30]}...'): {e}")
+            resultado = {"label_ia": "ERRO_ANALISE_IA", "score_ia": 0.0}
+        conexao.send((resultado, time.perf_counter() - inicio))
+
+
+class AvaliadorSombra:
+
+    def __init__(self, nome_modelo: str, arquivo: str, tamanho_max_fila: int = 1000, tamanho_lote: int = 8,
+                 incluir_prompt: bool = False, max_bytes_arquivo: int = 64 * 1024 * 1024):
+        self.nome_modelo = nome_modelo
+        self.arquivo = arquivo
+        self.tamanho_lote = max(int(tamanho_lote), 1)
+        self.incluir_prompt = incluir_prompt
+        self.max_bytes_arquivo = max_bytes_arquivo
+        self.identidade = None
+        self.modelo_sombra = None # "nome:identidade" do candidato, como vai nos registros
+        self.estado = "CARREGANDO" # -> PRONTO, ou ERRO_LOAD (carga falhou ou o processo do candidato morreu)
+        self._processo = None
+        self._conexao = None
+        self._fila = queue.Queue(maxsize=max(int(tamanho_max_fila), 1))
+        self._lock = threading.Lock() # Só para os contadores
+        self.amostrados = 0
+        self.avaliados = 0
+        self.descartados = 0
+        self.concordancias = 0
+        self.erros = 0
+        self._thread = threading.Thread(target=self._loop, name="antigeno-sombra", daemon=True)
+        self._thread.start()
+
+    def submeter(self, prompt: str, resultado: dict, latencia_s: float) -> bool:
+        """Enfileira a amostra (sem E/S nem inferência). False se ela foi descartada."""
+        if self.estado == "ERRO_LOAD":
+            return False
+        try:
+            # A identidade do ativo vai junto com o resultado: lida só na avaliação, uma troca no meio a trocaria
+            self._fila.put_nowait((prompt, resultado, latencia_s, model.identidade_modelo_em_uso(), time.time()))
+        except queue.Full:
+            with self._lock:
+                self.descartados += 1
+            return False
+        with self._lock:
+            self.amostrados += 1
+        return True
+
+    # --- Thread sombra ---
+    def _carregar(self) -> bool:
+        contexto = multiprocessing.get_context("spawn") # fork + threads do PyTorch não é seguro
+        self._conexao, conexao_processo = contexto.Pipe()
+        self._processo = contexto.Process(target=_loop_processo_sombra, args=(conexao_processo, self.nome_modelo, THREADS_SOMBRA, NICE_SOMBRA),
+                                          name="antigeno-sombra", daemon=True)
+        self._processo.start()
+        try:
+            resposta = self._conexao.recv()
+        except EOFError:
+            resposta = ("erro", f"processo do candidato terminou (código {self._processo.exitcode})")
+        if resposta[0] != "pronto":
+            print(f"ERRO (Avaliação sombra): não foi possível carregar o candidato '{self.nome_modelo}': {resposta[1]}")
+            self.estado = "ERRO_LOAD"
+            return False
+        _, nome, self.identidade = resposta
+        self.modelo_sombra = f"{nome}:{self.identidade}"
+        self.estado = "PRONTO"
+        print(f"Avaliação sombra ativa: '{nome}' ({self.identidade}) em {AMOSTRAGEM:.0%} dos prompts -> '{self.arquivo}' "
+              f"(processo {self._processo.pid}, {THREADS_SOMBRA} thread(s), nice {NICE_SOMBRA}).")
+        return True
+
+    def _loop(self):
+        if not self._carregar():
+            return
+        while True:
+            lote = [self._fila.get()]
+            while len(lote) < self.tamanho_lote:
+                try:
+                    lote.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            encerrar = None in lote # Sinal de encerramento: avalia o que veio antes dele e sai
+            registros = []
+            try:
+                for prompt, resultado, latencia_s, modelo_primario, instante in (item for item in lote if item is not None):
+                    if not encerrar:
+                        self._ceder_ao_primario()
+                    registros.append(self._avaliar(prompt, resultado, latencia_s, modelo_primario, instante))
+            except (EOFError, OSError) as e:
+                print(f"ERRO (Avaliação sombra): o processo do candidato parou ({e!r}); avaliação sombra desativada.")
+                self.estado = "ERRO_LOAD"
+                encerrar = True
+            if registros:
+                self._gravar(registros)
+            if encerrar:
+                self._encerrar_processo()
+                return
+
+    def _ceder_ao_primario(self):
+        """Prioridade baixa: espera o modelo ativo ficar JANELA_OCIOSA_S sem trabalho (sem limite: sob carga, a fila enche e descarta)."""
+        while model.ociosidade_primario_s() < JANELA_OCIOSA_S:
+            time.sleep(0.005)
+
+    def _classificar(self, prompt: str):
+        """(resultado, latência_s) do candidato, medida no processo dele."""
+        self._conexao.send(prompt)
+        return self._conexao.recv()
+
+    def _encerrar_processo(self):
+        if self._processo is None or not self._processo.is_alive():
+            return
+        try:
+            self._conexao.send(None)
+        except OSError:
+            pass
+        self._processo.join(5)
+
+    def _avaliar(self, prompt: str, resultado: dict, latencia_s: float, modelo_primario: str, instante: float) -> dict:
+        resultado_sombra, latencia_sombra_s = self._classificar(prompt)
+        concorda = resultado_sombra["label_ia"] == resultado["label_ia"]
+        with self._lock:
+            self.avaliados += 1
+            self.concordancias += concorda
+            self.erros += resultado_sombra["label_ia"].startswith("ERRO")
+        return {
+            "instante": instante,
+            "hash_prompt": hashlib.sha256(normalizar_prompt(prompt).encode("utf-8")).hexdigest(),
+            "prompt": prompt[:4000] if self.incluir_prompt else None,
+            "modelo_primario": modelo_primario,
+            "modelo_sombra": self.modelo_sombra,
+            "label_primario": resultado["label_ia"],
+            "label_sombra": resultado_sombra["label_ia"],
+            "prob_injecao_primario": round(_prob_injecao(resultado), 6),
+            "prob_injecao_sombra": round(_prob_injecao(resultado_sombra), 6),
+            "concorda": concorda,
+            "latencia_primario_ms": round(latencia_s * 1000, 3),
+            "latencia_sombra_ms": round(latencia_sombra_s * 1000, 3),
+        }
+
+    def _gravar(self, registros: list):
+        linhas = "".join(json.dumps(registro, ensure_ascii=False) + "\n" for registro in registros)
+        try:
+            if os.path.exists(self.arquivo) and os.path.getsize(self.arquivo) >= self.max_bytes_arquivo:
+                os.replace(self.arquivo, self.arquivo + ".1")
+            with open(self.arquivo, "a", encoding="utf-8") as arquivo:
+                arquivo.write(linhas)
+        except OSError as e:
+            print(f"AVISO (Avaliação sombra): não foi possível gravar em '{self.arquivo}': {e}")
+
+    def encerrar(self, timeout_s: float = 10.0):
+        """Avalia e grava o que já está na fila."""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._fila.put(None, timeout=timeout_s)
+        except queue.Full:
+            return
+        self._thread.join(timeout_s)
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "modelo": self.nome_modelo,
+                "identidade": self.identidade,
+                "estado": self.estado,
+                "amostragem": AMOSTRAGEM,
+                "populacao": POPULACAO_AMOSTRA,
+                "na_fila": self._fila.qsize(),
+                "amostrados": self.amostrados,
+                "avaliados": self.avaliados,
+                "descartados": self.descartados,
+                "erros": self.erros,
+                "concordancia": round(self.concordancias / self.avaliados, 4) if self.avaliados else None,
+            }
+
+
+def obter_avaliador_sombra():
+    """Avaliador sombra (criado na primeira amostra), ou None se ANTIGENO_SOMBRA_MODELO não estiver definido."""
+    global AVALIADOR_SOMBRA
+    if not MODELO_SOMBRA:
+        return None
+    if AVALIADOR_SOMBRA is None:
+        with _LOCK_AVALIADOR:
+            if AVALIADOR_SOMBRA is None:
+                AVALIADOR_SOMBRA = AvaliadorSombra(
+                    MODELO_SOMBRA, ARQUIVO_SOMBRA,
+                    tamanho_max_fila=int(os.getenv("ANTIGENO_SOMBRA_FILA_MAX", "1000")),
+                    incluir_prompt=os.getenv("ANTIGENO_SOMBRA_INCLUIR_PROMPT", "0") == "1",
+                    max_bytes_arquivo=int(float(os.getenv("ANTIGENO_SOMBRA_ARQUIVO_MAX_MB", "64")) * 1024 * 1024),
+                )
+                atexit.register(AVALIADOR_SOMBRA.encerrar)
+                from metricas import REJEITADAS, PROFUNDIDADE_FILAS
+                PROFUNDIDADE_FILAS.registrar(AVALIADOR_SOMBRA._fila.qsize, "sombra")
+                REJEITADAS.registrar(lambda: AVALIADOR_SOMBRA.descartados, "sombra", "fila_cheia")
+    return AVALIADOR_SOMBRA
+
+
+def enviar_para_sombra(prompt: str, resultado: dict, latencia_s: float):
+    """Sorteia a amostragem e enfileira o prompt para o candidato. Não bloqueia."""
+    if random.random() >= AMOSTRAGEM or resultado.get("label_ia", "").startswith("ERRO") or model.CLIENTE_SERVICO is not None:
+        return # Modo cliente: a sombra roda no servico_classificador, que tem o modelo
+    avaliador = obter_avaliador_sombra()
+    if avaliador is not None:
+        avaliador.submeter(prompt, resultado, latencia_s)
+
+
+# --- Relatório ---
+def gerar_relatorio(caminhos: list, exemplos: int = 10) -> dict:
+    """Resumo dos registros sombra, por par (modelo ativo, candidato): a troca de modelo no meio não mistura versões."""
+    grupos = {}
+    for caminho in caminhos:
+        with open(caminho, "r", encoding="utf-8") as arquivo:
+            for linha in arquivo:
+                if not linha.strip():
+                    continue
+                registro = json.loads(linha)
+                if registro["label_sombra"].startswith("ERRO"):
+                    continue
+                grupos.setdefault((registro["modelo_primario"], registro["modelo_sombra"]), []).append(registro)
+
+    relatorio = []
+    for (modelo_primario, modelo_sombra), registros in sorted(grupos.items(), key=lambda item: -len(item[1])):
+        deltas = [r["prob_injecao_sombra"] - r["prob_injecao_primario"] for r in registros]
+        deltas_abs = [abs(delta) for delta in deltas]
+        latencias_primario = [r["latencia_primario_ms"] for r in registros]
+        latencias_sombra = [r["latencia_sombra_ms"] for r in registros]
+        matriz = {}
+        for r in registros:
+            linha_matriz = matriz.setdefault(r["label_primario"], {})
+            linha_matriz[r["label_sombra"]] = linha_matriz.get(r["label_sombra"], 0) + 1
+        latencia = {}
+        for p in (50, 95, 99):
+            primario, sombra = percentil(latencias_primario, p), percentil(latencias_sombra, p)
+            latencia[f"p{p}"] = {"primario_ms": primario, "sombra_ms": sombra, "razao": round(sombra / primario, 3) if primario else None}
+        discordancias = sorted((r for r in registros if not r["concorda"]), key=lambda r: -abs(r["prob_injecao_sombra"] - r["prob_injecao_primario"]))
+        relatorio.append({
+            "modelo_primario": modelo_primario,
+            "modelo_sombra": modelo_sombra,
+            "amostras": len(registros),
+            "periodo": [min(r["instante"] for r in registros), max(r["instante"] for r in registros)],
+            "concordancia": round(sum(r["concorda"] for r in registros) / len(registros), 4),
+            "matriz_confusao": matriz, # label do ativo -> label do candidato -> quantidade
+            "delta_prob_injecao": {
+                "media": round(sum(deltas) / len(deltas), 4),
+                "media_abs": round(sum(deltas_abs) / len(deltas_abs), 4),
+                "p95_abs": round(percentil(deltas_abs, 95), 4),
+                "max_abs": round(max(deltas_abs), 4),
+            },
+            "latencia": latencia,
+            "maiores_discordancias": [
+                {chave: r[chave] for chave in ("hash_prompt", "prompt", "label_primario", "label_sombra", "prob_injecao_primario", "prob_injecao_sombra")}
+                for r in discordancias[:exemplos]
+            ],
+        })
+    return {"arquivos": list(caminhos), "populacao": POPULACAO_AMOSTRA, "comparacoes": relatorio}
+
+
+def _imprimir_relatorio(relatorio: dict):
+    if not relatorio["comparacoes"]:
+        print(f"Nenhum registro sombra em {relatorio['arquivos']}.")
+        return
+    print(f"Amostra: {relatorio['populacao']}; não representa o tráfego inteiro.")
+    for comparacao in relatorio["comparacoes"]:
+        delta = comparacao["delta_prob_injecao"]
+        print(f"\n=== Ativo {comparacao['modelo_primario']} x candidato {comparacao['modelo_sombra']} ({comparacao['amostras']} amostras) ===")
+        print(f"Concordância: {comparacao['concordancia']:.2%}")
+        for label_primario, contagens in sorted(comparacao["matriz_confusao"].items()):
+            print(f"  ativo {label_primario:<8} -> candidato: {dict(sorted(contagens.items()))}")
+        print(f"Delta prob. injeção (candidato - ativo): média {delta['media']:+.4f}, média abs {delta['media_abs']:.4f}, "
+              f"p95 abs {delta['p95_abs']:.4f}, máx abs {delta['max_abs']:.4f}")
+        for nome_percentil, valores in comparacao["latencia"].items():
+            razao = f"{valores['razao']:.2f}x" if valores["razao"] is not None else "-"
+            print(f"Latência {nome_percentil}: ativo {valores['primario_ms']:.1f} ms, candidato {valores['sombra_ms']:.1f} ms (razão {razao})")
+        if comparacao["maiores_discordancias"]:
+            print("Maiores discordâncias:")
+            for r in comparacao["maiores_discordancias"]:
+                texto = (r["prompt"] or "")[:60] or r["hash_prompt"][:16]
+                print(f"  {r['label_primario']} ({r['prob_injecao_primario']:.3f}) -> {r['label_sombra']} ({r['prob_injecao_sombra']:.3f}): {texto}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório da avaliação sombra de um modelo candidato.")
+    parser.add_argument("arquivos", nargs="*", default=[ARQUIVO_SOMBRA], help="Arquivos JSONL gerados pela avaliação sombra.")
+    parser.add_argument("--exemplos", type=int, default=10, help="Quantas discordâncias listar.")
+    parser.add_argument("--json", action="store_true", help="Imprime o relatório em JSON.")
+    args = parser.parse_args()
+    for caminho in args.arquivos:
+        if not os.path.exists(caminho):
+            print(f"AVISO: '{caminho}' não existe; ignorado.")
+    relatorio = gerar_relatorio([caminho for caminho in args.arquivos if os.path.exists(caminho)], args.exemplos)
+    if args.json:
+        print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+    else:
+        _imprimir_relatorio(relatorio)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# classifier/workers_processos.py
+"""
+Backend de inferência multiprocesso (ANTIGENO_BACKEND_EXECUCAO=processos).
+
+N processos worker atendem as requisições do processo principal. Cada worker
+mapeia o mesmo model.safetensors em memória somente-leitura (PESOS_MMAP), então
+as páginas dos pesos vêm do cache de páginas do sistema operacional e a memória
+não cresce com N. Tokenização e pré/pós-processamento rodam em paralelo, fora
+do GIL do processo principal.
+
+Protocolo (multiprocessing.Queue):
+    requisições: (id_requisicao, tipo, carga)   tipo em {"prompt", "longo", "lote"}
+    respostas:   ("pronto", id_worker, estado) | ("inicio", pid, [ids]) | ("resultado", id_requisicao, resultado)
+As respostas usam SimpleQueue (escrita síncrona no pipe): o "inicio" chega ao
+processo principal mesmo que o worker morra logo em seguida. Uma thread de
+monitoramento reinicia workers que morrem (com espera exponencial e um limite de
+reinícios seguidos) e falha as requisições que estavam com eles. Worker que não
+conseguiu carregar o modelo não é reiniciado: sem nenhum worker vivo o pool fica
+em ERRO_LOAD e passa a recusar requisições.
+"""
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Reinício de workers que morrem: espera exponencial entre tentativas e, depois de
+# MAX_REINICIOS_SEGUIDOS mortes sem ficar JANELA_ESTAVEL_S no ar, o worker é abandonado.
+ESPERA_REINICIO_BASE_S = float(os.getenv("ANTIGENO_ESPERA_REINICIO_WORKER_S", "1.0"))
+ESPERA_REINICIO_MAX_S = float(os.getenv("ANTIGENO_ESPERA_REINICIO_WORKER_MAX_S", "60.0"))
+MAX_REINICIOS_SEGUIDOS = int(os.getenv("ANTIGENO_MAX_REINICIOS_WORKER", "5"))
+JANELA_ESTAVEL_S = float(os.getenv("ANTIGENO_JANELA_ESTAVEL_WORKER_S", "60.0"))
+ESTADOS_ERRO_CARGA = ("ERRO_LOAD", "ERRO_PATH")
+
+
+def _loop_worker(id_worker: int, fila_requisicoes, fila_respostas, janela_ms: float, tamanho_max_lote: int, threads_torch: int):
+    """Corpo do processo worker: carrega o modelo (pesos via mmap) e atende requisições em micro-lotes."""
+    from classifier import model
+
+    # Dentro do worker o classificador é local; o micro-lote é feito por este loop.
+    model.BACKEND_EXECUCAO = "threads"
+    model.PESOS_MMAP = True
+    model.MICROLOTE_ATIVO = False
+    model.NUM_REPLICAS = 1
+    if threads_torch > 0:
+        import torch
+        torch.set_num_threads(threads_torch)
+
+    model.inicializar_classificador()
+    fila_respostas.put(("pronto", id_worker, model.obter_estado_classificador()))
+    if not model.classificador_pronto():
+        return
+
+    janela_s = janela_ms / 1000.0
+    while True:
+        primeira = fila_requisicoes.get()
+        if primeira is None:
+            return
+        requisicoes = [primeira]
+        prazo = time.monotonic() + janela_s
+        while len(requisicoes) < tamanho_max_lote:
+            try:
+                proxima = fila_requisicoes.get(timeout=max(prazo - time.monotonic(), 0.0))
+            except queue.Empty:
+                break
+            if proxima is None:
+                fila_requisicoes.put(None) # Repassa o sinal de encerramento para outro worker
+                break
+            requisicoes.append(proxima)
+
+        fila_respostas.put(("inicio", os.getpid(), [id_requisicao for id_requisicao, _, _ in requisicoes]))
+
+        prompts_simples = [(id_requisicao, carga) for id_requisicao, tipo, carga in requisicoes if tipo == "prompt"]
+        if prompts_simples:
+            try:
+                resultados = model._classificar_lote([prompt for _, prompt in prompts_simples])
+            except Exception as e:
+                print(f"Erro no worker {id_worker} ao analisar um lote de {len(prompts_simples)} prompts: {e}")
+                resultados = [{"label_ia": "ERRO_ANALISE_IA", "score_ia": 0.0} for _ in prompts_simples]
+            for (id_requisicao, _), resultado in zip(prompts_simples, resultados):
+                fila_respostas.put(("resultado", id_requisicao, resultado))
+
+        for id_requisicao, tipo, carga in requisicoes:
+            if tipo == "longo":
+                prompt, limiar_bloqueio = carga
+                fila_respostas.put(("resultado", id_requisicao, model.analisar_prompt_longo_pela_ia(prompt, limiar_bloqueio)))
+            elif tipo == "lote":
+                prompts, batch_size, limiar_bloqueio = carga
+                fila_respostas.put(("resultado", id_requisicao, model.analisar_prompts_em_lote(prompts, batch_size, limiar_bloqueio)))
+
+
+class PoolProcessos:
+    """Gerencia os processos worker, o canal de requisições/respostas e a saúde dos workers."""
+
+    def __init__(self, num_workers: int, janela_ms: float = 5.0, tamanho_max_lote: int = 16,
+                 threads_torch: int = 1, timeout_requisicao_s: float = 30.0):
+        self.num_workers = max(int(num_workers), 1)
+        self.janela_ms = janela_ms
+        self.tamanho_max_lote = tamanho_max_lote
+        self.threads_torch = threads_torch
+        self.timeout_requisicao_s = timeout_requisicao_s
+        self.reinicios = 0
+        self.ultima_resposta = time.monotonic()
+        self.estado_pool = "CARREGANDO" # CARREGANDO -> PRONTO, ou ERRO_LOAD quando não sobra worker vivo
+
+        self._contexto = multiprocessing.get_context("spawn") # fork + threads do PyTorch não é seguro
+        self._fila_requisicoes = self._contexto.Queue()
+        self._fila_respostas = self._contexto.SimpleQueue()
+        self._processos = {}
+        self._estados_workers = {}
+        self._pendentes = {}       # id_requisicao -> Future
+        self._em_execucao = {}     # pid do worker -> ids das requisições que ele pegou
+        self._pids_mortos = set()
+        self._inicio_workers = {}      # id_worker -> time.monotonic() do último start
+        self._falhas_seguidas = {}     # id_worker -> mortes seguidas sem ficar estável
+        self._proximo_reinicio = {}    # id_worker -> instante (monotonic) do próximo start agendado
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._evento_pronto = threading.Condition(self._lock)
+        self._encerrando = False
+
+        for id_worker in range(self.num_workers):
+            self._iniciar_worker(id_worker)
+        threading.Thread(target=self._loop_respostas, name="antigeno-respostas-workers", daemon=True).start()
+        threading.Thread(target=self._loop_monitor, name="antigeno-monitor-workers", daemon=True).start()
+
+    def _iniciar_worker(self, id_worker: int):
+        processo = self._contexto.Process(
+            target=_loop_worker,
+            args=(id_worker, self._fila_requisicoes, self._fila_respostas, self.janela_ms, self.tamanho_max_lote, self.threads_torch),
+            name=f"antigeno-worker-{id_worker}",
+            daemon=True,
+        )
+        processo.start()
+        self._processos[id_worker] = processo
+        self._estados_workers[id_worker] = "CARREGANDO"
+        self._inicio_workers[id_worker] = time.monotonic()
+
+    def aguardar_pronto(self, timeout_s: float = 300.0) -> bool:
+        """Espera todos os workers terminarem de carregar. True se ao menos um ficou PRONTO."""
+        prazo = time.monotonic() + timeout_s
+        with self._evento_pronto:
+            while any(estado == "CARREGANDO" for estado in self._estados_workers.values()):
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                self._evento_pronto.wait(restante)
+            return any(estado == "PRONTO" for estado in self._estados_workers.values())
+
+    def submeter(self, tipo: str, carga) -> Future:
+        futuro = Future()
+        id_requisicao = next(self._ids)
+        with self._lock:
+            if self.estado_pool == "ERRO_LOAD":
+                futuro.set_exception(RuntimeError("Nenhum worker de inferência disponível (pool em ERRO_LOAD)."))
+                return futuro
+            self._pendentes[id_requisicao] = futuro
+        self._fila_requisicoes.put((id_requisicao, tipo, carga))
+        return futuro
+
+    def executar(self, tipo: str, carga):
+        """Versão bloqueante de `submeter`, com o tempo limite por requisição."""
+        return self.submeter(tipo, carga).result(timeout=self.timeout_requisicao_s)
+
+    def ociosidade_s(self) -> float:
+        """Segundos desde a última resposta de um worker (0.0 com requisições pendentes)."""
+        if self._pendentes:
+            return 0.0
+        return time.monotonic() - self.ultima_resposta
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {
+                "estado": self.estado_pool,
+                "workers": dict(self._estados_workers),
+                "pendentes": len(self._pendentes),
+                "reinicios": self.reinicios,
+            }
+
+    def encerrar(self):
+        self._encerrando = True
+        for _ in self._processos:
+            self._fila_requisicoes.put(None)
+        for processo in self._processos.values():
+            if processo is not None:
+                processo.join(timeout=5)
+
+    def _loop_respostas(self):
+        while True:
+            mensagem = self._fila_respostas.get()
+            tipo_mensagem = mensagem[0]
+            with self._lock:
+                if tipo_mensagem == "pronto":
+                    _, id_worker, estado = mensagem
+                    self._estados_workers[id_worker] = estado
+                    if estado == "PRONTO" and self.estado_pool == "CARREGANDO":
+                        self.estado_pool = "PRONTO"
+                    self._evento_pronto.notify_all()
+                elif tipo_mensagem == "inicio":
+                    _, pid, ids = mensagem
+                    if pid in self._pids_mortos: # O monitor viu a morte antes desta mensagem
+                        self._falhar_requisicoes(ids, f"Worker de inferência (pid {pid}) morreu durante a requisição.")
+                    else:
+                        self._em_execucao[pid] = list(ids)
+                elif tipo_mensagem == "resultado":
+                    _, id_requisicao, resultado = mensagem
+                    self.ultima_resposta = time.monotonic()
+                    futuro = self._pendentes.pop(id_requisicao, None)
+                    for ids in self._em_execucao.values():
+                        if id_requisicao in ids:
+                            ids.remove(id_requisicao)
+                            break
+                    if futuro is not None and not futuro.done():
+                        futuro.set_result(resultado)
+
+    def _falhar_requisicoes(self, ids: list, mensagem: str):
+        """Falha os futures de `ids` (chamado com self._lock adquirido)."""
+        for id_requisicao in ids:
+            futuro = self._pendentes.pop(id_requisicao, None)
+            if futuro is not None and not futuro.done():
+                futuro.set_exception(RuntimeError(mensagem))
+
+    def _loop_monitor(self):
+        while not self._encerrando:
+            time.sleep(1.0)
+            agora = time.monotonic()
+            for id_worker, processo in list(self._processos.items()):
+                if self._encerrando:
+                    break
+                if id_worker in self._proximo_reinicio:
+                    if agora >= self._proximo_reinicio[id_worker]:
+                        with self._lock:
+                            del self._proximo_reinicio[id_worker]
+                            self.reinicios += 1
+                            self._iniciar_worker(id_worker)
+                        print(f"AVISO: worker de inferência {id_worker} reiniciado "
+                              f"(tentativa {self._falhas_seguidas[id_worker]}/{MAX_REINICIOS_SEGUIDOS}).")
+                    continue
+                if processo is None or processo.is_alive():
+                    continue
+                with self._lock:
+                    self._pids_mortos.add(processo.pid)
+                    perdidas = self._em_execucao.pop(processo.pid, [])
+                    self._falhar_requisicoes(perdidas, f"Worker de inferência {id_worker} morreu durante a requisição.")
+                    motivo = self._agendar_reinicio(id_worker, agora)
+                print(f"AVISO: worker de inferência {id_worker} morreu (código {processo.exitcode}). "
+                      f"{len(perdidas)} requisição(ões) em andamento falharam; {motivo}")
+
+    def _agendar_reinicio(self, id_worker: int, agora: float) -> str:
+        """Decide o destino de um worker morto (chamado com self._lock adquirido). Devolve a descrição para o log."""
+        estado_worker = self._estados_workers.get(id_worker)
+        if estado_worker in ESTADOS_ERRO_CARGA:
+            # Falha de carga é determinística (caminho/artefato): reiniciar só repetiria o erro.
+            self._processos[id_worker] = None
+            descricao = f"worker não será reiniciado ({estado_worker})."
+        else:
+            if agora - self._inicio_workers.get(id_worker, agora) >= JANELA_ESTAVEL_S:
+                self._falhas_seguidas[id_worker] = 0
+            falhas = self._falhas_seguidas.get(id_worker, 0) + 1
+            self._falhas_seguidas[id_worker] = falhas
+            if falhas > MAX_REINICIOS_SEGUIDOS:
+                self._processos[id_worker] = None
+                self._estados_workers[id_worker] = "ERRO_REINICIOS"
+                descricao = f"worker abandonado após {MAX_REINICIOS_SEGUIDOS} reinícios seguidos."
+            else:
+                espera = min(ESPERA_REINICIO_BASE_S * 2 ** (falhas - 1), ESPERA_REINICIO_MAX_S)
+                self._estados_workers[id_worker] = "AGUARDANDO_REINICIO"
+                self._proximo_reinicio[id_worker] = agora + espera
+                descricao = f"reinício em {espera:.1f}s."
+
+        if all(processo is None for processo in self._processos.values()):
+            self.estado_pool = "ERRO_LOAD"
+            self._falhar_requisicoes(list(self._pendentes), "Nenhum worker de inferência disponível (pool em ERRO_LOAD).")
+            print(f"ERRO CRÍTICO: nenhum worker de inferência restante; pool em ERRO_LOAD. Estado dos workers: {dict(self._estados_workers)}")
+        self._evento_pronto.notify_all()
+        return descricao
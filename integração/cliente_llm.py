@@ -0,0 +1,225 @@
+# cliente_llm.py
+"""
+Cliente assíncrono para o endpoint chat-completions (API compatível com OpenAI,
+como a da Groq), usado pelo caminho assíncrono do bot.
+
+- Um único httpx.AsyncClient reaproveita as conexões (pool com keep-alive).
+- Timeouts separados de conexão e de leitura.
+- Retentativas com backoff exponencial e jitter em 429, 5xx e falhas de rede,
+  respeitando o cabeçalho Retry-After quando presente.
+- Disjuntor (circuit breaker): após N falhas seguidas o circuito abre e as
+  chamadas falham na hora (CircuitoAbertoErro) até o tempo de espera passar;
+  então uma chamada de teste decide se ele fecha de novo.
+
+Para testar sem a API real, aponte GROQ_BASE_URL para stub_llm_server.py.
+"""
+import asyncio
+import email.utils
+import json
+import random
+import time
+
+STATUS_RETENTAVEIS = {429, 500, 502, 503, 504}
+
+
+class ErroLLM(Exception):
+    """Falha definitiva ao consultar o LLM (depois das retentativas)."""
+
+    def __init__(self, mensagem: str, status_code: int = None):
+        super().__init__(mensagem)
+        self.status_code = status_code
+
+
+class CircuitoAbertoErro(ErroLLM):
+    """O disjuntor está aberto: a API falhou repetidamente e a chamada nem foi feita."""
+
+
+class DisjuntorCircuito:
+    """FECHADO -> (limiar_falhas falhas seguidas) -> ABERTO -> (tempo_abertura_s) -> SEMI_ABERTO -> FECHADO ou ABERTO."""
+
+    def __init__(self, limiar_falhas: int = 5, tempo_abertura_s: float = 30.0):
+        self.limiar_falhas = limiar_falhas
+        self.tempo_abertura_s = tempo_abertura_s
+        self.estado = "FECHADO"
+        self.falhas_seguidas = 0
+        self.aberturas = 0
+        self._instante_abertura = 0.0
+        self._teste_em_andamento = False
+
+    @property
+    def em_teste(self) -> bool:
+        return self.estado == "SEMI_ABERTO" and self._teste_em_andamento
+
+    def permitir(self) -> bool:
+        if self.estado == "ABERTO" and time.monotonic() - self._instante_abertura >= self.tempo_abertura_s:
+            self.estado = "SEMI_ABERTO"
+        if self.estado == "SEMI_ABERTO":
+            if self._teste_em_andamento: # Só uma chamada de teste por vez
+                return False
+            self._teste_em_andamento = True
+            return True
+        return self.estado == "FECHADO"
+
+    def registrar_sucesso(self):
+        self.estado = "FECHADO"
+        self.falhas_seguidas = 0
+        self._teste_em_andamento = False
+
+    def registrar_falha(self):
+        self.falhas_seguidas += 1
+        if self.estado == "SEMI_ABERTO" or self.falhas_seguidas >= self.limiar_falhas:
+            if self.estado != "ABERTO":
+                self.aberturas += 1
+            self.estado = "ABERTO"
+            self._instante_abertura = time.monotonic()
+        self._teste_em_andamento = False
+
+    def liberar_teste(self):
+        """A chamada de teste terminou sem resultado (ex: cancelada): a próxima chamada pode testar de novo."""
+        self._teste_em_andamento = False
+
+
+def interpretar_retry_after(valor: str):
+    """Retry-After em segundos ("7") ou como data HTTP. Retorna os segundos de espera, ou None."""
+    if not valor:
+        return None
+    try:
+        return max(float(valor), 0.0)
+    except ValueError:
+        pass
+    try:
+        instante = email.utils.parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    return max(instante.timestamp() - time.time(), 0.0)
+
+
+class ClienteLLMAsync:
+
+    def __init__(self, base_url: str, api_key: str, modelo: str,
+                 timeout_conexao_s: float = 5.0, timeout_leitura_s: float = 60.0,
+                 max_tentativas: int = 4, backoff_base_s: float = 0.5, backoff_max_s: float = 20.0,
+                 max_conexoes: int = 20, disjuntor: DisjuntorCircuito = None, prazo_total_s: float = None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.modelo = modelo
+        self.timeout_conexao_s = timeout_conexao_s
+        self.timeout_leitura_s = timeout_leitura_s
+        self.max_tentativas = max(int(max_tentativas), 1)
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.max_conexoes = max_conexoes
+        self.disjuntor = disjuntor or DisjuntorCircuito()
+        self.prazo_total_s = prazo_total_s # Tempo máximo de todas as tentativas juntas (None = sem limite)
+        self.retentativas = 0
+        self._http = None
+
+    def _cliente_http(self):
+        if self._http is None:
+            import httpx
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=httpx.Timeout(self.timeout_leitura_s, connect=self.timeout_conexao_s),
+                limits=httpx.Limits(max_connections=self.max_conexoes, max_keepalive_connections=self.max_conexoes),
+            )
+        return self._http
+
+    def _corpo(self, prompt: str, temperature: float, stream: bool) -> dict:
+        return {
+            "model": self.modelo,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "stream": stream,
+        }
+
+    def _espera_backoff(self, tentativa: int, retry_after: float = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max_s) # Retry-After do servidor não prende a requisição por minutos
+        return random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * (2 ** tentativa))) # "Full jitter"
+
+    async def _enviar(self, corpo: dict, stream: bool):
+        """POST com retentativas e disjuntor. Retorna a resposta httpx (aberta, se stream=True) com status 2xx."""
+        ultimo_erro = None
+        instante_limite = time.monotonic() + self.prazo_total_s if self.prazo_total_s else None
+        for tentativa in range(self.max_tentativas):
+            if not self.disjuntor.permitir():
+                raise CircuitoAbertoErro(f"Circuito aberto após {self.disjuntor.falhas_seguidas} falhas seguidas da API do LLM.")
+            chamada_de_teste = self.disjuntor.em_teste
+            try:
+                resposta, ultimo_erro, retry_after = await self._tentar(corpo, stream)
+            except BaseException:
+                # Cancelada (wait_for, especulação descartada) ou erro inesperado: a vaga de teste
+                # do disjuntor SEMI_ABERTO não pode ficar presa, senão o circuito nunca mais fecha.
+                if chamada_de_teste:
+                    self.disjuntor.liberar_teste()
+                raise
+            if resposta is not None:
+                return resposta
+
+            if tentativa + 1 < self.max_tentativas:
+                espera_s = self._espera_backoff(tentativa, retry_after)
+                if instante_limite is not None and time.monotonic() + espera_s >= instante_limite:
+                    break # A próxima tentativa começaria depois do prazo: falha já
+                self.retentativas += 1
+                await asyncio.sleep(espera_s)
+        raise ultimo_erro
+
+    async def _tentar(self, corpo: dict, stream: bool):
+        """Uma tentativa. Retorna (resposta 2xx ou None, erro, retry_after_s) e atualiza o disjuntor."""
+        import httpx
+        try:
+            requisicao = self._cliente_http().build_request("POST", "/chat/completions", json=corpo)
+            resposta = await self._cliente_http().send(requisicao, stream=stream)
+        except (httpx.TransportError, httpx.TimeoutException) as e_rede:
+            self.disjuntor.registrar_falha()
+            return None, ErroLLM(f"Falha de conexão com a API do LLM: {e_rede!r}"), None
+        if resposta.status_code < 400:
+            self.disjuntor.registrar_sucesso()
+            return resposta, None, None
+        if stream:
+            await resposta.aread()
+        await resposta.aclose()
+        erro = ErroLLM(f"API do LLM retornou status {resposta.status_code}: {resposta.text[:200]}", resposta.status_code)
+        if resposta.status_code not in STATUS_RETENTAVEIS:
+            self.disjuntor.registrar_sucesso() # A API respondeu: o problema é a requisição, não a disponibilidade
+            raise erro
+        if resposta.status_code == 429:
+            self.disjuntor.registrar_sucesso() # Limite de taxa não indica API fora do ar
+        else:
+            self.disjuntor.registrar_falha()
+        return None, erro, interpretar_retry_after(resposta.headers.get("Retry-After"))
+
+    async def completar(self, prompt: str, temperature: float = 0.7) -> str:
+        resposta = await self._enviar(self._corpo(prompt, temperature, stream=False), stream=False)
+        return resposta.json()["choices"][0]["message"]["content"].strip()
+
+    async def completar_stream(self, prompt: str, temperature: float = 0.7):
+        """Gerador assíncrono dos trechos (deltas) da resposta, lidos do stream SSE. Só há retentativa antes do primeiro byte."""
+        resposta = await self._enviar(self._corpo(prompt, temperature, stream=True), stream=True)
+        try:
+            async for linha in resposta.aiter_lines():
+                if not linha.startswith("data:"):
+                    continue
+                dados = linha[len("data:"):].strip()
+                if dados == "[DONE]":
+                    break
+                escolhas = json.loads(dados).get("choices") or [{}]
+                delta = (escolhas[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+        finally:
+            await resposta.aclose()
+
+    def estatisticas(self) -> dict:
+        return {
+            "circuito": self.disjuntor.estado,
+            "falhas_seguidas": self.disjuntor.falhas_seguidas,
+            "aberturas_circuito": self.disjuntor.aberturas,
+            "retentativas": self.retentativas,
+        }
+
+    async def fechar(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
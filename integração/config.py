@@ -6,13 +6,18 @@ load_dotenv() # Isso carrega as variáveis do arquivo .env para o ambiente
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_MODEL = "llama3-8b-8192" # ou o modelo que você está usando
+GROQ_TEMPERATURA = float(os.getenv("GROQ_TEMPERATURA", "0.7"))
+# Endpoint compatível com OpenAI. Para testes locais: GROQ_BASE_URL=http://127.0.0.1:8089/openai/v1 (stub_llm_server.py)
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
 
 # Linha crucial para o bot do Discord:
 DISCORD_BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 
-# Opcional: Adicione estas verificações para te ajudar a depurar
-if GROQ_API_KEY is None:
-    print("AVISO (config.py): GROQ_API_KEY não foi encontrado nas variáveis de ambiente.")
-if DISCORD_BOT_TOKEN is None:
-    print("AVISO (config.py): DISCORD_BOT_TOKEN não foi encontrado nas variáveis de ambiente.")
-    print("Certifique-se que seu arquivo .env contém a linha: DISCORD_BOT_TOKEN='seu_token_aqui'")
\ No newline at end of file
+# Opcional: verificações para te ajudar a depurar. Chamada pelos pontos de entrada
+# (discord_bot.py, antigeno_digital.py), não na importação.
+def verificar_configuracao():
+    if GROQ_API_KEY is None:
+        print("AVISO (config.py): GROQ_API_KEY não foi encontrado nas variáveis de ambiente.")
+    if DISCORD_BOT_TOKEN is None:
+        print("AVISO (config.py): DISCORD_BOT_TOKEN não foi encontrado nas variáveis de ambiente.")
+        print("Certifique-se que seu arquivo .env contém a linha: DISCORD_BOT_TOKEN='seu_token_aqui'")
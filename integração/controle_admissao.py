@@ -0,0 +1,151 @@
+# controle_admissao.py
+"""
+Controle de admissão guiado por SLO na frente da classificação do bot.
+
+Cada análise registra quanto esperou na fila e quanto levou para rodar. Antes de
+aceitar um novo prompt, a latência prevista é estimada a partir da fila atual e
+dessas medições recentes:
+
+    prevista = max((pendentes / concorrência + 1) * serviço_p90,
+                   espera_p90_recente + serviço_p90)
+
+Se a previsão passa do SLO, o prompt é descartado na hora (estado DESCARTANDO), em
+vez de esperar até a interação do Discord expirar. Para evitar oscilação, o estado
+só volta a NORMAL quando a previsão cai abaixo de `histerese * SLO`.
+
+Em DESCARTANDO quase nada roda, então quase não há medições novas: para a previsão
+não ficar presa num serviço_p90 antigo, as medições de serviço expiram depois de
+`janela_servico_s` e, a cada `intervalo_sonda_s`, um prompt passa como sonda (com a
+fila vazia) para medir o serviço atual.
+
+Prompts descartados falham fechado: recebem uma análise com classificação de erro
+(ERRO_SOBRECARGA), que o bot recusa como qualquer outra falha do Antígeno.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+SLO_CLASSIFICACAO_S = float(os.getenv("ANTIGENO_SLO_CLASSIFICACAO_S", "5")) # 0 desativa o controle
+CLASSIFICACAO_SOBRECARGA = "ERRO_SOBRECARGA"
+
+
+def _percentil(valores, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(int(round(p / 100.0 * (len(ordenados) - 1))), len(ordenados) - 1)]
+
+
+def analise_descartada(latencia_prevista_s: float, slo_s: float) -> dict:
+    """Análise no formato de obter_analise_antigeno para um prompt descartado (nunca é SEGURO)."""
+    return {
+        "classificacao_final": CLASSIFICACAO_SOBRECARGA,
+        "prob_injecao": 0.0,
+        "motivo_deteccao": f"Antígeno sobrecarregado: latência prevista de {latencia_prevista_s:.1f}s excede o SLO de {slo_s:g}s",
+        "detalhes_ia": None,
+    }
+
+
+class ControleAdmissao:
+
+    def __init__(self, slo_s: float, concorrencia: int, amostras_servico: int = 200,
+                 janela_espera_s: float = 10.0, percentil: float = 90.0,
+                 histerese: float = 0.8, min_amostras: int = 10,
+                 janela_servico_s: float = 60.0, intervalo_sonda_s: float = 1.0):
+        self.slo_s = slo_s
+        self.concorrencia = max(int(concorrencia), 1)
+        self.janela_espera_s = janela_espera_s
+        self.janela_servico_s = janela_servico_s
+        self.intervalo_sonda_s = intervalo_sonda_s
+        self.percentil = percentil
+        self.histerese = histerese
+        self.min_amostras = min_amostras
+        self._lock = threading.Lock()
+        self._servicos_s = deque(maxlen=amostras_servico) # (instante, servico_s), só dos últimos janela_servico_s segundos
+        self._esperas = deque() # (instante, espera_s), só dos últimos janela_espera_s segundos
+        self._ultima_admissao = time.monotonic()
+        self.estado = "NORMAL"
+        self.ultima_previsao_s = 0.0
+        self.admitidas = 0
+        self.descartadas = 0
+        self.entradas_em_descarte = 0
+        self.sondas = 0
+
+    @property
+    def ativo(self) -> bool:
+        return self.slo_s > 0
+
+    def registrar(self, espera_s: float, servico_s: float):
+        """Chamado ao fim de cada análise (de qualquer thread)."""
+        agora = time.monotonic()
+        with self._lock:
+            self._servicos_s.append((agora, servico_s))
+            self._esperas.append((agora, espera_s))
+
+    def executar_medindo(self, instante_chegada: float, funcao, *args):
+        """Roda `funcao(*args)` (na thread do executor) registrando espera desde `instante_chegada` e tempo de serviço."""
+        inicio = time.monotonic()
+        try:
+            return funcao(*args)
+        finally:
+            self.registrar(inicio - instante_chegada, time.monotonic() - inicio)
+
+    def prever_latencia(self, pendentes: int) -> float:
+        """Latência prevista (s) para um prompt que chega agora com `pendentes` à frente; 0.0 sem medições suficientes."""
+        agora = time.monotonic()
+        with self._lock:
+            self._expirar(agora)
+            if len(self._servicos_s) < self.min_amostras:
+                return 0.0
+            servico_s = _percentil([servico for _, servico in self._servicos_s], self.percentil)
+            espera_s = _percentil([espera for _, espera in self._esperas], self.percentil) if self._esperas else 0.0
+        return max((pendentes / self.concorrencia + 1) * servico_s, espera_s + servico_s)
+
+    def _expirar(self, agora: float):
+        """Remove medições antigas (chamado com self._lock adquirido)."""
+        while self._esperas and self._esperas[0][0] < agora - self.janela_espera_s:
+            self._esperas.popleft()
+        while self._servicos_s and self._servicos_s[0][0] < agora - self.janela_servico_s:
+            self._servicos_s.popleft()
+
+    def admitir(self, pendentes: int):
+        """Retorna (admitido, latência_prevista_s) e atualiza o estado (NORMAL/DESCARTANDO)."""
+        if not self.ativo:
+            return True, 0.0
+        prevista_s = self.prever_latencia(pendentes)
+        agora = time.monotonic()
+        with self._lock:
+            self.ultima_previsao_s = prevista_s
+            limite_s = self.slo_s if self.estado == "NORMAL" else self.slo_s * self.histerese
+            if prevista_s > limite_s and self.estado == "DESCARTANDO" and pendentes == 0 and agora - self._ultima_admissao >= self.intervalo_sonda_s:
+                # Sonda: a fila está vazia e nada é medido há um tempo; este prompt roda e renova a estimativa
+                self.sondas += 1
+                self.admitidas += 1
+                self._ultima_admissao = agora
+                return True, prevista_s
+            if prevista_s > limite_s:
+                if self.estado == "NORMAL":
+                    self.entradas_em_descarte += 1
+                self.estado = "DESCARTANDO"
+                self.descartadas += 1
+                return False, prevista_s
+            self.estado = "NORMAL"
+            self.admitidas += 1
+            self._ultima_admissao = agora
+            return True, prevista_s
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            self._expirar(time.monotonic())
+            servicos = [servico for _, servico in self._servicos_s]
+            esperas = [espera for _, espera in self._esperas]
+            return {
+                "estado": self.estado if self.ativo else "DESATIVADO",
+                "slo_ms": self.slo_s * 1000,
+                "ultima_previsao_ms": self.ultima_previsao_s * 1000,
+                "servico_p90_ms": _percentil(servicos, self.percentil) * 1000 if servicos else None,
+                "espera_p90_ms": _percentil(esperas, self.percentil) * 1000 if esperas else None,
+                "admitidas": self.admitidas,
+                "descartadas": self.descartadas,
+                "entradas_em_descarte": self.entradas_em_descarte,
+                "sondas": self.sondas,
+            }
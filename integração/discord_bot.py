@@ -1,22 +1,84 @@
 # discord_bot.py
 import discord
 from discord.ext import commands
+import argparse
 import asyncio
 import os
+import time
 
-# Importações do seu projeto Antígeno Digital
+# Importações do seu projeto Antígeno Digital (todas leves: transformers/torch e o SDK
+# da Groq só são importados quando o modelo/cliente são de fato carregados)
 import config # Para carregar o token do bot e outras chaves
-from antigeno_digital import obter_analise_antigeno, query_groq
-from classifier.model import inicializar_classificador # Para "aquecer" o modelo
-from groq_client import CLIENT_GROQ # Para verificar se o cliente Groq está pronto
+from antigeno_digital import obter_analise_antigeno
+from groq_client import consultar_cache_llm, guardar_cache_llm, obter_cache_respostas_llm, query_groq_async, query_groq_stream
+from classifier.model import aquecer_classificador, inicializar_classificador, obter_estado_classificador # Para "aquecer" o modelo e consultar se está pronto
+from classifier.registro_modelos import TrocaModeloErro, instalar_sinais, reverter_modelo, trocar_modelo
+from classifier.registro_modelos import estatisticas as estatisticas_modelos
+from groq_client import obter_cliente_groq # Para verificar se o cliente Groq está pronto
+from executores import ExecutorLimitado, ExecutorOcupadoErro, PrazoExcedidoErro
+from especulacao import ESPECULACAO_ATIVA, METRICAS_ESPECULACAO, ChamadaEspeculativaAsync
+from agendamento_justo import AgendadorJusto, LimitadorTaxa
+from controle_admissao import SLO_CLASSIFICACAO_S, ControleAdmissao, analise_descartada
+from metricas import iniciar_servidor_metricas, registrar_agendador, registrar_controle_admissao, registrar_executor
+from rastreamento import rastrear
+from registro_decisoes import registrar_decisao
 
 # --- Configurações do Bot ---
 BOT_TOKEN = config.DISCORD_BOT_TOKEN
 COMMAND_PREFIX = "!antigeno" # Ou qualquer prefixo que você preferir
+# Troca do modelo sem reiniciar o bot (ver classifier/registro_modelos.py), só para os IDs de usuário
+# em ANTIGENO_ADMINS (separados por vírgula; vazio = desativado):
+#   !antigeno-admin modelo <nome> | !antigeno-admin rollback | !antigeno-admin status
+ADMIN_PREFIX = "!antigeno-admin"
+ADMINS = {int(id_usuario) for id_usuario in os.getenv("ANTIGENO_ADMINS", "").split(",") if id_usuario.strip()}
+AQUECER_MODELO = False # Ativado com --warmup (ver __main__)
 
-if not BOT_TOKEN:
-    print("ERRO CRÍTICO (Discord Bot): DISCORD_BOT_TOKEN não encontrado. Verifique seu .env e config.py.")
-    exit()
+# Executores separados para a classificação e para o LLM: um Groq lento não ocupa as
+# threads do classificador, e rajadas de mensagens recebem "ocupado" em vez de fila sem limite.
+EXECUTOR_CLASSIFICACAO = ExecutorLimitado(
+    "classificacao",
+    num_threads=int(os.getenv("ANTIGENO_THREADS_CLASSIFICACAO", "4")),
+    tamanho_max_fila=int(os.getenv("ANTIGENO_FILA_CLASSIFICACAO", "32")),
+    prazo_s=float(os.getenv("ANTIGENO_PRAZO_CLASSIFICACAO_S", "15")),
+)
+EXECUTOR_LLM = ExecutorLimitado(
+    "llm",
+    num_threads=int(os.getenv("ANTIGENO_THREADS_LLM", "8")),
+    tamanho_max_fila=int(os.getenv("ANTIGENO_FILA_LLM", "32")),
+    prazo_s=float(os.getenv("ANTIGENO_PRAZO_LLM_S", "60")),
+)
+# Justiça entre usuários: limite de taxa por usuário e por canal (balde de tokens; prompts longos
+# custam mais) e despacho round-robin por usuário na frente do executor de classificação.
+LIMITADOR_TAXA = LimitadorTaxa(
+    capacidade_usuario=float(os.getenv("ANTIGENO_LIMITE_USUARIO_RAJADA", "5")),
+    por_minuto_usuario=float(os.getenv("ANTIGENO_LIMITE_USUARIO_POR_MIN", "10")),
+    capacidade_canal=float(os.getenv("ANTIGENO_LIMITE_CANAL_RAJADA", "20")),
+    por_minuto_canal=float(os.getenv("ANTIGENO_LIMITE_CANAL_POR_MIN", "60")),
+    caracteres_por_token=int(os.getenv("ANTIGENO_LIMITE_CARACTERES_POR_TOKEN", "1000")),
+)
+AGENDADOR_CLASSIFICACAO = AgendadorJusto(
+    max_concorrencia=EXECUTOR_CLASSIFICACAO.num_threads, # A fila de verdade fica no agendador, não no executor
+    max_pendentes_por_usuario=int(os.getenv("ANTIGENO_PENDENTES_POR_USUARIO", "3")),
+    nome="agendador_classificacao",
+)
+# Controle de admissão: se a latência prevista da análise (fila atual x tempos recentes) passa do
+# SLO (ANTIGENO_SLO_CLASSIFICACAO_S, 0 desativa), o prompt é recusado na hora, sem ir ao Groq.
+CONTROLE_ADMISSAO = ControleAdmissao(SLO_CLASSIFICACAO_S, concorrencia=EXECUTOR_CLASSIFICACAO.num_threads)
+# Métricas Prometheus (latência por etapa, veredictos, filas, caches): com ANTIGENO_METRICAS_PORTA
+# definida, o bot responde GET /metrics nessa porta (ver metricas.py).
+METRICAS_HOST = os.getenv("ANTIGENO_METRICAS_HOST", "127.0.0.1")
+METRICAS_PORTA = int(os.getenv("ANTIGENO_METRICAS_PORTA", "0")) # 0 = desativado
+registrar_executor(EXECUTOR_CLASSIFICACAO)
+registrar_executor(EXECUTOR_LLM)
+registrar_agendador("agendador_classificacao", AGENDADOR_CLASSIFICACAO)
+registrar_controle_admissao("bot", CONTROLE_ADMISSAO)
+# Streaming da resposta do LLM: a mensagem é editada à medida que os tokens chegam, no máximo
+# uma edição a cada INTERVALO_EDICAO_S (limite de edições do Discord), e continua em novas
+# mensagens em vez de truncar em 2000 caracteres. ANTIGENO_STREAMING=0 volta à resposta completa.
+STREAMING_ATIVO = os.getenv("ANTIGENO_STREAMING", "1") != "0"
+INTERVALO_EDICAO_S = float(os.getenv("ANTIGENO_INTERVALO_EDICAO_S", "1.0"))
+LIMITE_CARACTERES_DISCORD = 2000
+MENSAGEM_OCUPADO = "⏳ O Antígeno Digital está ocupado no momento. Tente novamente em alguns segundos."
 
 # Define as intents necessárias para o bot
 # message_content é crucial para ler o conteúdo das mensagens
@@ -36,22 +98,122 @@ async def run_blocking_io(blocking_func, *args):
         loop = asyncio.get_running_loop()
         return await loop.run_in_executor(None, blocking_func, *args)
 
+class RespostaProgressiva:
+    """
+    Mostra um texto que cresce aos poucos (streaming do LLM) em mensagens do Discord.
+    As atualizações são agrupadas: `acrescentar` só edita a mensagem se já passou
+    `intervalo_s` desde a última edição. Ao passar de 2000 caracteres, a mensagem atual
+    é fechada (quebrando em fim de linha/espaço) e o texto continua em uma nova.
+    """
+    CURSOR = " ▌"
+
+    def __init__(self, canal, cabecalho: str, intervalo_s: float = INTERVALO_EDICAO_S):
+        self.canal = canal
+        self.cabecalho = cabecalho
+        self.intervalo_s = intervalo_s
+        self.texto = ""
+        self.mensagens = []
+        self._inicio_mensagem_atual = 0 # Posição em self.texto onde começa a mensagem atual
+        self._mensagem_atual = None
+        self._conteudo_atual = None
+        self._ultima_atualizacao = 0.0
+
+    async def acrescentar(self, trecho: str):
+        self.texto += trecho
+        if time.monotonic() - self._ultima_atualizacao >= self.intervalo_s:
+            await self._atualizar(final=False)
+
+    async def concluir(self, sufixo: str = ""):
+        self.texto += sufixo
+        if not self.texto.strip():
+            self.texto = "(resposta vazia)"
+        await self._atualizar(final=True)
+
+    async def _atualizar(self, final: bool):
+        self._ultima_atualizacao = time.monotonic()
+        while True:
+            prefixo = self.cabecalho if not self.mensagens or self._mensagem_atual is self.mensagens[0] else ">>> "
+            capacidade = LIMITE_CARACTERES_DISCORD - len(prefixo) - len(self.CURSOR)
+            trecho = self.texto[self._inicio_mensagem_atual:]
+            if len(trecho) <= capacidade:
+                if trecho.strip():
+                    await self._enviar_ou_editar(prefixo + trecho + ("" if final else self.CURSOR))
+                return
+            corte = max(trecho.rfind("\n", 0, capacidade), trecho.rfind(" ", 0, capacidade)) + 1 # Quebra depois do separador
+            if corte < capacidade // 2:
+                corte = capacidade
+            await self._enviar_ou_editar(prefixo + trecho[:corte])
+            self._inicio_mensagem_atual += corte
+            self._mensagem_atual = None # O restante vai para uma nova mensagem
+
+    async def _enviar_ou_editar(self, conteudo: str):
+        if self._mensagem_atual is None:
+            self._mensagem_atual = await self.canal.send(conteudo)
+            self.mensagens.append(self._mensagem_atual)
+        elif conteudo != self._conteudo_atual:
+            await self._mensagem_atual.edit(content=conteudo)
+        self._conteudo_atual = conteudo
+
+async def consultar_llm(prompt_usuario: str, guardar_cache: bool = True) -> str:
+    """
+    Consulta o Groq pelo cliente assíncrono (conexões reaproveitadas, retentativas e disjuntor,
+    ver cliente_llm.py). Ocupa uma vaga do EXECUTOR_LLM, mas nenhuma thread, e respeita o prazo.
+    """
+    async with EXECUTOR_LLM.reservar():
+        try:
+            return await asyncio.wait_for(query_groq_async(prompt_usuario, consultar_cache=False, guardar_cache=guardar_cache), timeout=EXECUTOR_LLM.prazo_s)
+        except asyncio.TimeoutError:
+            raise PrazoExcedidoErro(f"Consulta ao Groq excedeu o prazo de {EXECUTOR_LLM.prazo_s:g}s.")
+
+async def responder_em_streaming(canal, prompt_usuario: str, cabecalho: str) -> str:
+    """Envia a resposta do Groq ao canal à medida que é gerada. Retorna o texto completo."""
+    resposta = RespostaProgressiva(canal, cabecalho)
+    inicio = time.perf_counter()
+    primeiro_trecho = True
+    async with EXECUTOR_LLM.reservar():
+        try:
+            async for trecho in query_groq_stream(prompt_usuario, consultar_cache=False):
+                if primeiro_trecho:
+                    print(f"  Primeiro token do Groq em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+                    primeiro_trecho = False
+                await resposta.acrescentar(trecho)
+        except BaseException: # Inclui o cancelamento pelo prazo: fecha a mensagem parcial sem o cursor
+            await asyncio.shield(resposta.concluir(" […]"))
+            raise
+        await resposta.concluir()
+    return resposta.texto
+
+def descartar_especulacao(especulacao):
+    """Cancela/descarta a resposta especulativa do LLM (veredicto diferente de SEGURO): nada dela é exibido."""
+    if especulacao is not None:
+        especulacao.descartar()
+        print(f"  Resposta especulativa do LLM descartada. Métricas: {METRICAS_ESPECULACAO.estatisticas()}")
+
 async def inicializar_sistemas_antigeno():
     """
     Inicializa os componentes do Antígeno Digital que podem ter carregamento demorado.
+    Roda em segundo plano (ver setup_hook), em paralelo com o login no gateway do Discord.
     """
     print("Inicializando sistema de classificação do Antígeno Digital...")
+    inicio = time.perf_counter()
     try:
         # "Aquece" o modelo de IA (carrega se ainda não carregado)
         # A função analisar_prompt_pela_ia (chamada por obter_analise_antigeno) 
         # já chama inicializar_classificador na primeira vez.
         # Podemos fazer uma chamada à função de inicialização diretamente aqui para garantir.
         await run_blocking_io(inicializar_classificador) # Executa a inicialização síncrona em um thread
-        print("Modelo de classificação de IA pronto (ou já estava).")
+        estado_classificador = obter_estado_classificador()
+        if estado_classificador == "PRONTO":
+            print(f"Modelo de classificação de IA pronto (ou já estava) em {time.perf_counter() - inicio:.1f}s.")
+            if AQUECER_MODELO:
+                duracao_aquecimento = await run_blocking_io(aquecer_classificador)
+                print(f"Aquecimento do classificador concluído em {duracao_aquecimento:.1f}s.")
+        else:
+            print(f"AVISO (Discord Bot): Classificador de IA não está pronto (estado: {estado_classificador}).")
     except Exception as e_cls:
         print(f"Erro ao inicializar o classificador de IA: {e_cls}")
 
-    if CLIENT_GROQ is None: # CLIENT_GROQ é carregado quando groq_client.py é importado
+    if await run_blocking_io(obter_cliente_groq) is None: # O cliente Groq é criado na primeira chamada
         print("AVISO (Discord Bot): Cliente Groq não parece estar inicializado. Verifique groq_client.py e API Key.")
     else:
         print("Cliente Groq parece estar pronto.")
@@ -59,94 +221,221 @@ async def inicializar_sistemas_antigeno():
 
 
 # --- Eventos do Bot ---
+@bot.event
+async def setup_hook():
+    """Chamado antes da conexão com o gateway: o modelo carrega enquanto o login acontece."""
+    bot.tarefa_inicializacao = asyncio.create_task(inicializar_sistemas_antigeno())
+    if METRICAS_PORTA:
+        bot.servidor_metricas = await iniciar_servidor_metricas(METRICAS_HOST, METRICAS_PORTA)
+    instalar_sinais(asyncio.get_running_loop()) # SIGHUP troca o modelo, SIGUSR2 reverte
+
 @bot.event
 async def on_ready():
     """Chamado quando o bot está conectado e pronto."""
     print(f'Bot conectado como {bot.user.name} (ID: {bot.user.id})')
     print(f'Prefixo de comando: {COMMAND_PREFIX}')
     print('------')
-    await inicializar_sistemas_antigeno() # Inicializa os modelos
+    await bot.tarefa_inicializacao # Normalmente já concluída, ou quase, quando o gateway fica pronto
     print("Bot está pronto para receber comandos!")
 
 @bot.event
 async def on_message(message: discord.Message):
     """Chamado quando uma mensagem é enviada em qualquer canal que o bot pode ver."""
-    # Ignorar mensagens do próprio bot para evitar loops
-    if message.author == bot.user:
+    # Só os comandos do Antígeno entram na amostragem do rastreamento (ANTIGENO_TRACE_AMOSTRAGEM, ver rastreamento.py)
+    if message.author == bot.user or not message.content.startswith(COMMAND_PREFIX):
         return
+    if message.content.startswith(ADMIN_PREFIX): # Antes do prompt: "!antigeno-admin" também começa com "!antigeno"
+        await processar_comando_admin(message)
+        return
+    with rastrear("on_message", caracteres=len(message.content)):
+        await processar_comando(message)
 
-    # Verificar se a mensagem começa com o prefixo de comando
-    if message.content.startswith(COMMAND_PREFIX):
-        # Extrair o prompt do usuário (texto após o prefixo e um espaço)
-        if len(message.content) > len(COMMAND_PREFIX) + 1:
-            prompt_usuario = message.content[len(COMMAND_PREFIX):].strip()
-            if not prompt_usuario:
-                await message.channel.send(f"Por favor, forneça um prompt após `{COMMAND_PREFIX}`.")
-                return
-        else:
-            await message.channel.send(f"Uso: `{COMMAND_PREFIX} seu prompt aqui`")
+async def processar_comando_admin(message: discord.Message):
+    """Troca, rollback e estado do modelo. A carga e o canário rodam numa thread: o bot segue atendendo."""
+    if message.author.id not in ADMINS:
+        print(f"AVISO: comando de administração recusado para '{message.author.name}' (ID {message.author.id}).")
+        return
+    argumentos = message.content[len(ADMIN_PREFIX):].split()
+    if argumentos[:1] == ["status"]:
+        estado = estatisticas_modelos()
+        ativa, reserva = estado["ativa"], estado["reserva_rollback"]
+        await message.channel.send(
+            f"Modelo ativo: `{ativa['nome'] if ativa else obter_estado_classificador()}`"
+            f" ({ativa['identidade'] if ativa else '-'}). Reserva para rollback: `{reserva['nome'] if reserva else 'nenhuma'}`."
+            f" Disponíveis: {', '.join(estado['disponiveis'])}"
+        )
+        return
+    if argumentos[:1] == ["modelo"] and len(argumentos) == 2:
+        await message.channel.send(f"🔄 Carregando `{argumentos[1]}` (aquecimento + canário) sem interromper o atendimento...")
+        operacao, args_operacao = trocar_modelo, (argumentos[1],)
+    elif argumentos == ["rollback"]:
+        operacao, args_operacao = reverter_modelo, ()
+    else:
+        await message.channel.send(f"Uso: `{ADMIN_PREFIX} modelo <nome>`, `{ADMIN_PREFIX} rollback` ou `{ADMIN_PREFIX} status`")
+        return
+    try:
+        registro = await run_blocking_io(operacao, *args_operacao)
+    except TrocaModeloErro as e:
+        await message.channel.send(f"⚠️ {e}")
+        return
+    canario = registro.get("canario")
+    await message.channel.send(
+        f"✅ Modelo ativo: `{registro['nova']}` ({registro['identidade']}), antes `{registro['anterior']}`."
+        + (f" Canário: acurácia {canario['acuracia']:.1%} (ativa: {registro['canario_ativa']['acuracia']:.1%})." if canario else "")
+    )
+
+async def processar_comando(message: discord.Message):
+    """
+    Trata um comando do Antígeno: limite de taxa, admissão, análise e resposta do LLM.
+    on_message já filtrou as mensagens do próprio bot e as que não começam com o prefixo.
+    """
+    # Extrair o prompt do usuário (texto após o prefixo e um espaço)
+    if len(message.content) > len(COMMAND_PREFIX) + 1:
+        prompt_usuario = message.content[len(COMMAND_PREFIX):].strip()
+        if not prompt_usuario:
+            await message.channel.send(f"Por favor, forneça um prompt após `{COMMAND_PREFIX}`.")
             return
-        
-        print(f"\nComando recebido de '{message.author.name}': {COMMAND_PREFIX} {prompt_usuario}")
-        # Envia uma mensagem de "processando" para dar feedback ao usuário
-        processing_message = await message.channel.send(f"Analisando seu prompt com o Antígeno Digital: \"{prompt_usuario[:50]}...\" 🔬")
+    else:
+        await message.channel.send(f"Uso: `{COMMAND_PREFIX} seu prompt aqui`")
+        return
+    
+    print(f"\nComando recebido de '{message.author.name}': {COMMAND_PREFIX} {prompt_usuario}")
+    permitido, espera_s, escopo_limite = LIMITADOR_TAXA.permitir(message.author.id, message.channel.id, prompt_usuario)
+    if not permitido:
+        print(f"  Limitado ({escopo_limite}): {LIMITADOR_TAXA.estatisticas()}")
+        if escopo_limite == "usuario":
+            await message.channel.send(f"🐢 {message.author.mention}, você está enviando prompts rápido demais. Tente novamente em {espera_s:.0f}s.")
+        else:
+            await message.channel.send(f"🐢 Muitos prompts neste canal agora. Tente novamente em {espera_s:.0f}s.")
+        return
+    print(f"  Filas: {AGENDADOR_CLASSIFICACAO.estatisticas()} | {EXECUTOR_CLASSIFICACAO.estatisticas()} | {EXECUTOR_LLM.estatisticas()} | Admissão: {CONTROLE_ADMISSAO.estatisticas()}")
+    # Envia uma mensagem de "processando" para dar feedback ao usuário
+    processing_message = await message.channel.send(f"Analisando seu prompt com o Antígeno Digital: \"{prompt_usuario[:50]}...\" 🔬")
 
-        # 1. Analisar com o Antígeno Digital (executado em thread para não bloquear)
-        try:
-            analise_completa = await run_blocking_io(obter_analise_antigeno, prompt_usuario)
-            classificacao = analise_completa["classificacao_final"]
-            prob_injecao = analise_completa["prob_injecao"]
-            motivo_deteccao = analise_completa["motivo_deteccao"]
-            
-            print(f"  Resultado Antígeno: Classificação='{classificacao}', Prob.Injeção='{prob_injecao:.2%}', Motivo='{motivo_deteccao}'")
+    # Admissão decidida antes de qualquer trabalho (cache, especulação): descartado não consulta o Groq
+    instante_chegada = time.monotonic()
+    admitido, latencia_prevista_s = CONTROLE_ADMISSAO.admitir(AGENDADOR_CLASSIFICACAO.estatisticas()["aguardando"])
 
-        except Exception as e_antigeno:
-            print(f"ERRO ao processar com Antígeno Digital: {e_antigeno}")
-            await processing_message.edit(content=f"Desculpe, ocorreu um erro ao analisar seu prompt com o Antígeno Digital: `{e_antigeno}`")
-            return
+    # Cache de respostas do LLM (ANTIGENO_CACHE_LLM=1): consulta local ao SQLite, feita aqui no event loop,
+    # sem ocupar vaga do EXECUTOR_LLM. A resposta em cache só é exibida depois do veredicto SEGURO.
+    # Modo especulativo (ANTIGENO_LLM_ESPECULATIVO=1): o Groq é consultado em paralelo com a análise,
+    # mas a resposta fica retida e só é liberada se o veredicto for SEGURO.
+    resposta_em_cache = consultar_cache_llm(prompt_usuario) if admitido else None
+    especulacao = None
+    if admitido and ESPECULACAO_ATIVA and resposta_em_cache is None: # Só guarda no cache se a resposta for liberada
+        especulacao = ChamadaEspeculativaAsync(consultar_llm(prompt_usuario, guardar_cache=False))
 
-        # 2. Decidir ação e responder
-        if classificacao == "INJECAO":
-            resposta_bot_texto = (
-                f"🚨 **ALERTA DO ANTÍGENO DIGITAL** 🚨\n"
-                f"> **Prompt:** `{prompt_usuario}`\n"
-                f"> **Motivo da Detecção:** `{motivo_deteccao}`\n"
-                f"> **Probabilidade de Injeção:** `{prob_injecao:.2%}`\n"
-                f"⚠️ **Ação:** Prompt BLOQUEADO."
+    # 1. Analisar com o Antígeno Digital (na vez do usuário, no executor de classificação para não bloquear).
+    # Prompt descartado pelo controle de admissão recebe uma análise de erro e cai na recusa do passo 2.
+    try:
+        if admitido:
+            analise_completa = await AGENDADOR_CLASSIFICACAO.executar(
+                message.author.id,
+                lambda: EXECUTOR_CLASSIFICACAO.executar(CONTROLE_ADMISSAO.executar_medindo, instante_chegada, obter_analise_antigeno, prompt_usuario),
             )
-            await processing_message.edit(content=resposta_bot_texto)
-        
-        elif classificacao == "SEGURO":
-            await processing_message.edit(content=f"Antígeno Digital: Prompt \"{prompt_usuario[:50]}...\" parece seguro (Prob. Injeção: {prob_injecao:.2%}). Enviando para o modelo principal (Groq)... 🧠")
-            try:
-                # Chamar Groq (executado em thread para não bloquear)
-                resposta_groq = await run_blocking_io(query_groq, prompt_usuario)
-                
-                print(f"  Resposta Groq: '{resposta_groq[:100]}...'")
-                
-                # Respostas longas do Groq podem precisar ser divididas ou enviadas em embeds
-                header_groq = f"**Resposta do Modelo Principal (Groq) para:** `{prompt_usuario}`\n>>> "
-                if len(header_groq + resposta_groq) > 2000: # Limite de caracteres do Discord por mensagem é 2000
-                    await message.channel.send(f"{header_groq}{resposta_groq[:2000 - len(header_groq) - 3]}...") # Trunca para caber
-                else:
-                    await message.channel.send(f"{header_groq}{resposta_groq}")
-
-            except Exception as e_groq:
-                print(f"ERRO ao obter resposta do modelo Groq: {e_groq}")
-                await message.channel.send(f"Desculpe, ocorreu um erro ao buscar a resposta do modelo Groq: `{e_groq}`")
+        else:
+            print(f"AVISO: prompt descartado pelo controle de admissão (previsão {latencia_prevista_s:.2f}s > SLO {CONTROLE_ADMISSAO.slo_s:g}s)")
+            analise_completa = analise_descartada(latencia_prevista_s, CONTROLE_ADMISSAO.slo_s)
+        classificacao = analise_completa["classificacao_final"]
+        prob_injecao = analise_completa["prob_injecao"]
+        motivo_deteccao = analise_completa["motivo_deteccao"]
         
-        else: # Casos de erro do Antígeno (ERRO_ANTIGENO, ANTIGENO_IA_DESCONHECIDO, etc.)
-            resposta_bot_texto = (
-                f"⚠️ **ATENÇÃO - ANTÍGENO DIGITAL** ⚠️\n"
-                f"> **Prompt:** `{prompt_usuario}`\n"
-                f"> **Problema na Análise:** `{classificacao}`\n"
-                f"> **Detalhe:** `{motivo_deteccao}`\n"
-                f"🚫 **Ação:** Por segurança, o prompt NÃO será enviado ao modelo principal."
-            )
-            await processing_message.edit(content=resposta_bot_texto)
+        print(f"  Resultado Antígeno: Classificação='{classificacao}', Prob.Injeção='{prob_injecao:.2%}', Motivo='{motivo_deteccao}'")
+        registrar_decisao(prompt_usuario, analise_completa, (time.monotonic() - instante_chegada) * 1000, "bot") # Só enfileira (ANTIGENO_DECISOES_DIR)
+
+    except ExecutorOcupadoErro as e_ocupado:
+        print(f"AVISO: {e_ocupado}")
+        descartar_especulacao(especulacao)
+        await processing_message.edit(content=MENSAGEM_OCUPADO)
+        return
+    except PrazoExcedidoErro as e_prazo:
+        print(f"AVISO: {e_prazo}")
+        descartar_especulacao(especulacao)
+        await processing_message.edit(content="⏳ A análise do Antígeno Digital demorou demais. Por segurança, o prompt NÃO será enviado ao modelo principal; tente novamente.")
+        return
+    except Exception as e_antigeno:
+        print(f"ERRO ao processar com Antígeno Digital: {e_antigeno}")
+        descartar_especulacao(especulacao)
+        await processing_message.edit(content=f"Desculpe, ocorreu um erro ao analisar seu prompt com o Antígeno Digital: `{e_antigeno}`")
+        return
+
+    # 2. Decidir ação e responder
+    if classificacao == "INJECAO":
+        descartar_especulacao(especulacao)
+        resposta_bot_texto = (
+            f"🚨 **ALERTA DO ANTÍGENO DIGITAL** 🚨\n"
+            f"> **Prompt:** `{prompt_usuario}`\n"
+            f"> **Motivo da Detecção:** `{motivo_deteccao}`\n"
+            f"> **Probabilidade de Injeção:** `{prob_injecao:.2%}`\n"
+            f"⚠️ **Ação:** Prompt BLOQUEADO."
+        )
+        await processing_message.edit(content=resposta_bot_texto)
     
+    elif classificacao == "SEGURO":
+        await processing_message.edit(content=f"Antígeno Digital: Prompt \"{prompt_usuario[:50]}...\" parece seguro (Prob. Injeção: {prob_injecao:.2%}). Enviando para o modelo principal (Groq)... 🧠")
+        try:
+            header_groq = f"**Resposta do Modelo Principal (Groq) para:** `{prompt_usuario[:150]}`\n>>> "
+            if resposta_em_cache is not None:
+                print(f"  Resposta Groq servida pelo cache: {obter_cache_respostas_llm().estatisticas()}")
+                resposta = RespostaProgressiva(message.channel, header_groq)
+                resposta.texto = resposta_em_cache
+                await resposta.concluir()
+                return
+            if especulacao is None and STREAMING_ATIVO:
+                try:
+                    resposta_groq = await asyncio.wait_for(responder_em_streaming(message.channel, prompt_usuario, header_groq), timeout=EXECUTOR_LLM.prazo_s)
+                except asyncio.TimeoutError:
+                    raise PrazoExcedidoErro(f"Streaming do Groq excedeu o prazo de {EXECUTOR_LLM.prazo_s:g}s.")
+                print(f"  Resposta Groq (streaming): '{resposta_groq[:100]}...'")
+                return
+
+            # Chamar Groq (cliente assíncrono, sem bloquear o event loop), ou liberar a resposta especulativa
+            if especulacao is not None:
+                resposta_groq = await especulacao.liberar()
+                guardar_cache_llm(prompt_usuario, resposta_groq)
+                print(f"  Resposta especulativa do LLM liberada. Métricas: {METRICAS_ESPECULACAO.estatisticas()}")
+            else:
+                resposta_groq = await consultar_llm(prompt_usuario)
+            
+            print(f"  Resposta Groq: '{resposta_groq[:100]}...'")
+            
+            # Respostas longas (limite de 2000 caracteres por mensagem) continuam em mensagens seguintes
+            resposta = RespostaProgressiva(message.channel, header_groq)
+            resposta.texto = resposta_groq
+            await resposta.concluir()
+
+        except ExecutorOcupadoErro as e_ocupado:
+            print(f"AVISO: {e_ocupado}")
+            await message.channel.send(MENSAGEM_OCUPADO)
+        except PrazoExcedidoErro as e_prazo:
+            print(f"AVISO: {e_prazo}")
+            await message.channel.send("⏳ O modelo principal (Groq) demorou demais para responder. Tente novamente.")
+        except Exception as e_groq:
+            print(f"ERRO ao obter resposta do modelo Groq: {e_groq}")
+            await message.channel.send(f"Desculpe, ocorreu um erro ao buscar a resposta do modelo Groq: `{e_groq}`")
+    
+    else: # Casos de erro do Antígeno (ERRO_ANTIGENO, ERRO_SOBRECARGA, ANTIGENO_IA_DESCONHECIDO, etc.)
+        descartar_especulacao(especulacao)
+        resposta_bot_texto = (
+            f"⚠️ **ATENÇÃO - ANTÍGENO DIGITAL** ⚠️\n"
+            f"> **Prompt:** `{prompt_usuario}`\n"
+            f"> **Problema na Análise:** `{classificacao}`\n"
+            f"> **Detalhe:** `{motivo_deteccao}`\n"
+            f"🚫 **Ação:** Por segurança, o prompt NÃO será enviado ao modelo principal."
+        )
+        await processing_message.edit(content=resposta_bot_texto)
+
 # --- Iniciar o Bot ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bot Antígeno Digital para Discord.")
+    parser.add_argument("--warmup", action="store_true", help="Após carregar o modelo, roda lotes sintéticos nos formatos mais comuns antes da primeira mensagem.")
+    AQUECER_MODELO = parser.parse_args().warmup
+
+    config.verificar_configuracao()
+    if not BOT_TOKEN:
+        print("ERRO CRÍTICO (Discord Bot): DISCORD_BOT_TOKEN não encontrado. Verifique seu .env e config.py.")
+        exit()
+
     print("Iniciando o Bot Antígeno Digital para Discord...")
     if BOT_TOKEN:
         try:
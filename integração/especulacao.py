@@ -0,0 +1,115 @@
+# especulacao.py
+"""
+Chamada especulativa ao LLM (ANTIGENO_LLM_ESPECULATIVO=1, desligada por padrão).
+
+A consulta ao Groq começa junto com a classificação e a resposta fica retida em
+memória: só é entregue (`liberar`) se o veredicto for SEGURO. Para qualquer outro
+veredicto ela é cancelada ou descartada (`descartar`) sem nunca ser exibida.
+A latência cai de classificação + LLM para max(classificação, LLM), ao custo das
+chamadas desperdiçadas, contabilizadas em METRICAS_ESPECULACAO.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+
+ESPECULACAO_ATIVA = os.getenv("ANTIGENO_LLM_ESPECULATIVO", "0") == "1"
+
+
+class MetricasEspeculacao:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._aproveitadas = 0
+        self._desperdicadas = 0
+        self._desperdicadas_concluidas = 0 # Chegaram a completar: custo integral pago à toa
+        self._caracteres_descartados = 0
+        self._economia_total_s = 0.0
+
+    def registrar(self, aproveitada: bool, sobreposicao_s: float, concluida: bool = False, caracteres: int = 0):
+        with self._lock:
+            if aproveitada:
+                self._aproveitadas += 1
+                self._economia_total_s += max(sobreposicao_s, 0.0)
+            else:
+                self._desperdicadas += 1
+                self._desperdicadas_concluidas += int(concluida)
+                self._caracteres_descartados += caracteres
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            chamadas = self._aproveitadas + self._desperdicadas
+            return {
+                "chamadas": chamadas,
+                "aproveitadas": self._aproveitadas,
+                "desperdicadas": self._desperdicadas,
+                "desperdicadas_concluidas": self._desperdicadas_concluidas,
+                "taxa_desperdicio": (self._desperdicadas / chamadas) if chamadas else 0.0,
+                "caracteres_descartados": self._caracteres_descartados,
+                "economia_media_ms": (self._economia_total_s / self._aproveitadas * 1000) if self._aproveitadas else 0.0,
+            }
+
+
+METRICAS_ESPECULACAO = MetricasEspeculacao()
+
+
+class _ChamadaEspeculativa:
+    """Tempos comuns às variantes: o ganho é o quanto o LLM rodou antes do veredicto."""
+
+    def __init__(self, metricas: MetricasEspeculacao):
+        self._metricas = metricas
+        self.inicio = time.perf_counter()
+        self.fim = None
+
+    def _marcar_fim(self, *_):
+        self.fim = time.perf_counter()
+
+    def _sobreposicao_s(self, instante_veredicto: float) -> float:
+        return min(instante_veredicto, self.fim if self.fim is not None else instante_veredicto) - self.inicio
+
+
+class ChamadaEspeculativaAsync(_ChamadaEspeculativa):
+    """Variante para o bot: `corrotina` (ex: EXECUTOR_LLM.executar(query_groq, prompt)) vira uma task."""
+
+    def __init__(self, corrotina, metricas: MetricasEspeculacao = METRICAS_ESPECULACAO):
+        super().__init__(metricas)
+        self._tarefa = asyncio.ensure_future(corrotina)
+        self._tarefa.add_done_callback(self._marcar_fim)
+        self._tarefa.add_done_callback(_consumir_excecao)
+
+    async def liberar(self):
+        """Veredicto SEGURO: aguarda (se ainda preciso) e retorna a resposta retida."""
+        self._metricas.registrar(True, self._sobreposicao_s(time.perf_counter()))
+        return await self._tarefa
+
+    def descartar(self):
+        concluida = self._tarefa.done() and not self._tarefa.cancelled() and self._tarefa.exception() is None
+        caracteres = len(self._tarefa.result() or "") if concluida else 0
+        self._tarefa.cancel()
+        self._metricas.registrar(False, self._sobreposicao_s(time.perf_counter()), concluida, caracteres)
+
+
+class ChamadaEspeculativaSync(_ChamadaEspeculativa):
+    """Variante para o modo interativo: `funcao(*args)` roda em `executor` (concurrent.futures)."""
+
+    def __init__(self, executor, funcao, *args, metricas: MetricasEspeculacao = METRICAS_ESPECULACAO):
+        super().__init__(metricas)
+        self._futuro = executor.submit(contextvars.copy_context().run, funcao, *args) # Mantém o rastro do chamador
+        self._futuro.add_done_callback(self._marcar_fim)
+
+    def liberar(self):
+        self._metricas.registrar(True, self._sobreposicao_s(time.perf_counter()))
+        return self._futuro.result()
+
+    def descartar(self):
+        concluida = self._futuro.done() and not self._futuro.cancelled() and self._futuro.exception() is None
+        caracteres = len(self._futuro.result() or "") if concluida else 0
+        self._futuro.cancel() # Só tem efeito se ainda não começou; senão o resultado é ignorado
+        self._metricas.registrar(False, self._sobreposicao_s(time.perf_counter()), concluida, caracteres)
+
+
+def _consumir_excecao(tarefa):
+    # Evita o aviso "Task exception was never retrieved" em chamadas descartadas que falharam.
+    if not tarefa.cancelled():
+        tarefa.exception()
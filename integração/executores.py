@@ -0,0 +1,122 @@
+# executores.py
+"""
+Executores limitados para o trabalho bloqueante do bot (classificação e chamadas ao LLM).
+
+Cada ExecutorLimitado tem um número fixo de threads e uma fila de espera com
+tamanho máximo: quando threads + fila estão ocupadas, `executar` levanta
+ExecutorOcupadoErro na hora, em vez de acumular trabalho sem limite. Cada
+requisição tem um prazo; se ele vence ainda na fila, a requisição nem começa.
+Usar executores separados impede que um LLM lento ocupe as threads do classificador.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from metricas import HISTOGRAMA_ESPERA_FILA
+from rastreamento import registrar_espera
+
+
+class ExecutorOcupadoErro(Exception):
+    """Threads e fila do executor estão cheias: o chamador deve pedir para tentar novamente."""
+
+
+class PrazoExcedidoErro(Exception):
+    """A requisição não terminou (ou nem começou) dentro do prazo."""
+
+
+class ExecutorLimitado:
+
+    def __init__(self, nome: str, num_threads: int, tamanho_max_fila: int, prazo_s: float):
+        self.nome = nome
+        self.num_threads = max(int(num_threads), 1)
+        self.tamanho_max_fila = max(int(tamanho_max_fila), 0)
+        self.prazo_s = prazo_s
+        self._executor = ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix=f"antigeno-{nome}")
+        self._lock = threading.Lock()
+        self._em_andamento = 0 # Na fila + executando
+        self._executando = 0
+        self._profundidade_max_fila = 0
+        self._concluidas = 0
+        self._rejeitadas = 0
+        self._prazos_excedidos = 0
+
+    def _executar_com_prazo(self, instante_submissao: float, instante_limite: float, funcao, args):
+        agora = time.monotonic()
+        HISTOGRAMA_ESPERA_FILA.observar(agora - instante_submissao, f"executor_{self.nome}")
+        registrar_espera(f"fila_executor_{self.nome}", agora - instante_submissao)
+        if agora >= instante_limite:
+            raise PrazoExcedidoErro(f"Prazo vencido na fila do executor '{self.nome}'.")
+        with self._lock:
+            self._executando += 1
+        try:
+            return funcao(*args)
+        finally:
+            with self._lock:
+                self._executando -= 1
+
+    def _finalizar(self, _futuro):
+        with self._lock:
+            self._em_andamento -= 1
+            self._concluidas += 1
+
+    async def executar(self, funcao, *args, prazo_s: float = None):
+        """
+        Executa `funcao(*args)` em uma thread do executor e aguarda o resultado.
+        Levanta ExecutorOcupadoErro se não houver vaga e PrazoExcedidoErro se o prazo vencer.
+        """
+        prazo_s = self.prazo_s if prazo_s is None else prazo_s
+        self._ocupar_vaga()
+        # A vaga só é liberada quando a thread termina de fato (mesmo que o chamador já tenha desistido).
+        # A thread roda no contexto do chamador: o rastro da requisição (rastreamento.py) continua nela.
+        agora = time.monotonic()
+        contexto = contextvars.copy_context()
+        futuro = self._executor.submit(contexto.run, self._executar_com_prazo, agora, agora + prazo_s, funcao, args)
+        futuro.add_done_callback(self._finalizar)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(futuro), timeout=prazo_s)
+        except (asyncio.TimeoutError, PrazoExcedidoErro):
+            with self._lock:
+                self._prazos_excedidos += 1
+            raise PrazoExcedidoErro(f"Requisição excedeu o prazo de {prazo_s:g}s no executor '{self.nome}'.")
+
+    @asynccontextmanager
+    async def reservar(self):
+        """
+        Ocupa uma vaga do executor durante o bloco `async with`, para trabalho assíncrono que
+        não usa thread (ex: streaming do LLM). Entra na mesma contagem de `executar`.
+        """
+        self._ocupar_vaga()
+        with self._lock:
+            self._executando += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._executando -= 1
+            self._finalizar(None)
+
+    def _ocupar_vaga(self):
+        with self._lock:
+            if self._em_andamento >= self.num_threads + self.tamanho_max_fila:
+                self._rejeitadas += 1
+                raise ExecutorOcupadoErro(f"Executor '{self.nome}' ocupado ({self._em_andamento} requisições em andamento).")
+            self._em_andamento += 1
+            self._profundidade_max_fila = max(self._profundidade_max_fila, self._em_andamento - self.num_threads)
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "executor": self.nome,
+                "executando": self._executando,
+                "na_fila": self._em_andamento - self._executando,
+                "profundidade_max_fila": self._profundidade_max_fila,
+                "concluidas": self._concluidas,
+                "rejeitadas": self._rejeitadas,
+                "prazos_excedidos": self._prazos_excedidos,
+            }
+
+    def encerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,63 +1,239 @@
 # groq_client.py
-from groq import Groq, APIConnectionError, APIStatusError
-from config import GROQ_API_KEY, GROQ_MODEL # GROQ_MODEL aqui é o que você configurou, ex: "llama3-8b-8192"
+from config import GROQ_API_KEY, GROQ_BASE_URL, GROQ_MODEL, GROQ_TEMPERATURA # GROQ_MODEL aqui é o que você configurou, ex: "llama3-8b-8192"
+from cliente_llm import CircuitoAbertoErro, ClienteLLMAsync, DisjuntorCircuito, ErroLLM
+from metricas import HISTOGRAMA_ETAPAS, Cronometro, registrar_cache
+from rastreamento import rastreado, rastros_ativos, registrar_span
 import os
+import threading
+import time
 
-# Instancia o cliente Groq uma vez quando o módulo é importado.
+# O cliente Groq (e o SDK `groq`) só é criado na primeira chamada a obter_cliente_groq():
+# importar este módulo não abre conexões nem atrasa a inicialização do bot.
 # É importante que GROQ_API_KEY seja carregado corretamente do seu .env via config.py
-if not GROQ_API_KEY:
-    print("ERRO CRÍTICO (Groq Client): GROQ_API_KEY não foi carregada. Verifique seu .env e config.py.")
-    # Você pode querer levantar um erro aqui ou ter um cliente "dummy" que sempre falha.
-    CLIENT_GROQ = None
-else:
+CLIENT_GROQ = None
+_CLIENTE_GROQ_INICIALIZADO = False
+_LOCK_CLIENTE_GROQ = threading.Lock()
+CLIENTE_LLM_ASYNC = None # Caminho assíncrono do bot (query_groq_async / query_groq_stream)
+
+# Cache em disco das respostas (opcional, ANTIGENO_CACHE_LLM=1): perguntas repetidas não geram nova chamada remota.
+CACHE_LLM_ATIVO = os.getenv("ANTIGENO_CACHE_LLM", "0") == "1"
+CACHE_RESPOSTAS_LLM = None
+_LOCK_CACHE_LLM = threading.Lock()
+
+
+def obter_cliente_groq():
+    """Retorna o cliente Groq (criado uma única vez), ou None se não houver API Key ou a criação falhar."""
+    global CLIENT_GROQ, _CLIENTE_GROQ_INICIALIZADO
+    if _CLIENTE_GROQ_INICIALIZADO:
+        return CLIENT_GROQ
+    with _LOCK_CLIENTE_GROQ:
+        if _CLIENTE_GROQ_INICIALIZADO:
+            return CLIENT_GROQ
+        if not GROQ_API_KEY:
+            print("ERRO CRÍTICO (Groq Client): GROQ_API_KEY não foi carregada. Verifique seu .env e config.py.")
+        else:
+            try:
+                from groq import Groq
+                # O SDK acrescenta /openai/v1 ao base_url por conta própria
+                base_url_sdk = GROQ_BASE_URL[:-len("/openai/v1")] if GROQ_BASE_URL.endswith("/openai/v1") else GROQ_BASE_URL
+                CLIENT_GROQ = Groq(api_key=GROQ_API_KEY, base_url=base_url_sdk)
+                print("Cliente Groq inicializado com sucesso.")
+            except Exception as e_init_groq:
+                print(f"ERRO CRÍTICO ao inicializar o cliente Groq: {e_init_groq}")
+                CLIENT_GROQ = None
+        _CLIENTE_GROQ_INICIALIZADO = True
+    return CLIENT_GROQ
+
+
+def obter_cache_respostas_llm():
+    """Cache de respostas (SQLite), aberto na primeira consulta; None se desativado."""
+    global CACHE_RESPOSTAS_LLM
+    if not CACHE_LLM_ATIVO:
+        return None
+    if CACHE_RESPOSTAS_LLM is None:
+        with _LOCK_CACHE_LLM:
+            if CACHE_RESPOSTAS_LLM is None:
+                from cache_respostas_llm import CacheRespostasLLM
+                CACHE_RESPOSTAS_LLM = CacheRespostasLLM(
+                    os.getenv("ANTIGENO_CACHE_LLM_CAMINHO", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_llm.sqlite3")),
+                    tamanho_max=int(os.getenv("ANTIGENO_CACHE_LLM_TAMANHO", "5000")),
+                    idade_max_s=float(os.getenv("ANTIGENO_CACHE_LLM_IDADE_MAX_S", str(7 * 24 * 3600))),
+                    temperatura_max=float(os.getenv("ANTIGENO_CACHE_LLM_TEMPERATURA_MAX", "0.7")),
+                )
+                registrar_cache("respostas_llm", CACHE_RESPOSTAS_LLM)
+    return CACHE_RESPOSTAS_LLM
+
+
+class RespostaErroLLM(str):
+    """
+    Mensagem de erro devolvida por query_groq* no lugar da resposta do modelo. Continua
+    sendo texto (quem exibe não muda), mas o tipo marca o erro: o conteúdo não é
+    inspecionado, então uma resposta legítima que comece com "Erro" vai para o cache.
+    """
+
+
+def eh_resposta_de_erro(resposta: str) -> bool:
+    return isinstance(resposta, RespostaErroLLM)
+
+
+def consultar_cache_llm(prompt: str):
+    """Resposta em cache para o prompt (modelo e temperatura atuais), ou None."""
+    cache = obter_cache_respostas_llm()
+    return cache.obter(GROQ_MODEL, GROQ_TEMPERATURA, prompt) if cache is not None else None
+
+
+def guardar_cache_llm(prompt: str, resposta: str):
+    """Guarda a resposta no cache, exceto as RespostaErroLLM (erros de query_groq* nunca são reaproveitados)."""
+    cache = obter_cache_respostas_llm()
+    if cache is not None and not eh_resposta_de_erro(resposta):
+        cache.guardar(GROQ_MODEL, GROQ_TEMPERATURA, prompt, resposta)
+
+
+def obter_cliente_llm_async() -> ClienteLLMAsync:
+    """Cliente assíncrono com pool de conexões, retentativas e disjuntor (ver cliente_llm.py), ou None sem API Key."""
+    global CLIENTE_LLM_ASYNC
+    if CLIENTE_LLM_ASYNC is None and GROQ_API_KEY:
+        CLIENTE_LLM_ASYNC = ClienteLLMAsync(
+            GROQ_BASE_URL, GROQ_API_KEY, GROQ_MODEL,
+            timeout_conexao_s=float(os.getenv("ANTIGENO_LLM_TIMEOUT_CONEXAO_S", "5")),
+            timeout_leitura_s=float(os.getenv("ANTIGENO_LLM_TIMEOUT_LEITURA_S", "60")),
+            max_tentativas=int(os.getenv("ANTIGENO_LLM_MAX_TENTATIVAS", "4")),
+            max_conexoes=int(os.getenv("ANTIGENO_LLM_MAX_CONEXOES", "20")),
+            prazo_total_s=float(os.getenv("ANTIGENO_PRAZO_LLM_S", "60")), # O mesmo prazo do EXECUTOR_LLM do bot
+            disjuntor=DisjuntorCircuito(
+                limiar_falhas=int(os.getenv("ANTIGENO_LLM_LIMIAR_DISJUNTOR", "5")),
+                tempo_abertura_s=float(os.getenv("ANTIGENO_LLM_TEMPO_DISJUNTOR_S", "30")),
+            ),
+        )
+    return CLIENTE_LLM_ASYNC
+
+
+def _mensagem_erro_llm(erro: Exception) -> RespostaErroLLM:
+    if isinstance(erro, CircuitoAbertoErro):
+        return RespostaErroLLM("Erro: API Groq indisponível no momento (circuito aberto). Tente novamente em instantes.")
+    if isinstance(erro, ErroLLM) and erro.status_code is not None:
+        return RespostaErroLLM(f"Erro de Status da API Groq: Status {erro.status_code}")
+    return RespostaErroLLM(f"Erro de Conexão com API Groq: {erro}")
+
+
+@rastreado()
+async def query_groq_async(prompt: str, consultar_cache: bool = True, guardar_cache: bool = True) -> str:
+    """Versão assíncrona de query_groq (mesmo contrato: erros voltam como RespostaErroLLM), sem ocupar threads."""
+    resposta_cache = consultar_cache_llm(prompt) if consultar_cache else None
+    if resposta_cache is not None:
+        return resposta_cache
+    cliente_llm = obter_cliente_llm_async()
+    if cliente_llm is None:
+        return RespostaErroLLM("ERRO: Cliente Groq não inicializado. Verifique a API Key.")
+    try:
+        with Cronometro("llm"):
+            resposta = await cliente_llm.completar(prompt, temperature=GROQ_TEMPERATURA)
+        if guardar_cache:
+            guardar_cache_llm(prompt, resposta)
+        return resposta
+    except ErroLLM as e_llm:
+        print(f"Erro na API Groq (async): {e_llm} | {cliente_llm.estatisticas()}")
+        return _mensagem_erro_llm(e_llm)
+    except Exception as e:
+        print(f"Erro inesperado ao consultar a API Groq (async): {e}")
+        return RespostaErroLLM(f"Erro inesperado na API Groq: {e}")
+
+
+async def query_groq_stream(prompt: str, consultar_cache: bool = True, guardar_cache: bool = True):
+    """
+    Versão em streaming de query_groq: gerador assíncrono que produz os trechos (deltas)
+    da resposta à medida que o modelo os gera. Erros viram um trecho final RespostaErroLLM,
+    como as mensagens de erro retornadas por query_groq. Respostas em cache saem de uma vez.
+    """
+    resposta_cache = consultar_cache_llm(prompt) if consultar_cache else None
+    if resposta_cache is not None:
+        yield resposta_cache
+        return
+    cliente_llm = obter_cliente_llm_async()
+    if cliente_llm is None:
+        yield RespostaErroLLM("ERRO: Cliente Groq não inicializado. Verifique a API Key.")
+        return
+
+    recebeu_texto = False
+    trechos = []
+    rastros = rastros_ativos()
+    inicio = time.perf_counter()
+    primeiro_token_ms = None
     try:
-        CLIENT_GROQ = Groq(api_key=GROQ_API_KEY)
-        print("Cliente Groq inicializado com sucesso.")
-    except Exception as e_init_groq:
-        print(f"ERRO CRÍTICO ao inicializar o cliente Groq: {e_init_groq}")
-        CLIENT_GROQ = None
+        async for delta in cliente_llm.completar_stream(prompt, temperature=GROQ_TEMPERATURA):
+            if not recebeu_texto:
+                HISTOGRAMA_ETAPAS.observar(time.perf_counter() - inicio, "llm_primeiro_token")
+                primeiro_token_ms = round((time.perf_counter() - inicio) * 1000, 2)
+            recebeu_texto = True
+            trechos.append(delta)
+            yield delta
+        HISTOGRAMA_ETAPAS.observar(time.perf_counter() - inicio, "llm")
+        if guardar_cache:
+            guardar_cache_llm(prompt, "".join(trechos).strip())
+    except ErroLLM as e_llm:
+        print(f"Erro na API Groq (streaming): {e_llm} | {cliente_llm.estatisticas()}")
+        yield RespostaErroLLM(f"{chr(10) if recebeu_texto else ''}{_mensagem_erro_llm(e_llm)}")
+    except Exception as e:
+        print(f"Erro inesperado no streaming da API Groq: {e}")
+        yield RespostaErroLLM(f"{chr(10) if recebeu_texto else ''}Erro inesperado na API Groq: {e}")
+    finally:
+        if rastros: # Gerador: o span é registrado no fim, com os trechos já entregues
+            registrar_span(rastros, "query_groq_stream", inicio, time.perf_counter(),
+                           {"primeiro_token_ms": primeiro_token_ms, "trechos": len(trechos)})
 
 
-def query_groq(prompt: str) -> str:
+@rastreado()
+def query_groq(prompt: str, consultar_cache: bool = True, guardar_cache: bool = True) -> str:
     """
-    Envia um prompt para a API da Groq e retorna a resposta do modelo.
+    Envia um prompt para a API da Groq e retorna a resposta do modelo. Em caso de erro,
+    retorna a mensagem como RespostaErroLLM (ver eh_resposta_de_erro).
+    Com ANTIGENO_CACHE_LLM=1, prompts repetidos são respondidos pelo cache em disco
+    (`consultar_cache` / `guardar_cache` controlam a leitura e a escrita separadamente).
     """
-    if CLIENT_GROQ is None:
-        return "ERRO: Cliente Groq não inicializado. Verifique a API Key."
+    resposta_cache = consultar_cache_llm(prompt) if consultar_cache else None
+    if resposta_cache is not None:
+        return resposta_cache
+    cliente_groq = obter_cliente_groq()
+    if cliente_groq is None:
+        return RespostaErroLLM("ERRO: Cliente Groq não inicializado. Verifique a API Key.")
 
+    from groq import APIConnectionError, APIStatusError
     try:
         # print(f"DEBUG (Groq): Enviando prompt: '{prompt[:50]}...' para o modelo: {GROQ_MODEL}")
-        chat_completion = CLIENT_GROQ.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            model=GROQ_MODEL, # Usa o modelo definido em config.py
-            temperature=0.7,
-            # max_tokens=1024, # Opcional: defina um limite de tokens
-            # top_p=1, # Opcional
-            # stop=None, # Opcional: sequências para parar a geração
-        )
+        with Cronometro("llm"):
+            chat_completion = cliente_groq.chat.completions.create(
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                model=GROQ_MODEL, # Usa o modelo definido em config.py
+                temperature=GROQ_TEMPERATURA,
+                # max_tokens=1024, # Opcional: defina um limite de tokens
+                # top_p=1, # Opcional
+                # stop=None, # Opcional: sequências para parar a geração
+            )
         resposta = chat_completion.choices[0].message.content.strip()
+        if guardar_cache:
+            guardar_cache_llm(prompt, resposta)
         # print(f"DEBUG (Groq): Resposta recebida: '{resposta[:50]}...'")
         return resposta
     
     except APIConnectionError as e_conn:
         print(f"Erro de Conexão com API Groq: {e_conn}")
-        return f"Erro de Conexão com API Groq: {e_conn}"
+        return RespostaErroLLM(f"Erro de Conexão com API Groq: {e_conn}")
     except APIStatusError as e_stat:
         print(f"Erro de Status da API Groq: Status {e_stat.status_code}, Response: {e_stat.response}")
-        return f"Erro de Status da API Groq: Status {e_stat.status_code}"
+        return RespostaErroLLM(f"Erro de Status da API Groq: Status {e_stat.status_code}")
     except Exception as e:
         print(f"Erro inesperado ao consultar a API Groq: {e}")
-        return f"Erro inesperado na API Groq: {e}"
+        return RespostaErroLLM(f"Erro inesperado na API Groq: {e}")
 
 # Teste simples (opcional)
 if __name__ == '__main__':
     print("Testando groq_client.py...")
-    if CLIENT_GROQ:
+    if obter_cliente_groq():
         prompt_teste = "Qual a capital do Brasil e por que ela foi planejada?"
         print(f"Enviando prompt de teste para Groq: '{prompt_teste}'")
         resposta_teste = query_groq(prompt_teste)
@@ -0,0 +1,263 @@
+# metricas.py
+"""
+Métricas do Antígeno Digital no formato texto do Prometheus, sem dependências extras.
+
+- Histograma: latência por etapa (fila, tokenização, forward, pós-processamento,
+  LLM...), com buckets fixos. `observar` é um bisect e dois incrementos sob um
+  lock: custo de microssegundos, desprezível perto de um forward pass.
+- Contador: veredictos por classificação e motivo, etc.
+- Coletas: valores lidos só na hora do scrape (profundidade das filas, contadores
+  dos caches e dos executores), a partir dos `estatisticas()` que já existem.
+  Não custam nada no caminho quente.
+
+Exposição: GET /metrics no servico_http.py, ou iniciar_servidor_metricas() no bot e
+no serviço do classificador (ANTIGENO_METRICAS_PORTA / --porta-metricas).
+Com ANTIGENO_BACKEND_EXECUCAO=processos, as etapas internas do modelo são medidas
+nos workers e não aparecem aqui; o tempo total de cada análise aparece.
+"""
+import asyncio
+import bisect
+import threading
+import time
+
+from rastreamento import rastros_ativos, registrar_span
+
+LIMITES_PADRAO_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_rotulos(nomes: tuple, valores: tuple, extra: str = "") -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _formatar_numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valores_rotulos, quantidade: float = 1.0):
+        with self._lock:
+            self._valores[valores_rotulos] = self._valores.get(valores_rotulos, 0.0) + quantidade
+
+    def texto(self) -> list:
+        with self._lock:
+            valores = sorted(self._valores.items())
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        linhas += [f"{self.nome}{_formatar_rotulos(self.rotulos, rotulos)} {_formatar_numero(valor)}" for rotulos, valor in valores]
+        return linhas
+
+
+class Histograma:
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = (), limites: tuple = LIMITES_PADRAO_S):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.limites = tuple(sorted(limites))
+        self._series = {} # rótulos -> [contagens por bucket (+Inf no fim), soma, quantidade]
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *valores_rotulos):
+        indice = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(valores_rotulos)
+            if serie is None:
+                serie = self._series[valores_rotulos] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def texto(self) -> list:
+        with self._lock:
+            series = sorted((rotulos, ([*contagens], soma, quantidade)) for rotulos, (contagens, soma, quantidade) in self._series.items())
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        for rotulos, (contagens, soma, quantidade) in series:
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float("inf"),), contagens):
+                acumulado += contagem
+                rotulo_limite = 'le="' + _formatar_numero(limite) + '"'
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, rotulos, rotulo_limite)} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(self.rotulos, rotulos)} {_formatar_numero(soma)}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(self.rotulos, rotulos)} {quantidade}")
+        return linhas
+
+
+class MetricaColetada:
+    """Valores lidos na hora do scrape: `funcoes` é um dict (valores dos rótulos) -> função sem argumentos."""
+
+    def __init__(self, nome: str, ajuda: str, tipo: str = "gauge", rotulos: tuple = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.tipo = tipo
+        self.rotulos = tuple(rotulos)
+        self._funcoes = {}
+
+    def registrar(self, funcao, *valores_rotulos):
+        self._funcoes[valores_rotulos] = funcao
+
+    def texto(self) -> list:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        for rotulos, funcao in sorted(self._funcoes.items()):
+            try:
+                valor = funcao()
+            except Exception: # Uma coleta com problema não derruba o scrape inteiro
+                continue
+            if valor is not None:
+                linhas.append(f"{self.nome}{_formatar_rotulos(self.rotulos, rotulos)} {_formatar_numero(valor)}")
+        return linhas
+
+
+class RegistroMetricas:
+
+    def __init__(self):
+        self._metricas = []
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def texto_prometheus(self) -> str:
+        linhas = []
+        for metrica in self._metricas:
+            linhas.extend(metrica.texto())
+        return "\n".join(linhas) + "\n"
+
+
+REGISTRO_METRICAS = RegistroMetricas()
+
+# --- Métricas do Antígeno ---
+HISTOGRAMA_ETAPAS = REGISTRO_METRICAS.registrar(Histograma(
+    "antigeno_etapa_segundos",
+    "Duração de cada etapa: regras, cache, cascata, tokenizacao, forward, pos_processamento (por lote), analise (obter_analise_antigeno), llm, llm_primeiro_token.",
+    ("etapa",),
+))
+HISTOGRAMA_ESPERA_FILA = REGISTRO_METRICAS.registrar(Histograma(
+    "antigeno_espera_fila_segundos", "Tempo de espera em fila antes de começar a execução.", ("fila",),
+))
+CONTADOR_VEREDICTOS = REGISTRO_METRICAS.registrar(Contador(
+    "antigeno_veredictos_total", "Veredictos do Antígeno por classificação final e motivo da detecção.", ("classificacao", "motivo"),
+))
+PROFUNDIDADE_FILAS = REGISTRO_METRICAS.registrar(MetricaColetada(
+    "antigeno_fila_profundidade", "Requisições aguardando em cada fila.", "gauge", ("fila",),
+))
+EM_EXECUCAO = REGISTRO_METRICAS.registrar(MetricaColetada(
+    "antigeno_em_execucao", "Requisições em execução em cada executor/agendador.", "gauge", ("fila",),
+))
+REJEITADAS = REGISTRO_METRICAS.registrar(MetricaColetada(
+    "antigeno_rejeitadas_total", "Requisições recusadas por fila cheia, prazo excedido ou controle de admissão.", "counter", ("fila", "motivo"),
+))
+CACHE_ACERTOS = REGISTRO_METRICAS.registrar(MetricaColetada(
+    "antigeno_cache_acertos_total", "Acertos de cada cache.", "counter", ("cache",),
+))
+CACHE_FALHAS = REGISTRO_METRICAS.registrar(MetricaColetada(
+    "antigeno_cache_falhas_total", "Falhas (ausente/expirado) de cada cache.", "counter", ("cache",),
+))
+CONTADOR_TROCAS_MODELO = REGISTRO_METRICAS.registrar(Contador(
+    "antigeno_trocas_modelo_total", "Trocas de versão do modelo (classifier/registro_modelos.py) por operação e resultado.", ("operacao", "resultado"),
+))
+
+
+def categoria_motivo(motivo_deteccao: str) -> str:
+    """'IA_MODELO_FINETUNADO (Label IA: ...)' -> 'IA_MODELO_FINETUNADO': só a origem, sem números (cardinalidade baixa)."""
+    return (motivo_deteccao or "DESCONHECIDO").split(" ", 1)[0].split(":", 1)[0]
+
+
+def registrar_veredicto(analise: dict):
+    CONTADOR_VEREDICTOS.inc(analise.get("classificacao_final"), categoria_motivo(analise.get("motivo_deteccao")))
+
+
+def registrar_cache(nome: str, cache):
+    """Expõe acertos/falhas de um cache com estatisticas() (CacheVeredictos, CacheRespostasLLM)."""
+    CACHE_ACERTOS.registrar(lambda: cache.estatisticas()["acertos"], nome)
+    CACHE_FALHAS.registrar(lambda: cache.estatisticas()["falhas"], nome)
+
+
+def registrar_executor(executor):
+    """Expõe fila, execução e recusas de um ExecutorLimitado."""
+    PROFUNDIDADE_FILAS.registrar(lambda: executor.estatisticas()["na_fila"], f"executor_{executor.nome}")
+    EM_EXECUCAO.registrar(lambda: executor.estatisticas()["executando"], f"executor_{executor.nome}")
+    REJEITADAS.registrar(lambda: executor.estatisticas()["rejeitadas"], f"executor_{executor.nome}", "ocupado")
+    REJEITADAS.registrar(lambda: executor.estatisticas()["prazos_excedidos"], f"executor_{executor.nome}", "prazo")
+
+
+def registrar_agendador(nome: str, agendador):
+    PROFUNDIDADE_FILAS.registrar(lambda: agendador.estatisticas()["aguardando"], nome)
+    EM_EXECUCAO.registrar(lambda: agendador.estatisticas()["em_execucao"], nome)
+    REJEITADAS.registrar(lambda: agendador.estatisticas()["rejeitadas"], nome, "pendentes_por_usuario")
+
+
+def registrar_controle_admissao(nome: str, controle):
+    REJEITADAS.registrar(lambda: controle.descartadas, nome, "slo")
+
+
+def texto_prometheus() -> str:
+    return REGISTRO_METRICAS.texto_prometheus()
+
+
+async def iniciar_servidor_metricas(host: str, porta: int):
+    """Servidor mínimo que responde GET /metrics (para o bot e o serviço do classificador, que não têm HTTP)."""
+
+    async def atender(leitor, escritor):
+        try:
+            linha = await asyncio.wait_for(leitor.readline(), timeout=10.0)
+            while (await leitor.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            partes = linha.decode("latin-1").split()
+            if len(partes) >= 2 and partes[0] == "GET" and partes[1].split("?", 1)[0] == "/metrics":
+                status, corpo = "200 OK", texto_prometheus().encode("utf-8")
+            else:
+                status, corpo = "404 Not Found", b"Use GET /metrics\n"
+            escritor.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                           f"Content-Length: {len(corpo)}\r\nConnection: close\r\n\r\n".encode("latin-1") + corpo)
+            await escritor.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            escritor.close()
+
+    servidor = await asyncio.start_server(atender, host=host, port=porta)
+    print(f"Métricas Prometheus em http://{host}:{porta}/metrics")
+    return servidor
+
+
+class Cronometro:
+    """
+    Mede uma etapa: `with Cronometro("forward", tamanho_lote=8):` observa a duração em
+    HISTOGRAMA_ETAPAS e, se a requisição estiver sendo rastreada, registra também um span
+    com os args (ver rastreamento.py). `anotar()` acrescenta args dentro do bloco.
+    """
+    __slots__ = ("etapa", "args", "inicio", "rastros")
+
+    def __init__(self, etapa: str, **args):
+        self.etapa = etapa
+        self.args = args
+
+    def anotar(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.rastros = rastros_ativos()
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        fim = time.perf_counter()
+        HISTOGRAMA_ETAPAS.observar(fim - self.inicio, self.etapa)
+        if self.rastros:
+            registrar_span(self.rastros, self.etapa, self.inicio, fim, self.args)
@@ -0,0 +1,260 @@
+# rastreamento.py
+"""
+Rastreamento amostrado de requisições individuais, exportado como Chrome trace-event
+JSON (abra em https://ui.perfetto.dev ou chrome://tracing).
+
+As métricas agregadas (metricas.py) dizem que o p99 subiu; um rastro diz por que UM
+prompt levou 900 ms: espera em cada fila, tamanho do micro-lote em que ele caiu,
+tokens, forward pass, chamada ao LLM.
+
+- ANTIGENO_TRACE_AMOSTRAGEM: fração das requisições rastreadas (0 = desativado, padrão;
+  1 = todas). A decisão é tomada uma vez, no span raiz (on_message no bot, /analyze no
+  serviço HTTP, ou a primeira função rastreada chamada fora deles) e vale para todos os
+  spans filhos, inclusive os executados em outras threads (executores, micro-lote).
+- ANTIGENO_TRACE_ARQUIVO: se definido, cada rastro concluído é acrescentado a esse
+  arquivo no formato JSON Array do Chrome (o "]" final é opcional nesse formato). Ao
+  passar de ANTIGENO_TRACE_ARQUIVO_MAX_MB, o arquivo vira <arquivo>.1 e outro começa.
+  A gravação é feita por uma thread em segundo plano, a partir de uma fila limitada
+  (ANTIGENO_TRACE_FILA_MAX rastros): quem conclui o rastro (às vezes o event loop)
+  não faz E/S; com a fila cheia, o rastro só fica em memória e é contado como descartado.
+- Os últimos ANTIGENO_TRACE_RECENTES rastros ficam em memória: trace_chrome_recente()
+  (GET /trace no servico_http.py).
+
+Cada rastro aparece como uma "thread" própria no Perfetto, com os spans aninhados.
+Sem rastro ativo, `rastrear` devolve um objeto nulo compartilhado: o custo no caminho
+quente é a leitura de uma ContextVar.
+"""
+import atexit
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+AMOSTRAGEM = float(os.getenv("ANTIGENO_TRACE_AMOSTRAGEM", "0"))
+ARQUIVO_TRACE = os.getenv("ANTIGENO_TRACE_ARQUIVO", "")
+ARQUIVO_TRACE_MAX_BYTES = int(float(os.getenv("ANTIGENO_TRACE_ARQUIVO_MAX_MB", "50")) * 1024 * 1024)
+RASTROS_RECENTES = deque(maxlen=int(os.getenv("ANTIGENO_TRACE_RECENTES", "200")))
+
+# None = ainda não decidido (nenhum span raiz); () = raiz não amostrada; (Rastro, ...) = amostrada.
+# Uma tupla porque um micro-lote executa em nome de vários rastros ao mesmo tempo.
+_RASTROS = contextvars.ContextVar("antigeno_rastros", default=None)
+_IDS = itertools.count(1)
+_ORIGEM_S = time.time() - time.perf_counter() # perf_counter -> época, para juntar rastros de processos diferentes
+_FILA_ARQUIVO = queue.Queue(maxsize=max(int(os.getenv("ANTIGENO_TRACE_FILA_MAX", "1000")), 1))
+_THREAD_ARQUIVO = None
+_LOCK_ARQUIVO = threading.Lock() # Só para criar a thread de gravação
+RASTROS_DESCARTADOS = 0
+
+
+class Rastro:
+    """Spans de uma requisição amostrada: (nome, início, fim, args), com início/fim em perf_counter."""
+
+    def __init__(self, nome: str):
+        self.id = next(_IDS)
+        self.nome = nome
+        self.spans = [] # list.append é atômico: threads diferentes registram sem lock
+
+    def duracoes_ms(self, desde: float = 0.0) -> dict:
+        """Tempo total por nome de span (ms), só dos spans que começaram a partir de `desde`."""
+        duracoes = {}
+        for nome, inicio, fim, _ in list(self.spans):
+            if inicio >= desde:
+                duracoes[nome] = duracoes.get(nome, 0.0) + (fim - inicio) * 1000
+        return {nome: round(ms, 2) for nome, ms in duracoes.items()}
+
+    def eventos_chrome(self) -> list:
+        pid = os.getpid()
+        eventos = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": self.id, "args": {"name": f"{self.nome} #{self.id}"}}]
+        # Pais antes dos filhos: o Perfetto aninha spans "X" da mesma tid pela ordem de início
+        for nome, inicio, fim, args in sorted(self.spans, key=lambda span: (span[1], span[1] - span[2])):
+            eventos.append({
+                "name": nome, "ph": "X", "pid": pid, "tid": self.id,
+                "ts": round((_ORIGEM_S + inicio) * 1e6, 1), "dur": round((fim - inicio) * 1e6, 1), "args": args,
+            })
+        return eventos
+
+
+def rastros_ativos() -> tuple:
+    """Rastros da requisição atual (tupla vazia ou None se ela não está sendo rastreada)."""
+    return _RASTROS.get()
+
+
+def registrar_span(rastros, nome: str, inicio: float, fim: float, args: dict = None):
+    """Registra um span já medido (perf_counter) em cada um dos `rastros`."""
+    args = dict(args or {}, thread=threading.current_thread().name)
+    for rastro in rastros:
+        rastro.spans.append((nome, inicio, fim, args))
+
+
+def registrar_espera(nome: str, espera_s: float, rastros=None, **args):
+    """Registra uma espera em fila que termina agora (filas medidas com time.monotonic)."""
+    rastros = _RASTROS.get() if rastros is None else rastros
+    if rastros:
+        fim = time.perf_counter()
+        registrar_span(rastros, nome, fim - max(espera_s, 0.0), fim, args)
+
+
+def executar_com_rastros(rastros, funcao, *args):
+    """Executa `funcao(*args)` com `rastros` ativos (ex: a thread do micro-lote, em nome dos rastros do lote)."""
+    token = _RASTROS.set(tuple(rastros))
+    try:
+        return funcao(*args)
+    finally:
+        _RASTROS.reset(token)
+
+
+class Span:
+    """
+    `with rastrear("nome", chave=valor) as span:` mede o bloco; `span.anotar(...)` acrescenta
+    args (ex: tokens) antes do fim. Sem rastro ativo, é o raiz: sorteia a amostragem.
+    """
+    __slots__ = ("nome", "args", "inicio", "rastros", "raiz", "_token")
+
+    def __init__(self, nome: str, args: dict):
+        self.nome = nome
+        self.args = args
+        self.raiz = None
+        self._token = None
+
+    def anotar(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.rastros = _RASTROS.get()
+        if self.rastros is None: # Span raiz: decide a amostragem da requisição inteira
+            if random.random() < AMOSTRAGEM:
+                self.raiz = Rastro(self.nome)
+                self.rastros = (self.raiz,)
+            else:
+                self.rastros = ()
+            self._token = _RASTROS.set(self.rastros)
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo_excecao, *_):
+        fim = time.perf_counter()
+        if self.rastros:
+            if tipo_excecao is not None:
+                self.args["erro"] = tipo_excecao.__name__
+            registrar_span(self.rastros, self.nome, self.inicio, fim, self.args)
+        if self._token is not None:
+            _RASTROS.reset(self._token)
+        if self.raiz is not None:
+            _concluir_rastro(self.raiz)
+
+
+class _SpanNulo:
+    """Devolvido por `rastrear` com o rastreamento desativado: não mede nada."""
+    __slots__ = ()
+
+    def anotar(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+_SPAN_NULO = _SpanNulo()
+
+
+def rastrear(nome: str, **args):
+    if AMOSTRAGEM <= 0 and not _RASTROS.get():
+        return _SPAN_NULO
+    return Span(nome, args)
+
+
+def rastreado(nome: str = None):
+    """Decorador: executa a função (síncrona ou async) dentro de `rastrear(nome)`."""
+    def decorador(funcao):
+        nome_span = nome or funcao.__name__
+        if inspect.iscoroutinefunction(funcao):
+            @functools.wraps(funcao)
+            async def envoltorio_async(*args, **kwargs):
+                with rastrear(nome_span):
+                    return await funcao(*args, **kwargs)
+            return envoltorio_async
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            with rastrear(nome_span):
+                return funcao(*args, **kwargs)
+        return envoltorio
+    return decorador
+
+
+def _concluir_rastro(rastro: Rastro):
+    global RASTROS_DESCARTADOS
+    eventos = rastro.eventos_chrome()
+    RASTROS_RECENTES.append(eventos)
+    if not ARQUIVO_TRACE:
+        return
+    _iniciar_gravacao()
+    try:
+        _FILA_ARQUIVO.put_nowait(eventos)
+    except queue.Full:
+        RASTROS_DESCARTADOS += 1 # Contador aproximado (sem lock): só para métricas
+
+
+def _iniciar_gravacao():
+    global _THREAD_ARQUIVO
+    if _THREAD_ARQUIVO is None:
+        with _LOCK_ARQUIVO:
+            if _THREAD_ARQUIVO is None:
+                _THREAD_ARQUIVO = threading.Thread(target=_loop_gravacao, name="antigeno-rastros", daemon=True)
+                _THREAD_ARQUIVO.start()
+                atexit.register(_encerrar_gravacao)
+                from metricas import REJEITADAS, PROFUNDIDADE_FILAS
+                PROFUNDIDADE_FILAS.registrar(_FILA_ARQUIVO.qsize, "rastros")
+                REJEITADAS.registrar(lambda: RASTROS_DESCARTADOS, "rastros", "fila_cheia")
+
+
+def _loop_gravacao():
+    while True:
+        lote = [_FILA_ARQUIVO.get()]
+        while len(lote) < 100:
+            try:
+                lote.append(_FILA_ARQUIVO.get_nowait())
+            except queue.Empty:
+                break
+        encerrar = None in lote
+        rastros = [eventos for eventos in lote if eventos is not None]
+        if rastros:
+            _gravar_rastros(rastros)
+        if encerrar:
+            return
+
+
+def _gravar_rastros(rastros: list):
+    linhas = "".join(json.dumps(evento, ensure_ascii=False) + ",\n" for eventos in rastros for evento in eventos)
+    try:
+        if os.path.exists(ARQUIVO_TRACE) and os.path.getsize(ARQUIVO_TRACE) >= ARQUIVO_TRACE_MAX_BYTES:
+            os.replace(ARQUIVO_TRACE, ARQUIVO_TRACE + ".1")
+        novo = not os.path.exists(ARQUIVO_TRACE)
+        with open(ARQUIVO_TRACE, "a", encoding="utf-8") as arquivo:
+            arquivo.write(("[\n" if novo else "") + linhas)
+    except OSError as e:
+        print(f"AVISO: não foi possível gravar o rastro em '{ARQUIVO_TRACE}': {e}")
+
+
+def _encerrar_gravacao(timeout_s: float = 5.0):
+    """Grava os rastros que ainda estão na fila (atexit)."""
+    try:
+        _FILA_ARQUIVO.put(None, timeout=timeout_s)
+    except queue.Full:
+        return
+    _THREAD_ARQUIVO.join(timeout_s)
+
+
+def trace_chrome_recente() -> dict:
+    """Os rastros recentes em memória, como um documento Chrome trace-event completo."""
+    return {"traceEvents": [evento for eventos in list(RASTROS_RECENTES) for evento in eventos], "displayTimeUnit": "ms"}
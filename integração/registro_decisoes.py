@@ -0,0 +1,252 @@
+# registro_decisoes.py
+"""
+Registro das decisões do Antígeno em arquivos (JSONL ou Parquet), para auditoria e
+para re-treinar o classificador com o tráfego real.
+
+`registrar_decisao()` só monta o registro e o põe numa fila limitada: não faz E/S e
+nunca bloqueia on_message. Uma thread em segundo plano junta os registros em lotes e
+os grava em arquivos rotativos. Com a fila cheia (disco lento ou rajada), o registro
+novo é descartado e contado em `descartados`: a memória fica limitada a
+ANTIGENO_DECISOES_FILA_MAX registros (e o texto do prompt, se incluído, a
+ANTIGENO_DECISOES_PROMPT_MAX_CARACTERES).
+
+Configuração:
+    ANTIGENO_DECISOES_DIR=decisoes          ativa o registro (vazio = desativado, padrão)
+    ANTIGENO_DECISOES_FORMATO=jsonl         ou "parquet" (requer pyarrow; sem ele, volta a jsonl)
+    ANTIGENO_DECISOES_INCLUIR_PROMPT=1      grava o texto do prompt (padrão: só o hash)
+    ANTIGENO_DECISOES_ARQUIVO_MAX_MB=64     tamanho de cada arquivo antes da rotação
+    ANTIGENO_DECISOES_MAX_ARQUIVOS=50       arquivos mantidos (os mais antigos são apagados)
+
+Cada registro: instante, hash_prompt (SHA-256 do prompt normalizado, o mesmo do cache de
+respostas), prompt (opcional), classificacao_final, prob_injecao, motivo_deteccao,
+label_ia, score_ia, versao_modelo, latencia_ms, origem (bot, http, cli).
+"""
+import atexit
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+from cache_veredictos import normalizar_prompt
+
+DIRETORIO_DECISOES = os.getenv("ANTIGENO_DECISOES_DIR", "")
+REGISTRO_DECISOES = None
+_LOCK_REGISTRO = threading.Lock()
+
+
+class RegistroDecisoes:
+
+    def __init__(self, diretorio: str, formato: str = "jsonl", incluir_prompt: bool = False,
+                 tamanho_max_fila: int = 10000, tamanho_lote: int = 500, intervalo_flush_s: float = 2.0,
+                 max_bytes_arquivo: int = 64 * 1024 * 1024, max_arquivos: int = 50, prompt_max_caracteres: int = 4000):
+        self.diretorio = diretorio
+        self.formato = formato.lower()
+        if self.formato == "parquet":
+            try:
+                import pyarrow # noqa: F401
+            except ImportError:
+                print("AVISO (Registro de decisões): pyarrow não está instalado. Gravando em JSONL.")
+                self.formato = "jsonl"
+        self.incluir_prompt = incluir_prompt
+        self.tamanho_lote = max(int(tamanho_lote), 1)
+        self.intervalo_flush_s = intervalo_flush_s
+        self.max_bytes_arquivo = max_bytes_arquivo
+        self.max_arquivos = max(int(max_arquivos), 1)
+        self.prompt_max_caracteres = prompt_max_caracteres
+        self._fila = queue.Queue(maxsize=max(int(tamanho_max_fila), 1))
+        self._arquivo = None     # JSONL: arquivo aberto; Parquet: ParquetWriter
+        self._caminho_atual = None
+        self._sequencia = 0
+        self._lock = threading.Lock() # Só para os contadores
+        self.registrados = 0
+        self.gravados = 0
+        self.descartados = 0
+        self.erros_escrita = 0
+        self.arquivos_rotacionados = 0
+        os.makedirs(diretorio, exist_ok=True)
+        self._thread = threading.Thread(target=self._loop, name="antigeno-registro-decisoes", daemon=True)
+        self._thread.start()
+
+    def registrar(self, prompt: str, analise: dict, latencia_ms: float = None, origem: str = ""):
+        """Enfileira a decisão (sem E/S). Retorna False se ela foi descartada por falta de espaço na fila."""
+        from classifier.model import identidade_modelo_em_uso
+        detalhes_ia = analise.get("detalhes_ia") or {}
+        registro = {
+            "instante": time.time(),
+            "hash_prompt": hashlib.sha256(normalizar_prompt(prompt).encode("utf-8")).hexdigest(),
+            "prompt": prompt[:self.prompt_max_caracteres] if self.incluir_prompt else None,
+            "classificacao_final": analise.get("classificacao_final"),
+            "prob_injecao": analise.get("prob_injecao"),
+            "motivo_deteccao": analise.get("motivo_deteccao"),
+            "label_ia": detalhes_ia.get("label_ia"),
+            "score_ia": detalhes_ia.get("score_ia"),
+            "versao_modelo": identidade_modelo_em_uso(), # Lida já: depois de uma troca de modelo, o lote seria gravado com a versão nova
+            "latencia_ms": round(latencia_ms, 2) if latencia_ms is not None else None,
+            "origem": origem,
+        }
+        try:
+            self._fila.put_nowait(registro)
+        except queue.Full:
+            with self._lock:
+                self.descartados += 1
+                descartados = self.descartados
+            if descartados % 1000 == 1: # Avisa sem inundar o log
+                print(f"AVISO (Registro de decisões): fila cheia, {descartados} decisões descartadas até agora.")
+            return False
+        with self._lock:
+            self.registrados += 1
+        return True
+
+    # --- Thread de gravação ---
+    def _loop(self):
+        while True:
+            lote = self._coletar_lote()
+            if lote is None:
+                return
+            if lote:
+                self._gravar(lote)
+
+    def _coletar_lote(self):
+        """Espera até `tamanho_lote` registros ou `intervalo_flush_s`. None = encerrar (depois de gravar o resto)."""
+        lote = []
+        prazo = time.monotonic() + self.intervalo_flush_s
+        while len(lote) < self.tamanho_lote:
+            restante = prazo - time.monotonic()
+            try:
+                registro = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if registro is None:
+                if lote:
+                    self._gravar(lote)
+                self._fechar_arquivo()
+                return None
+            lote.append(registro)
+        return lote
+
+    def _gravar(self, lote: list):
+        from classifier.model import obter_identidade_modelo
+        try:
+            if any(registro["versao_modelo"] is None for registro in lote):
+                versao_modelo = obter_identidade_modelo() # Modo cliente sem identidade conhecida: consulta o serviço aqui, fora da requisição
+                for registro in lote:
+                    if registro["versao_modelo"] is None:
+                        registro["versao_modelo"] = versao_modelo
+            if self._arquivo is None or self._tamanho_atual() >= self.max_bytes_arquivo:
+                self._rotacionar()
+            if self.formato == "parquet":
+                import pyarrow as pa
+                self._arquivo.write_table(pa.Table.from_pylist(lote, schema=self._arquivo.schema))
+            else:
+                self._arquivo.write("".join(json.dumps(registro, ensure_ascii=False) + "\n" for registro in lote))
+                self._arquivo.flush()
+            self.gravados += len(lote)
+        except Exception as e: # Disco cheio, permissão etc.: perde o lote, mas não derruba a thread
+            with self._lock:
+                self.erros_escrita += 1
+                self.descartados += len(lote)
+            print(f"ERRO (Registro de decisões): falha ao gravar {len(lote)} decisões em '{self._caminho_atual}': {e}")
+            self._fechar_arquivo()
+
+    def _tamanho_atual(self) -> int:
+        try:
+            return os.path.getsize(self._caminho_atual)
+        except OSError:
+            return 0
+
+    def _rotacionar(self):
+        if self._arquivo is not None:
+            self.arquivos_rotacionados += 1
+        self._fechar_arquivo()
+        self._sequencia += 1
+        extensao = "parquet" if self.formato == "parquet" else "jsonl"
+        nome = f"decisoes-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._sequencia:04d}.{extensao}"
+        self._caminho_atual = os.path.join(self.diretorio, nome)
+        if self.formato == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            esquema = pa.schema([
+                ("instante", pa.float64()), ("hash_prompt", pa.string()), ("prompt", pa.string()),
+                ("classificacao_final", pa.string()), ("prob_injecao", pa.float64()), ("motivo_deteccao", pa.string()),
+                ("label_ia", pa.string()), ("score_ia", pa.float64()), ("versao_modelo", pa.string()),
+                ("latencia_ms", pa.float64()), ("origem", pa.string()),
+            ])
+            self._arquivo = pq.ParquetWriter(self._caminho_atual, esquema) # Cada lote vira um row group
+        else:
+            self._arquivo = open(self._caminho_atual, "a", encoding="utf-8")
+        self._apagar_antigos(extensao)
+
+    def _apagar_antigos(self, extensao: str):
+        arquivos = sorted(
+            (os.path.join(self.diretorio, nome) for nome in os.listdir(self.diretorio) if nome.startswith("decisoes-") and nome.endswith(extensao)),
+            key=os.path.getmtime,
+        )
+        for caminho in arquivos[:-self.max_arquivos]:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+    def _fechar_arquivo(self):
+        if self._arquivo is not None:
+            try:
+                self._arquivo.close() # Parquet: só fica legível depois de fechado (rodapé)
+            except Exception as e:
+                print(f"AVISO (Registro de decisões): erro ao fechar '{self._caminho_atual}': {e}")
+            self._arquivo = None
+
+    def encerrar(self, timeout_s: float = 10.0):
+        """Grava o que está na fila e fecha o arquivo atual."""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._fila.put(None, timeout=timeout_s)
+        except queue.Full:
+            return
+        self._thread.join(timeout_s)
+
+    def estatisticas(self) -> dict:
+        return {
+            "formato": self.formato,
+            "na_fila": self._fila.qsize(),
+            "registrados": self.registrados,
+            "gravados": self.gravados,
+            "descartados": self.descartados,
+            "erros_escrita": self.erros_escrita,
+            "arquivos_rotacionados": self.arquivos_rotacionados,
+            "arquivo_atual": self._caminho_atual,
+        }
+
+
+def obter_registro_decisoes():
+    """Registro de decisões (criado na primeira decisão), ou None se ANTIGENO_DECISOES_DIR não estiver definido."""
+    global REGISTRO_DECISOES
+    if not DIRETORIO_DECISOES:
+        return None
+    if REGISTRO_DECISOES is None:
+        with _LOCK_REGISTRO:
+            if REGISTRO_DECISOES is None:
+                REGISTRO_DECISOES = RegistroDecisoes(
+                    DIRETORIO_DECISOES,
+                    formato=os.getenv("ANTIGENO_DECISOES_FORMATO", "jsonl"),
+                    incluir_prompt=os.getenv("ANTIGENO_DECISOES_INCLUIR_PROMPT", "0") == "1",
+                    tamanho_max_fila=int(os.getenv("ANTIGENO_DECISOES_FILA_MAX", "10000")),
+                    max_bytes_arquivo=int(float(os.getenv("ANTIGENO_DECISOES_ARQUIVO_MAX_MB", "64")) * 1024 * 1024),
+                    max_arquivos=int(os.getenv("ANTIGENO_DECISOES_MAX_ARQUIVOS", "50")),
+                    prompt_max_caracteres=int(os.getenv("ANTIGENO_DECISOES_PROMPT_MAX_CARACTERES", "4000")),
+                )
+                atexit.register(REGISTRO_DECISOES.encerrar)
+                from metricas import REJEITADAS, PROFUNDIDADE_FILAS
+                PROFUNDIDADE_FILAS.registrar(REGISTRO_DECISOES._fila.qsize, "registro_decisoes")
+                REJEITADAS.registrar(lambda: REGISTRO_DECISOES.descartados, "registro_decisoes", "fila_cheia")
+                print(f"Registro de decisões ativo em '{DIRETORIO_DECISOES}' ({REGISTRO_DECISOES.formato}).")
+    return REGISTRO_DECISOES
+
+
+def registrar_decisao(prompt: str, analise: dict, latencia_ms: float = None, origem: str = ""):
+    """Enfileira a decisão no registro, se ativo. Não bloqueia e não faz E/S."""
+    registro = obter_registro_decisoes()
+    if registro is not None:
+        registro.registrar(prompt, analise, latencia_ms, origem)
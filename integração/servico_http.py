@@ -0,0 +1,311 @@
+# servico_http.py
+"""
+Serviço HTTP do Antígeno Digital, para outros serviços usarem o filtro sem o Discord.
+
+    POST /analyze        {"prompt": "..."}            -> análise + tempo_ms
+    POST /analyze/batch  {"prompts": ["...", ...]}    -> {"resultados": [...], "tempo_ms": ...}
+    GET  /health         processo vivo (sempre 200)
+    GET  /ready          200 só com o classificador PRONTO (503 enquanto carrega ou se falhou)
+    GET  /stats          contadores do serviço, do executor, da admissão, do cache de veredictos e da avaliação sombra
+    GET  /metrics        métricas no formato texto do Prometheus (ver metricas.py)
+    GET  /trace          rastros amostrados recentes, Chrome trace-event JSON (ver rastreamento.py)
+    GET  /admin/modelo   versão ativa, reserva para rollback e histórico de trocas
+    POST /admin/modelo   {"nome": "..."}: troca o modelo sem reiniciar (ver classifier/registro_modelos.py)
+    POST /admin/rollback volta à versão anterior
+As rotas /admin/* exigem "Authorization: Bearer <ANTIGENO_ADMIN_TOKEN>" (sem o token definido, 404).
+
+Cada análise tem os campos de obter_analise_antigeno (classificacao_final,
+prob_injecao, motivo_deteccao, detalhes_ia). Quem chama deve repassar ao LLM só
+prompts com classificacao_final == "SEGURO". Falta de capacidade do classificador
+(réplicas esgotadas, serviço fora do ar) vem como ERRO_ANTIGENO, nunca como SEGURO.
+
+Servidor HTTP/1.1 mínimo sobre asyncio (keep-alive, corpo com Content-Length), sem
+dependências extras. As análises rodam em um ExecutorLimitado com muitas threads:
+requisições simultâneas caem juntas no micro-lote do classificador (um forward pass
+para várias). Sem vaga, a resposta é 503 com Retry-After; acima do SLO de latência
+(ver controle_admissao.py) também é 503: o prompt nunca sai como SEGURO sem análise.
+
+Uso (a partir da pasta integração/):
+    python servico_http.py --porta 8080 --warmup
+    python benchmark_http.py --url http://127.0.0.1:8080 --concorrencia 64 --requisicoes 5000
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import time
+from http import HTTPStatus
+
+from antigeno_digital import CACHE_VEREDICTOS, obter_analise_antigeno, obter_analises_antigeno
+from classifier.model import aquecer_classificador, inicializar_classificador, obter_estado_classificador
+from classifier import registro_modelos
+from classifier.sombra import obter_avaliador_sombra
+from controle_admissao import CLASSIFICACAO_SOBRECARGA, SLO_CLASSIFICACAO_S, ControleAdmissao, analise_descartada
+from executores import ExecutorLimitado, ExecutorOcupadoErro, PrazoExcedidoErro
+from metricas import registrar_controle_admissao, registrar_executor, texto_prometheus
+from rastreamento import rastrear, trace_chrome_recente
+from registro_decisoes import obter_registro_decisoes, registrar_decisao
+
+TAMANHO_MAX_CORPO = int(os.getenv("ANTIGENO_HTTP_TAMANHO_MAX_CORPO", str(1024 * 1024)))
+TAMANHO_MAX_LOTE = int(os.getenv("ANTIGENO_HTTP_TAMANHO_MAX_LOTE", "256"))
+TIMEOUT_OCIOSO_S = 60.0 # Conexão keep-alive sem requisição é fechada depois disso
+TIMEOUT_LEITURA_S = float(os.getenv("ANTIGENO_HTTP_TIMEOUT_LEITURA_S", "10")) # Cabeçalhos + corpo, depois da linha de requisição
+TOKEN_ADMIN = os.getenv("ANTIGENO_ADMIN_TOKEN", "")
+
+# Muitas threads de propósito: elas passam a maior parte do tempo esperando o micro-lote.
+EXECUTOR_ANALISE = ExecutorLimitado(
+    "http",
+    num_threads=int(os.getenv("ANTIGENO_HTTP_THREADS", "32")),
+    tamanho_max_fila=int(os.getenv("ANTIGENO_HTTP_FILA", "256")),
+    prazo_s=float(os.getenv("ANTIGENO_HTTP_PRAZO_S", "15")),
+)
+CONTROLE_ADMISSAO = ControleAdmissao(SLO_CLASSIFICACAO_S, concorrencia=EXECUTOR_ANALISE.num_threads)
+registrar_executor(EXECUTOR_ANALISE)
+registrar_controle_admissao("http", CONTROLE_ADMISSAO)
+
+
+class ErroHTTP(Exception):
+
+    def __init__(self, status: int, mensagem: str, cabecalhos: dict = None):
+        super().__init__(mensagem)
+        self.status = status
+        self.cabecalhos = cabecalhos or {}
+
+
+class ServicoHTTP:
+
+    def __init__(self, host: str = "127.0.0.1", porta: int = 8080, aquecer: bool = False):
+        self.host = host
+        self.porta = porta
+        self.aquecer = aquecer
+        self.requisicoes = 0
+        self.respostas_por_status = {}
+        self.tarefa_inicializacao = None
+
+    async def iniciar(self):
+        """Abre a porta na hora (/health responde) e carrega o modelo em segundo plano (/ready fica 503 até lá)."""
+        self.tarefa_inicializacao = asyncio.ensure_future(self._inicializar_classificador())
+        return await asyncio.start_server(self._atender, host=self.host, port=self.porta)
+
+    async def _inicializar_classificador(self):
+        inicio = time.perf_counter()
+        await asyncio.to_thread(inicializar_classificador)
+        print(f"Classificador: {obter_estado_classificador()} ({time.perf_counter() - inicio:.1f}s).")
+        if self.aquecer:
+            print(f"Aquecimento concluído em {await asyncio.to_thread(aquecer_classificador):.2f}s.")
+
+    # --- Rotas ---
+    async def _rota(self, metodo: str, caminho: str, corpo: bytes, cabecalhos: dict):
+        """Retorna (status, dict da resposta ou texto puro, cabeçalhos extras)."""
+        if caminho == "/health":
+            return HTTPStatus.OK, {"status": "ok"}, {}
+        if caminho == "/ready":
+            estado = obter_estado_classificador()
+            status = HTTPStatus.OK if estado == "PRONTO" else HTTPStatus.SERVICE_UNAVAILABLE
+            return status, {"pronto": estado == "PRONTO", "estado_classificador": estado, "admissao": CONTROLE_ADMISSAO.estatisticas()}, {}
+        if caminho == "/stats":
+            return HTTPStatus.OK, self.estatisticas(), {}
+        if caminho == "/metrics":
+            return HTTPStatus.OK, texto_prometheus(), {}
+        if caminho == "/trace":
+            return HTTPStatus.OK, trace_chrome_recente(), {}
+        if caminho.startswith("/admin/"):
+            return await self._rota_admin(metodo, caminho, corpo, cabecalhos)
+        if caminho not in ("/analyze", "/analyze/batch"):
+            raise ErroHTTP(HTTPStatus.NOT_FOUND, f"Rota desconhecida: {caminho}")
+        if metodo != "POST":
+            raise ErroHTTP(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST.", {"Allow": "POST"})
+        if obter_estado_classificador() != "PRONTO":
+            raise ErroHTTP(HTTPStatus.SERVICE_UNAVAILABLE, f"Classificador não está pronto ({obter_estado_classificador()}).", {"Retry-After": "5"})
+
+        try:
+            dados = json.loads(corpo or b"{}")
+        except ValueError as e:
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, f"JSON inválido: {e}")
+        if not isinstance(dados, dict):
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, "O corpo deve ser um objeto JSON.")
+        with rastrear(f"POST {caminho}"): # Span raiz: a fila do executor também aparece no rastro
+            if caminho == "/analyze":
+                return await self._analisar(dados)
+            return await self._analisar_lote(dados)
+
+    async def _rota_admin(self, metodo: str, caminho: str, corpo: bytes, cabecalhos: dict):
+        if not TOKEN_ADMIN or caminho not in ("/admin/modelo", "/admin/rollback"):
+            raise ErroHTTP(HTTPStatus.NOT_FOUND, f"Rota desconhecida: {caminho}")
+        if not hmac.compare_digest(cabecalhos.get("authorization", "").encode("utf-8"), f"Bearer {TOKEN_ADMIN}".encode("utf-8")):
+            raise ErroHTTP(HTTPStatus.UNAUTHORIZED, "Token de administração ausente ou inválido.", {"WWW-Authenticate": "Bearer"})
+        if caminho == "/admin/modelo" and metodo == "GET":
+            return HTTPStatus.OK, registro_modelos.estatisticas(), {}
+        if metodo != "POST":
+            raise ErroHTTP(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST.", {"Allow": "POST"})
+        if caminho == "/admin/rollback":
+            operacao, args = registro_modelos.reverter_modelo, ()
+        else:
+            try:
+                dados = json.loads(corpo or b"{}")
+            except ValueError as e:
+                raise ErroHTTP(HTTPStatus.BAD_REQUEST, f"JSON inválido: {e}")
+            if not isinstance(dados, dict) or not isinstance(dados.get("nome"), str) or not dados["nome"].strip():
+                raise ErroHTTP(HTTPStatus.BAD_REQUEST, "Campo 'nome' (diretório do modelo) é obrigatório.")
+            operacao, args = registro_modelos.trocar_modelo, (dados["nome"].strip(),)
+        try: # Fora do EXECUTOR_ANALISE: a carga leva segundos e não deve ocupar vagas das análises
+            return HTTPStatus.OK, await asyncio.to_thread(operacao, *args), {}
+        except registro_modelos.TrocaModeloErro as e:
+            raise ErroHTTP(HTTPStatus.CONFLICT, str(e))
+
+    async def _executar_analise(self, pendentes: int, medir: bool, funcao, *args):
+        """Admissão + executor. Sobrecarga vira 503: a análise nunca é pulada."""
+        instante_chegada = time.monotonic()
+        admitido, latencia_prevista_s = CONTROLE_ADMISSAO.admitir(pendentes)
+        if not admitido:
+            motivo = analise_descartada(latencia_prevista_s, CONTROLE_ADMISSAO.slo_s)["motivo_deteccao"]
+            raise ErroHTTP(HTTPStatus.SERVICE_UNAVAILABLE, f"{CLASSIFICACAO_SOBRECARGA}: {motivo}", {"Retry-After": "1"})
+        try:
+            if medir:
+                return await EXECUTOR_ANALISE.executar(CONTROLE_ADMISSAO.executar_medindo, instante_chegada, funcao, *args)
+            return await EXECUTOR_ANALISE.executar(funcao, *args)
+        except ExecutorOcupadoErro as e:
+            raise ErroHTTP(HTTPStatus.SERVICE_UNAVAILABLE, str(e), {"Retry-After": "1"})
+        except PrazoExcedidoErro as e:
+            raise ErroHTTP(HTTPStatus.GATEWAY_TIMEOUT, str(e))
+
+    async def _analisar(self, dados: dict):
+        prompt = dados.get("prompt")
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, "Campo 'prompt' (texto não vazio) é obrigatório.")
+        inicio = time.perf_counter()
+        analise = await self._executar_analise(EXECUTOR_ANALISE.estatisticas()["na_fila"], True, obter_analise_antigeno, prompt)
+        tempo_ms = round((time.perf_counter() - inicio) * 1000, 2)
+        registrar_decisao(prompt, analise, tempo_ms, "http")
+        return HTTPStatus.OK, dict(analise, tempo_ms=tempo_ms), {}
+
+    async def _analisar_lote(self, dados: dict):
+        prompts = dados.get("prompts")
+        if not isinstance(prompts, list) or not all(isinstance(prompt, str) for prompt in prompts):
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, "Campo 'prompts' (lista de textos) é obrigatório.")
+        if len(prompts) > TAMANHO_MAX_LOTE:
+            raise ErroHTTP(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Lote com {len(prompts)} prompts; o máximo é {TAMANHO_MAX_LOTE}.")
+        inicio = time.perf_counter()
+        # Um lote ocupa uma thread, mas conta na previsão de latência como len(prompts) análises.
+        # Seu tempo total não entra nas medições de serviço (que são de um prompt por vez).
+        pendentes = EXECUTOR_ANALISE.estatisticas()["na_fila"] + len(prompts) - 1
+        analises = await self._executar_analise(pendentes, False, obter_analises_antigeno, prompts)
+        tempo_ms = round((time.perf_counter() - inicio) * 1000, 2)
+        for prompt, analise in zip(prompts, analises): # Latência registrada é a do lote inteiro
+            registrar_decisao(prompt, analise, tempo_ms, "http_lote")
+        return HTTPStatus.OK, {"resultados": analises, "tempo_ms": tempo_ms}, {}
+
+    # --- HTTP/1.1 ---
+    async def _ler_requisicao(self, leitor):
+        """Retorna (método, caminho, cabeçalhos, corpo), ou None se o cliente fechou a conexão."""
+        linha = await asyncio.wait_for(leitor.readline(), timeout=TIMEOUT_OCIOSO_S)
+        if not linha:
+            return None
+        try:
+            metodo, alvo, versao = linha.decode("latin-1").split()
+        except ValueError:
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, "Linha de requisição inválida.")
+        # Prazo único para cabeçalhos e corpo: um cliente lento não segura a conexão indefinidamente.
+        cabecalhos, corpo = await asyncio.wait_for(self._ler_cabecalhos_e_corpo(leitor), timeout=TIMEOUT_LEITURA_S)
+        cabecalhos[":versao"] = versao
+        return metodo.upper(), alvo.split("?", 1)[0].rstrip("/") or "/", cabecalhos, corpo
+
+    async def _ler_cabecalhos_e_corpo(self, leitor):
+        cabecalhos = {}
+        while True:
+            linha = await leitor.readline()
+            if linha in (b"\r\n", b"\n", b""):
+                break
+            nome, _, valor = linha.decode("latin-1").partition(":")
+            cabecalhos[nome.strip().lower()] = valor.strip()
+        if "chunked" in cabecalhos.get("transfer-encoding", "").lower():
+            raise ErroHTTP(HTTPStatus.LENGTH_REQUIRED, "Envie o corpo com Content-Length.")
+        content_length = cabecalhos.get("content-length", "").strip() or "0"
+        if not (content_length.isascii() and content_length.isdigit()): # Rejeita negativos, sinais e lixo ("-1", "+5", "1e3")
+            raise ErroHTTP(HTTPStatus.BAD_REQUEST, f"Content-Length inválido: {content_length!r}.")
+        tamanho = int(content_length)
+        if tamanho > TAMANHO_MAX_CORPO:
+            raise ErroHTTP(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Corpo com {tamanho} bytes; o máximo é {TAMANHO_MAX_CORPO}.")
+        corpo = await leitor.readexactly(tamanho) if tamanho else b""
+        return cabecalhos, corpo
+
+    async def _escrever_resposta(self, escritor, status: int, corpo, cabecalhos: dict, manter_conexao: bool):
+        """`corpo` dict vai como JSON; str vai como text/plain (formato de exposição do Prometheus)."""
+        if isinstance(corpo, str):
+            dados, tipo = corpo.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            dados, tipo = json.dumps(corpo, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        status = HTTPStatus(status)
+        linhas = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {tipo}",
+                  f"Content-Length: {len(dados)}", f"Connection: {'keep-alive' if manter_conexao else 'close'}"]
+        linhas += [f"{nome}: {valor}" for nome, valor in cabecalhos.items()]
+        escritor.write(("\r\n".join(linhas) + "\r\n\r\n").encode("latin-1") + dados)
+        await escritor.drain()
+        self.respostas_por_status[status.value] = self.respostas_por_status.get(status.value, 0) + 1
+
+    async def _atender(self, leitor, escritor):
+        try:
+            while True:
+                manter_conexao = True
+                try:
+                    requisicao = await self._ler_requisicao(leitor)
+                    if requisicao is None:
+                        return
+                    metodo, caminho, cabecalhos, corpo = requisicao
+                    self.requisicoes += 1
+                    conexao = cabecalhos.get("connection", "").lower()
+                    manter_conexao = conexao != "close" and (cabecalhos[":versao"] != "HTTP/1.0" or conexao == "keep-alive")
+                    status, resposta, cabecalhos_extras = await self._rota(metodo, caminho, corpo, cabecalhos)
+                except ErroHTTP as e:
+                    status, resposta, cabecalhos_extras = e.status, {"erro": str(e)}, e.cabecalhos
+                    manter_conexao = manter_conexao and e.status not in (HTTPStatus.BAD_REQUEST, HTTPStatus.LENGTH_REQUIRED, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+                except Exception as e:
+                    print(f"ERRO no serviço HTTP: {e}")
+                    status, resposta, cabecalhos_extras = HTTPStatus.INTERNAL_SERVER_ERROR, {"erro": str(e)}, {}
+                await self._escrever_resposta(escritor, status, resposta, cabecalhos_extras, manter_conexao)
+                if not manter_conexao:
+                    return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass # Conexão ociosa ou cliente desconectou
+        finally:
+            escritor.close()
+
+    def estatisticas(self) -> dict:
+        registro_decisoes = obter_registro_decisoes()
+        avaliador_sombra = obter_avaliador_sombra()
+        return {
+            "requisicoes": self.requisicoes,
+            "respostas_por_status": dict(self.respostas_por_status),
+            "executor": EXECUTOR_ANALISE.estatisticas(),
+            "admissao": CONTROLE_ADMISSAO.estatisticas(),
+            "estado_classificador": obter_estado_classificador(),
+            "cache_veredictos": CACHE_VEREDICTOS.estatisticas() if CACHE_VEREDICTOS.ativo else None,
+            "registro_decisoes": registro_decisoes.estatisticas() if registro_decisoes is not None else None,
+            "sombra": avaliador_sombra.estatisticas() if avaliador_sombra is not None else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço HTTP do Antígeno Digital.")
+    parser.add_argument("--host", default=os.getenv("ANTIGENO_HTTP_HOST", "127.0.0.1"))
+    parser.add_argument("--porta", type=int, default=int(os.getenv("ANTIGENO_HTTP_PORTA", "8080")))
+    parser.add_argument("--warmup", action="store_true", help="Aquece o modelo depois de carregá-lo.")
+    args = parser.parse_args()
+
+    async def servir():
+        servico = ServicoHTTP(args.host, args.porta, args.warmup)
+        servidor = await servico.iniciar()
+        print(f"Serviço HTTP do Antígeno Digital ouvindo em http://{args.host}:{args.porta} (Ctrl+C para encerrar)")
+        registro_modelos.instalar_sinais(asyncio.get_running_loop()) # SIGHUP troca o modelo, SIGUSR2 reverte
+        async with servidor:
+            await servidor.serve_forever()
+
+    try:
+        asyncio.run(servir())
+    except KeyboardInterrupt:
+        print("\nServiço HTTP encerrado.")
+
+
+if __name__ == "__main__":
+    main()
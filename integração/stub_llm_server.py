@@ -0,0 +1,162 @@
+# stub_llm_server.py
+"""
+Servidor HTTP local que imita o endpoint chat-completions (POST /chat/completions,
+também em /openai/v1/chat/completions), para testar o cliente do LLM e medir o bot
+sem a API real. Suporta resposta completa e streaming SSE ("stream": true).
+
+Latência e falhas são sorteadas por requisição:
+    - latência: lognormal com mediana --latencia-ms e dispersão --dispersao (0 = fixa)
+    - erros 503 com probabilidade --taxa-erro, e 429 (com Retry-After) com --taxa-429
+
+Uso (a partir da pasta integração/):
+    python stub_llm_server.py --porta 8089 --latencia-ms 400 --taxa-erro 0.05
+    GROQ_BASE_URL=http://127.0.0.1:8089/openai/v1 GROQ_API_KEY=teste python discord_bot.py
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TEXTO_PADRAO = ("Esta é uma resposta simulada pelo servidor stub do Antígeno Digital. "
+                "Ela existe para medir latência e testar retentativas sem chamar a API real. ")
+
+
+class ConfiguracaoStub:
+
+    def __init__(self, latencia_ms: float = 300.0, dispersao: float = 0.0, taxa_erro: float = 0.0,
+                 taxa_429: float = 0.0, retry_after_s: float = 1.0, tokens_por_segundo: float = 200.0,
+                 palavras_resposta: int = 60, semente: int = None):
+        self.latencia_ms = latencia_ms
+        self.dispersao = dispersao
+        self.taxa_erro = taxa_erro
+        self.taxa_429 = taxa_429
+        self.retry_after_s = retry_after_s
+        self.tokens_por_segundo = tokens_por_segundo
+        self.palavras_resposta = palavras_resposta
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        self.erros_enviados = 0
+        self.limites_enviados = 0
+
+    def sortear(self):
+        """Retorna (status, latência em segundos) para uma requisição."""
+        with self._lock:
+            self.requisicoes += 1
+            sorteio = self._aleatorio.random()
+            latencia_s = self.latencia_ms / 1000.0
+            if self.dispersao > 0:
+                latencia_s *= math.exp(self._aleatorio.gauss(0.0, self.dispersao))
+            if sorteio < self.taxa_429:
+                self.limites_enviados += 1
+                return 429, 0.0
+            if sorteio < self.taxa_429 + self.taxa_erro:
+                self.erros_enviados += 1
+                return 503, latencia_s
+            return 200, latencia_s
+
+    def texto_resposta(self, prompt: str) -> str:
+        palavras = (f"Sobre '{prompt[:40]}': " + TEXTO_PADRAO * (1 + self.palavras_resposta // 20)).split()
+        return " ".join(palavras[:self.palavras_resposta])
+
+
+def _criar_handler(configuracao: ConfiguracaoStub):
+
+    class HandlerStub(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Mantém a conexão aberta (keep-alive), como a API real
+
+        def log_message(self, *args):
+            pass
+
+        def _responder_json(self, status: int, corpo: dict, cabecalhos: dict = None):
+            dados = json.dumps(corpo).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            for nome, valor in (cabecalhos or {}).items():
+                self.send_header(nome, valor)
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def do_POST(self):
+            if self.path.rstrip("/") not in ("/chat/completions", "/openai/v1/chat/completions"):
+                self._responder_json(404, {"error": {"message": f"Rota desconhecida: {self.path}"}})
+                return
+            corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = (corpo.get("messages") or [{}])[-1].get("content", "")
+
+            status, latencia_s = configuracao.sortear()
+            time.sleep(latencia_s)
+            if status == 429:
+                self._responder_json(429, {"error": {"message": "Rate limit (stub)"}}, {"Retry-After": f"{configuracao.retry_after_s:g}"})
+                return
+            if status != 200:
+                self._responder_json(status, {"error": {"message": "Serviço indisponível (stub)"}})
+                return
+
+            texto = configuracao.texto_resposta(prompt)
+            if not corpo.get("stream"):
+                self._responder_json(200, {
+                    "id": "stub", "object": "chat.completion", "model": corpo.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": texto}, "finish_reason": "stop"}],
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            intervalo_s = 1.0 / configuracao.tokens_por_segundo if configuracao.tokens_por_segundo > 0 else 0.0
+            for palavra in texto.split(" "):
+                pedaco = {"id": "stub", "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": palavra + " "}}]}
+                self._escrever_chunk(f"data: {json.dumps(pedaco)}\n\n")
+                time.sleep(intervalo_s)
+            self._escrever_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _escrever_chunk(self, texto: str):
+            dados = texto.encode("utf-8")
+            self.wfile.write(f"{len(dados):x}\r\n".encode("ascii") + dados + b"\r\n")
+            self.wfile.flush()
+
+    return HandlerStub
+
+
+def iniciar_servidor_stub(porta: int = 0, configuracao: ConfiguracaoStub = None, host: str = "127.0.0.1"):
+    """Sobe o stub em uma thread daemon. Retorna (servidor, base_url); pare com servidor.shutdown()."""
+    configuracao = configuracao or ConfiguracaoStub()
+    servidor = ThreadingHTTPServer((host, porta), _criar_handler(configuracao))
+    servidor.daemon_threads = True
+    servidor.configuracao = configuracao
+    threading.Thread(target=servidor.serve_forever, name="stub-llm", daemon=True).start()
+    return servidor, f"http://{host}:{servidor.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor stub do endpoint chat-completions.")
+    parser.add_argument("--porta", type=int, default=8089)
+    parser.add_argument("--latencia-ms", type=float, default=300.0, help="Mediana da latência até a resposta (ou até o primeiro token).")
+    parser.add_argument("--dispersao", type=float, default=0.0, help="Sigma da lognormal da latência (0 = latência fixa).")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="Fração de requisições respondidas com 503.")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="Fração de requisições respondidas com 429 + Retry-After.")
+    parser.add_argument("--retry-after-s", type=float, default=1.0)
+    parser.add_argument("--tokens-por-segundo", type=float, default=200.0, help="Velocidade do streaming.")
+    parser.add_argument("--palavras", type=int, default=60, help="Tamanho da resposta simulada, em palavras.")
+    args = parser.parse_args()
+
+    configuracao = ConfiguracaoStub(args.latencia_ms, args.dispersao, args.taxa_erro, args.taxa_429,
+                                    args.retry_after_s, args.tokens_por_segundo, args.palavras)
+    servidor = ThreadingHTTPServer(("127.0.0.1", args.porta), _criar_handler(configuracao))
+    servidor.daemon_threads = True
+    print(f"Stub do LLM ouvindo em http://127.0.0.1:{args.porta} (Ctrl+C para encerrar)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nEncerrando. Requisições: {configuracao.requisicoes}, 503: {configuracao.erros_enviados}, 429: {configuracao.limites_enviados}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+# teste_carga.py
+"""
+Teste de carga local, ponta a ponta, do caminho do bot:
+discord_bot.on_message -> obter_analise_antigeno -> LLM, sem Discord nem Groq reais.
+
+- Mensagens sintéticas (objetos com a mesma interface usada por on_message) chegam
+  em um processo de Poisson à taxa --taxa, reproduzindo prompts_para_testar.csv,
+  de --usuarios usuários distribuídos em --canais canais.
+- O LLM é o stub_llm_server.py, em uma thread, com latência e erros configuráveis.
+- O classificador é o real (modelo carregado antes de começar a medir).
+- Os prompts são sorteados com reposição: por isso os caches de veredictos e de
+  respostas do LLM ficam desligados (senão a carga mediria o cache, não o
+  classificador nem o LLM). --manter-caches os mantém como configurados.
+
+Relatório: vazão, p50/p95/p99 por etapa, taxa de cada desfecho e taxa de acerto dos caches.
+Uso (a partir da pasta integração/):
+    python teste_carga.py --taxa 20 --duracao 60 --usuarios 50 --latencia-llm-ms 600 --taxa-erro-llm 0.02
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+CAMINHO_CSV_PADRAO = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ANTIGENO_DIGITAL", "prompts_para_testar.csv"))
+_IDS_MENSAGEM = itertools.count(1)
+
+
+# --- Discord falso: só a interface usada por on_message ---
+class UsuarioFalso:
+
+    def __init__(self, id_usuario: int):
+        self.id = id_usuario
+        self.name = f"usuario_carga_{id_usuario}"
+        self.mention = f"<@{id_usuario}>"
+
+
+class MensagemEnviadaFalsa:
+
+    def __init__(self, canal, conteudo: str):
+        self.id = next(_IDS_MENSAGEM)
+        self.canal = canal
+        self.content = conteudo
+
+    async def edit(self, content: str = None, **_):
+        self.content = content
+        self.canal.registrar("edit", self, content)
+        return self
+
+
+class CanalFalso:
+    """Registra (instante, tipo, id_mensagem, conteúdo) de cada envio/edição de uma interação."""
+
+    def __init__(self, id_canal: int):
+        self.id = id_canal
+        self.eventos = []
+
+    def registrar(self, tipo: str, mensagem, conteudo: str):
+        self.eventos.append((time.perf_counter(), tipo, mensagem.id, conteudo or ""))
+
+    async def send(self, content: str = None, **_):
+        mensagem = MensagemEnviadaFalsa(self, content)
+        self.registrar("send", mensagem, content)
+        return mensagem
+
+
+class MensagemRecebidaFalsa:
+
+    def __init__(self, conteudo: str, autor: UsuarioFalso, id_canal: int):
+        self.id = next(_IDS_MENSAGEM)
+        self.content = conteudo
+        self.author = autor
+        self.channel = CanalFalso(id_canal) # Um canal falso por interação, para separar os eventos
+
+
+# --- Medição ---
+def percentil(valores: list, p: float):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(int(round(p / 100.0 * (len(ordenados) - 1))), len(ordenados) - 1)]
+
+
+def interpretar_interacao(inicio: float, canal: CanalFalso) -> dict:
+    """Classifica o desfecho e extrai os instantes de cada etapa a partir dos eventos do canal."""
+    resultado = {"desfecho": "sem_resposta"}
+    eventos = canal.eventos
+    if not eventos:
+        return resultado
+    resultado["ponta_a_ponta_ms"] = (eventos[-1][0] - inicio) * 1000
+
+    primeiro_conteudo = eventos[0][3]
+    if primeiro_conteudo.startswith("🐢"):
+        resultado["desfecho"] = "limitado"
+        return resultado
+
+    id_processando = eventos[0][2]
+    veredicto = next((evento for evento in eventos if evento[1] == "edit" and evento[2] == id_processando), None)
+    if veredicto is None:
+        return resultado
+    resultado["ate_veredicto_ms"] = (veredicto[0] - inicio) * 1000
+    texto_veredicto = veredicto[3]
+    if "ALERTA DO ANTÍGENO" in texto_veredicto:
+        resultado["desfecho"] = "bloqueado"
+    elif texto_veredicto.startswith("⏳"):
+        resultado["desfecho"] = "ocupado_ou_prazo"
+    elif "ERRO_SOBRECARGA" in texto_veredicto:
+        resultado["desfecho"] = "descartado_slo"
+    elif "ATENÇÃO - ANTÍGENO" in texto_veredicto or texto_veredicto.startswith("Desculpe"):
+        resultado["desfecho"] = "erro_antigeno"
+    elif "parece seguro" in texto_veredicto:
+        respostas = [evento for evento in eventos if evento[0] >= veredicto[0] and evento[2] != id_processando]
+        if not respostas:
+            return resultado
+        resultado["llm_primeiro_token_ms"] = (respostas[0][0] - veredicto[0]) * 1000
+        resultado["llm_total_ms"] = (respostas[-1][0] - veredicto[0]) * 1000
+        corpo = respostas[0][3].split(">>> ", 1)[-1]
+        if respostas[0][3].startswith("⏳") or corpo.startswith(("Erro", "ERRO")) or respostas[0][3].startswith("Desculpe"):
+            resultado["desfecho"] = "erro_llm"
+        else:
+            resultado["desfecho"] = "respondido"
+    return resultado
+
+
+def instrumentar_classificacao(modulo_bot, duracoes_ms: list):
+    """Envolve a função de análise usada pelo bot para medir só o tempo de classificação (sem a fila)."""
+    analisar_original = modulo_bot.obter_analise_antigeno
+    lock = threading.Lock()
+
+    def analisar_medindo(prompt):
+        inicio = time.perf_counter()
+        try:
+            return analisar_original(prompt)
+        finally:
+            with lock:
+                duracoes_ms.append((time.perf_counter() - inicio) * 1000)
+
+    modulo_bot.obter_analise_antigeno = analisar_medindo
+
+
+async def gerar_carga(modulo_bot, prompts: list, args) -> tuple:
+    aleatorio = random.Random(args.semente)
+    usuarios = [UsuarioFalso(100000 + i) for i in range(args.usuarios)]
+    tarefas = []
+    interacoes = []
+    inicio_carga = time.perf_counter()
+    proxima_chegada = inicio_carga
+    while proxima_chegada - inicio_carga < args.duracao:
+        await asyncio.sleep(max(proxima_chegada - time.perf_counter(), 0.0))
+        mensagem = MensagemRecebidaFalsa(
+            f"{modulo_bot.COMMAND_PREFIX} {aleatorio.choice(prompts)}",
+            aleatorio.choice(usuarios),
+            aleatorio.randrange(args.canais),
+        )
+        inicio = time.perf_counter()
+        tarefas.append(asyncio.ensure_future(modulo_bot.on_message(mensagem)))
+        interacoes.append((inicio, mensagem.channel))
+        proxima_chegada += aleatorio.expovariate(args.taxa)
+
+    print(f"Carga gerada: {len(tarefas)} mensagens em {time.perf_counter() - inicio_carga:.1f}s. Aguardando as respostas...")
+    _, pendentes = await asyncio.wait(tarefas, timeout=args.espera_final) if tarefas else (set(), set())
+    for tarefa in pendentes:
+        tarefa.cancel()
+    excecoes = sum(1 for tarefa in tarefas if tarefa.done() and not tarefa.cancelled() and tarefa.exception() is not None)
+    return interacoes, time.perf_counter() - inicio_carga, len(pendentes), excecoes
+
+
+def montar_relatorio(interacoes: list, duracao_s: float, duracoes_classificacao_ms: list, nao_concluidas: int, excecoes: int) -> dict:
+    resultados = [interpretar_interacao(inicio, canal) for inicio, canal in interacoes]
+    total = len(resultados)
+    desfechos = {}
+    for resultado in resultados:
+        desfechos[resultado["desfecho"]] = desfechos.get(resultado["desfecho"], 0) + 1
+
+    etapas = {"classificacao_ms": duracoes_classificacao_ms}
+    for etapa in ("ate_veredicto_ms", "llm_primeiro_token_ms", "llm_total_ms", "ponta_a_ponta_ms"):
+        etapas[etapa] = [resultado[etapa] for resultado in resultados if etapa in resultado]
+
+    return {
+        "mensagens": total,
+        "duracao_s": duracao_s,
+        "vazao_msgs_s": (total - nao_concluidas) / duracao_s if duracao_s else 0.0,
+        "nao_concluidas": nao_concluidas,
+        "excecoes_on_message": excecoes,
+        "desfechos": {nome: {"quantidade": quantidade, "taxa": quantidade / total} for nome, quantidade in sorted(desfechos.items())},
+        "etapas": {
+            etapa: {"n": len(valores), "p50": percentil(valores, 50), "p95": percentil(valores, 95), "p99": percentil(valores, 99)}
+            for etapa, valores in etapas.items()
+        },
+    }
+
+
+def imprimir_relatorio(relatorio: dict):
+    print(f"\n--- Teste de carga: {relatorio['mensagens']} mensagens em {relatorio['duracao_s']:.1f}s ---")
+    print(f"Vazão: {relatorio['vazao_msgs_s']:.2f} msgs/s | não concluídas: {relatorio['nao_concluidas']} | exceções em on_message: {relatorio['excecoes_on_message']}")
+    print("\nDesfechos:")
+    for nome, dados in relatorio["desfechos"].items():
+        print(f"  {nome:<20}{dados['quantidade']:>7}  ({dados['taxa']:.1%})")
+    print(f"\n{'etapa':<24}{'n':>7}{'p50 (ms)':>12}{'p95 (ms)':>12}{'p99 (ms)':>12}")
+    for etapa, dados in relatorio["etapas"].items():
+        valores = [f"{dados[p]:>12.1f}" if dados[p] is not None else f"{'-':>12}" for p in ("p50", "p95", "p99")]
+        print(f"{etapa:<24}{dados['n']:>7}{''.join(valores)}")
+    print("\nCaches:")
+    for nome, dados in relatorio.get("caches", {}).items():
+        if dados is None:
+            print(f"  {nome:<20}desativado")
+        else:
+            print(f"  {nome:<20}{dados['acertos']:>7} acertos / {dados['acertos'] + dados['falhas']} consultas  ({dados['taxa_acerto']:.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga local do bot Antígeno Digital (Discord e LLM falsos).")
+    parser.add_argument("--taxa", type=float, default=10.0, help="Mensagens por segundo (chegadas de Poisson).")
+    parser.add_argument("--duracao", type=float, default=30.0, help="Duração da geração de carga, em segundos.")
+    parser.add_argument("--usuarios", type=int, default=20)
+    parser.add_argument("--canais", type=int, default=3)
+    parser.add_argument("--csv", default=CAMINHO_CSV_PADRAO, help="CSV com a coluna 'prompt_text'.")
+    parser.add_argument("--latencia-llm-ms", type=float, default=500.0, help="Mediana da latência do LLM stub.")
+    parser.add_argument("--dispersao-llm", type=float, default=0.5, help="Sigma da lognormal da latência do LLM stub.")
+    parser.add_argument("--taxa-erro-llm", type=float, default=0.0, help="Fração de respostas 503 do LLM stub.")
+    parser.add_argument("--taxa-429-llm", type=float, default=0.0, help="Fração de respostas 429 do LLM stub.")
+    parser.add_argument("--tokens-por-segundo", type=float, default=200.0, help="Velocidade do streaming do LLM stub.")
+    parser.add_argument("--manter-limites", action="store_true", help="Mantém os limites de taxa por usuário/canal configurados (por padrão são desativados).")
+    parser.add_argument("--manter-caches", action="store_true", help="Mantém os caches de veredictos e do LLM configurados (por padrão são desativados).")
+    parser.add_argument("--espera-final", type=float, default=120.0, help="Tempo máximo de espera pelas respostas após a carga.")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", default=None, help="Arquivo JSON para salvar o relatório.")
+    args = parser.parse_args()
+
+    from stub_llm_server import ConfiguracaoStub, iniciar_servidor_stub
+    configuracao_stub = ConfiguracaoStub(args.latencia_llm_ms, args.dispersao_llm, args.taxa_erro_llm, args.taxa_429_llm,
+                                         retry_after_s=0.5, tokens_por_segundo=args.tokens_por_segundo, semente=args.semente)
+    servidor_stub, url_stub = iniciar_servidor_stub(0, configuracao_stub)
+
+    # Precisa ser definido antes de importar o bot (config.py lê o ambiente na importação).
+    os.environ["GROQ_BASE_URL"] = f"{url_stub}/openai/v1"
+    os.environ["GROQ_API_KEY"] = "chave-teste-carga"
+    os.environ.setdefault("DISCORD_BOT_TOKEN", "token-teste-carga")
+    os.environ.setdefault("ANTIGENO_INTERVALO_EDICAO_S", "0") # Sem Discord real, não há limite de edições a respeitar
+    if not args.manter_limites:
+        for variavel in ("ANTIGENO_LIMITE_USUARIO_RAJADA", "ANTIGENO_LIMITE_USUARIO_POR_MIN", "ANTIGENO_LIMITE_CANAL_RAJADA", "ANTIGENO_LIMITE_CANAL_POR_MIN"):
+            os.environ[variavel] = "1000000"
+    if not args.manter_caches:
+        os.environ["ANTIGENO_CACHE_TAMANHO"] = "0"
+        os.environ["ANTIGENO_CACHE_LLM"] = "0"
+
+    import antigeno_digital
+    import discord_bot
+    import groq_client
+    from classifier.model import inicializar_classificador, obter_estado_classificador
+
+    with open(args.csv, mode="r", encoding="utf-8", newline="") as arquivo_csv:
+        prompts = [linha["prompt_text"].strip() for linha in csv.DictReader(arquivo_csv) if linha.get("prompt_text", "").strip()]
+    print(f"{len(prompts)} prompts carregados de '{args.csv}'. LLM stub em {url_stub}.")
+
+    inicio = time.perf_counter()
+    inicializar_classificador()
+    print(f"Classificador: {obter_estado_classificador()} ({time.perf_counter() - inicio:.1f}s).")
+
+    duracoes_classificacao_ms = []
+    instrumentar_classificacao(discord_bot, duracoes_classificacao_ms)
+    interacoes, duracao_s, nao_concluidas, excecoes = asyncio.run(gerar_carga(discord_bot, prompts, args))
+
+    relatorio = montar_relatorio(interacoes, duracao_s, duracoes_classificacao_ms, nao_concluidas, excecoes)
+    relatorio["parametros"] = vars(args)
+    relatorio["llm_stub"] = {"requisicoes": configuracao_stub.requisicoes, "respostas_503": configuracao_stub.erros_enviados, "respostas_429": configuracao_stub.limites_enviados}
+    relatorio["filas"] = {
+        "agendador": discord_bot.AGENDADOR_CLASSIFICACAO.estatisticas(),
+        "classificacao": discord_bot.EXECUTOR_CLASSIFICACAO.estatisticas(),
+        "llm": discord_bot.EXECUTOR_LLM.estatisticas(),
+        "admissao": discord_bot.CONTROLE_ADMISSAO.estatisticas(),
+    }
+    cache_llm = groq_client.obter_cache_respostas_llm()
+    relatorio["caches"] = {
+        "veredictos": antigeno_digital.CACHE_VEREDICTOS.estatisticas() if antigeno_digital.CACHE_VEREDICTOS.ativo else None,
+        "llm": cache_llm.estatisticas() if cache_llm is not None else None,
+    }
+    imprimir_relatorio(relatorio)
+    print(f"\nLLM stub: {relatorio['llm_stub']}")
+    servidor_stub.shutdown()
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2, default=str)
+        print(f"Relatório salvo em: {args.saida}")
+    sys.exit(0 if nao_concluidas == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# testes/test_agendamento_justo.py
+# A partir da pasta integração/: python -m unittest discover -s testes
+import asyncio
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agendamento_justo import AgendadorJusto, BaldeTokens, LimitadorTaxa
+from executores import ExecutorOcupadoErro
+
+
+class TesteBaldeTokens(unittest.TestCase):
+
+    def test_rajada_e_reabastecimento(self):
+        balde = BaldeTokens(capacidade=2, taxa_por_s=20.0)
+        for _ in range(2):
+            self.assertEqual(balde.espera_para(1), 0.0)
+            balde.consumir(1)
+        self.assertAlmostEqual(balde.espera_para(1), 0.05, delta=0.01)
+        time.sleep(0.06)
+        self.assertEqual(balde.espera_para(1), 0.0)
+
+    def test_custo_acima_da_capacidade_nao_trava(self):
+        balde = BaldeTokens(capacidade=3, taxa_por_s=1.0)
+        self.assertEqual(balde.espera_para(10), 0.0) # Cobra no máximo a capacidade
+        balde.consumir(10)
+        self.assertAlmostEqual(balde.tokens, 0.0, places=3)
+
+
+class TesteLimitadorTaxa(unittest.TestCase):
+
+    def test_limite_por_usuario(self):
+        limitador = LimitadorTaxa(capacidade_usuario=2, por_minuto_usuario=1, capacidade_canal=100, por_minuto_canal=100)
+        self.assertTrue(limitador.permitir(1, 10)[0])
+        self.assertTrue(limitador.permitir(1, 10)[0])
+        permitido, espera_s, escopo = limitador.permitir(1, 10)
+        self.assertFalse(permitido)
+        self.assertEqual(escopo, "usuario")
+        self.assertGreater(espera_s, 30.0)
+        self.assertTrue(limitador.permitir(2, 10)[0]) # Outro usuário tem o próprio balde
+        self.assertEqual(limitador.estatisticas()["usuarios_mais_limitados"], [(1, 1)])
+
+    def test_limite_por_canal_nao_consome_o_usuario(self):
+        limitador = LimitadorTaxa(capacidade_usuario=5, por_minuto_usuario=1, capacidade_canal=1, por_minuto_canal=1)
+        self.assertTrue(limitador.permitir(1, 10)[0])
+        self.assertEqual(limitador.permitir(2, 10)[2], "canal")
+        self.assertAlmostEqual(limitador._balde("usuario", 2).tokens, 5.0, places=3)
+
+    def test_prompt_longo_custa_mais(self):
+        limitador = LimitadorTaxa(capacidade_usuario=3, por_minuto_usuario=1, capacidade_canal=100, por_minuto_canal=100,
+                                  caracteres_por_token=100)
+        self.assertEqual(limitador.custo("x" * 250), 3.0)
+        self.assertTrue(limitador.permitir(1, 10, "x" * 250)[0])
+        self.assertFalse(limitador.permitir(1, 10, "oi")[0])
+
+    def test_baldes_limitados(self):
+        limitador = LimitadorTaxa(capacidade_usuario=1, por_minuto_usuario=1, capacidade_canal=100, por_minuto_canal=100, max_baldes=4)
+        for usuario in range(10):
+            limitador.permitir(usuario, 10)
+            limitador.permitir(usuario, 10)
+        self.assertLessEqual(len(limitador._baldes), 4)
+        self.assertLessEqual(len(limitador.limitadas_por_usuario), 4)
+
+
+class TesteAgendadorJusto(unittest.TestCase):
+
+    def test_rodizio_entre_usuarios(self):
+        ordem = []
+
+        async def cenario():
+            agendador = AgendadorJusto(max_concorrencia=1, max_pendentes_por_usuario=10)
+
+            def tarefa(rotulo):
+                async def rodar():
+                    ordem.append(rotulo)
+                    await asyncio.sleep(0)
+                return rodar
+
+            liberar = asyncio.Event()
+
+            async def ocupar():
+                await liberar.wait()
+
+            ocupante = asyncio.ensure_future(agendador.executar("c", ocupar)) # Segura a única vaga enquanto as filas enchem
+            await asyncio.sleep(0)
+            chamadas = [asyncio.ensure_future(agendador.executar("a", tarefa(f"a{i}"))) for i in range(3)]
+            chamadas += [asyncio.ensure_future(agendador.executar("b", tarefa(f"b{i}"))) for i in range(2)]
+            await asyncio.sleep(0)
+            liberar.set()
+            await asyncio.gather(ocupante, *chamadas)
+            return agendador.estatisticas()
+
+        estatisticas = asyncio.run(cenario())
+        self.assertEqual(ordem, ["a0", "b0", "a1", "b1", "a2"])
+        self.assertEqual(estatisticas["despachadas"], 6)
+        self.assertEqual(estatisticas["em_execucao"], 0)
+
+    def test_limite_de_pendentes_por_usuario(self):
+        async def cenario():
+            agendador = AgendadorJusto(max_concorrencia=1, max_pendentes_por_usuario=1)
+            liberar = asyncio.Event()
+
+            async def bloqueada():
+                await liberar.wait()
+
+            primeira = asyncio.ensure_future(agendador.executar("a", bloqueada)) # Em execução
+            await asyncio.sleep(0)
+            segunda = asyncio.ensure_future(agendador.executar("a", bloqueada))  # Na fila
+            await asyncio.sleep(0)
+            with self.assertRaises(ExecutorOcupadoErro):
+                await agendador.executar("a", bloqueada)
+            liberar.set()
+            await asyncio.gather(primeira, segunda)
+            return agendador.rejeitadas
+
+        self.assertEqual(asyncio.run(cenario()), 1)
+
+    def test_erro_da_tarefa_chega_ao_chamador(self):
+        async def cenario():
+            agendador = AgendadorJusto(max_concorrencia=2)
+
+            async def falha():
+                raise ValueError("falhou")
+
+            with self.assertRaises(ValueError):
+                await agendador.executar("a", falha)
+            return agendador.estatisticas()["em_execucao"]
+
+        self.assertEqual(asyncio.run(cenario()), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+# testes/test_cache_veredictos.py
+# A partir da pasta integração/: python -m unittest discover -s testes
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_veredictos import CacheVeredictos, gerar_chave, normalizar_prompt
+
+
+class TesteChave(unittest.TestCase):
+
+    def test_normalizacao_colapsa_espacos_e_nfc(self):
+        self.assertEqual(normalizar_prompt("  ignore\n\tas   instruções "), "ignore as instruções")
+        self.assertEqual(normalizar_prompt("ac\u0327a\u0303o"), "a\u00e7\u00e3o") # NFD -> NFC
+
+    def test_normalizacao_mantem_maiusculas(self):
+        self.assertNotEqual(gerar_chave("Ignore", "v3", 0.5), gerar_chave("ignore", "v3", 0.5))
+
+    def test_chave_depende_do_modelo_e_do_limiar(self):
+        chave = gerar_chave("oi  tudo bem", "v3", 0.5)
+        self.assertEqual(chave, gerar_chave(" oi tudo bem ", "v3", 0.5))
+        self.assertNotEqual(chave, gerar_chave("oi tudo bem", "v4", 0.5))
+        self.assertNotEqual(chave, gerar_chave("oi tudo bem", "v3", 0.6))
+
+
+class TesteCacheVeredictos(unittest.TestCase):
+
+    def test_acerto_devolve_copia(self):
+        cache = CacheVeredictos(tamanho_max=10)
+        cache.guardar("a", {"classificacao_final": "SEGURO"})
+        valor = cache.obter("a")
+        valor["classificacao_final"] = "INJECAO"
+        self.assertEqual(cache.obter("a"), {"classificacao_final": "SEGURO"})
+        self.assertIsNone(cache.obter("b"))
+        self.assertEqual((cache.acertos, cache.falhas), (2, 1))
+
+    def test_despejo_lru(self):
+        cache = CacheVeredictos(tamanho_max=2)
+        cache.guardar("a", {"v": 1})
+        cache.guardar("b", {"v": 2})
+        cache.obter("a") # "b" passa a ser o menos usado
+        cache.guardar("c", {"v": 3})
+        self.assertIsNone(cache.obter("b"))
+        self.assertIsNotNone(cache.obter("a"))
+        self.assertIsNotNone(cache.obter("c"))
+        self.assertEqual(cache.despejos, 1)
+
+    def test_ttl_expira(self):
+        cache = CacheVeredictos(tamanho_max=10, ttl_s=0.05)
+        cache.guardar("a", {"v": 1})
+        self.assertIsNotNone(cache.obter("a"))
+        time.sleep(0.06)
+        self.assertIsNone(cache.obter("a"))
+        self.assertEqual(cache.estatisticas()["tamanho"], 0)
+
+    def test_troca_de_modelo_esvazia(self):
+        cache = CacheVeredictos(tamanho_max=10)
+        cache.sincronizar_identidade("v3")
+        cache.guardar("a", {"v": 1})
+        cache.sincronizar_identidade("v3")
+        self.assertIsNotNone(cache.obter("a"))
+        cache.sincronizar_identidade("v4")
+        self.assertIsNone(cache.obter("a"))
+        self.assertEqual(cache.invalidacoes, 1)
+
+    def test_tamanho_zero_desativa(self):
+        cache = CacheVeredictos(tamanho_max=0)
+        self.assertFalse(cache.ativo)
+        cache.guardar("a", {"v": 1})
+        self.assertIsNone(cache.obter("a"))
+        self.assertEqual(cache.falhas, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+# testes/test_cliente_llm.py
+# A partir da pasta integração/: python -m unittest discover -s testes
+import asyncio
+import email.utils
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cliente_llm import CircuitoAbertoErro, ClienteLLMAsync, DisjuntorCircuito, ErroLLM, interpretar_retry_after
+
+
+class TesteDisjuntor(unittest.TestCase):
+
+    def test_abre_apos_falhas_seguidas(self):
+        disjuntor = DisjuntorCircuito(limiar_falhas=3, tempo_abertura_s=60.0)
+        for _ in range(2):
+            disjuntor.registrar_falha()
+        self.assertEqual(disjuntor.estado, "FECHADO")
+        disjuntor.registrar_falha()
+        self.assertEqual(disjuntor.estado, "ABERTO")
+        self.assertFalse(disjuntor.permitir())
+        self.assertEqual(disjuntor.aberturas, 1)
+
+    def test_sucesso_zera_as_falhas(self):
+        disjuntor = DisjuntorCircuito(limiar_falhas=2)
+        disjuntor.registrar_falha()
+        disjuntor.registrar_sucesso()
+        disjuntor.registrar_falha()
+        self.assertEqual(disjuntor.estado, "FECHADO")
+
+    def test_semi_aberto_uma_chamada_de_teste(self):
+        disjuntor = DisjuntorCircuito(limiar_falhas=1, tempo_abertura_s=0.05)
+        disjuntor.registrar_falha()
+        time.sleep(0.06)
+        self.assertTrue(disjuntor.permitir())
+        self.assertTrue(disjuntor.em_teste)
+        self.assertFalse(disjuntor.permitir()) # Só uma chamada de teste por vez
+        disjuntor.registrar_sucesso()
+        self.assertEqual(disjuntor.estado, "FECHADO")
+        self.assertTrue(disjuntor.permitir())
+
+    def test_teste_com_falha_reabre(self):
+        disjuntor = DisjuntorCircuito(limiar_falhas=5, tempo_abertura_s=0.05)
+        for _ in range(5):
+            disjuntor.registrar_falha()
+        time.sleep(0.06)
+        self.assertTrue(disjuntor.permitir())
+        disjuntor.registrar_falha()
+        self.assertEqual(disjuntor.estado, "ABERTO")
+        self.assertFalse(disjuntor.permitir())
+        self.assertEqual(disjuntor.aberturas, 2)
+
+
+class TesteRetryAfter(unittest.TestCase):
+
+    def test_segundos(self):
+        self.assertEqual(interpretar_retry_after("7"), 7.0)
+        self.assertEqual(interpretar_retry_after("-3"), 0.0)
+
+    def test_data_http(self):
+        valor = email.utils.formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(interpretar_retry_after(valor), 30.0, delta=2.0)
+
+    def test_invalido_ou_ausente(self):
+        self.assertIsNone(interpretar_retry_after(None))
+        self.assertIsNone(interpretar_retry_after("amanhã"))
+
+    def test_espera_limitada_pelo_backoff_max(self):
+        cliente = ClienteLLMAsync("http://x", "chave", "modelo", backoff_max_s=2.0)
+        self.assertEqual(cliente._espera_backoff(0, retry_after=600.0), 2.0)
+        for tentativa in range(10):
+            self.assertLessEqual(cliente._espera_backoff(tentativa), 2.0)
+
+
+class ClienteRoteirizado(ClienteLLMAsync):
+    """Troca a tentativa HTTP por um roteiro: cada item é "ok", um status retentável ou uma exceção a levantar."""
+
+    def __init__(self, roteiro: list, **opcoes):
+        super().__init__("http://x", "chave", "modelo", backoff_base_s=0.0, backoff_max_s=0.0, **opcoes)
+        self.roteiro = list(roteiro)
+        self.tentativas = 0
+
+    async def _tentar(self, corpo: dict, stream: bool):
+        self.tentativas += 1
+        passo = self.roteiro.pop(0)
+        if isinstance(passo, BaseException):
+            raise passo
+        if passo == "ok":
+            self.disjuntor.registrar_sucesso()
+            return "resposta", None, None
+        self.disjuntor.registrar_falha()
+        return None, ErroLLM(f"status {passo}", passo), None
+
+
+class TesteRetentativas(unittest.TestCase):
+
+    def test_retenta_ate_o_sucesso(self):
+        cliente = ClienteRoteirizado([503, 502, "ok"], max_tentativas=4)
+        self.assertEqual(asyncio.run(cliente._enviar({}, stream=False)), "resposta")
+        self.assertEqual(cliente.tentativas, 3)
+        self.assertEqual(cliente.retentativas, 2)
+        self.assertEqual(cliente.disjuntor.estado, "FECHADO")
+
+    def test_esgota_as_tentativas(self):
+        cliente = ClienteRoteirizado([503] * 3, max_tentativas=3)
+        with self.assertRaises(ErroLLM) as contexto:
+            asyncio.run(cliente._enviar({}, stream=False))
+        self.assertEqual(contexto.exception.status_code, 503)
+        self.assertEqual(cliente.tentativas, 3)
+
+    def test_circuito_aberto_falha_sem_chamar(self):
+        cliente = ClienteRoteirizado([503, 503], max_tentativas=4, disjuntor=DisjuntorCircuito(limiar_falhas=2, tempo_abertura_s=60.0))
+        with self.assertRaises(CircuitoAbertoErro):
+            asyncio.run(cliente._enviar({}, stream=False))
+        self.assertEqual(cliente.tentativas, 2)
+
+    def test_cancelamento_libera_a_chamada_de_teste(self):
+        disjuntor = DisjuntorCircuito(limiar_falhas=1, tempo_abertura_s=0.0)
+        disjuntor.registrar_falha()
+        cliente = ClienteRoteirizado([asyncio.CancelledError(), "ok"], max_tentativas=1, disjuntor=disjuntor)
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(cliente._enviar({}, stream=False))
+        self.assertFalse(disjuntor.em_teste)
+        self.assertEqual(asyncio.run(cliente._enviar({}, stream=False)), "resposta") # A próxima chamada testa e fecha o circuito
+        self.assertEqual(disjuntor.estado, "FECHADO")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+# testes/test_controle_admissao.py
+# A partir da pasta integração/: python -m unittest discover -s testes
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from controle_admissao import ControleAdmissao
+
+
+class TesteRecuperacaoDescarte(unittest.TestCase):
+
+    def _controle_sobrecarregado(self, **opcoes) -> ControleAdmissao:
+        controle = ControleAdmissao(slo_s=5.0, concorrencia=4, **opcoes)
+        for _ in range(20):
+            controle.registrar(0.0, 4.2) # serviço_p90 = 4.2s, acima de histerese * SLO (4s)
+        admitido, _ = controle.admitir(4) # (4/4 + 1) * 4.2 = 8.4s > SLO
+        self.assertFalse(admitido)
+        self.assertEqual(controle.estado, "DESCARTANDO")
+        return controle
+
+    def test_sonda_passa_com_fila_vazia(self):
+        controle = self._controle_sobrecarregado(intervalo_sonda_s=0.05)
+        time.sleep(0.06)
+        admitido, _ = controle.admitir(0)
+        self.assertTrue(admitido)
+        self.assertEqual(controle.sondas, 1)
+        self.assertFalse(controle.admitir(0)[0]) # Só uma sonda por intervalo
+
+    def test_sonda_nao_passa_com_fila(self):
+        controle = self._controle_sobrecarregado(intervalo_sonda_s=0.05)
+        time.sleep(0.06)
+        self.assertFalse(controle.admitir(3)[0])
+
+    def test_medicoes_antigas_expiram(self):
+        controle = self._controle_sobrecarregado(janela_servico_s=0.05, intervalo_sonda_s=60.0)
+        time.sleep(0.06)
+        admitido, prevista_s = controle.admitir(0)
+        self.assertTrue(admitido)
+        self.assertEqual(prevista_s, 0.0)
+        self.assertEqual(controle.estado, "NORMAL")
+
+    def test_sondas_rapidas_tiram_do_descarte(self):
+        controle = self._controle_sobrecarregado(janela_servico_s=0.2, intervalo_sonda_s=0.0)
+        time.sleep(0.21)
+        for _ in range(10):
+            controle.registrar(0.0, 0.1) # Serviço recuperado
+        admitido, prevista_s = controle.admitir(0)
+        self.assertTrue(admitido)
+        self.assertLess(prevista_s, 1.0)
+        self.assertEqual(controle.estado, "NORMAL")
+
+
+if __name__ == "__main__":
+    unittest.main()
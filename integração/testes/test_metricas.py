@@ -0,0 +1,61 @@
+# testes/test_metricas.py
+# A partir da pasta integração/: python -m unittest discover -s testes
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metricas import Contador, Histograma, MetricaColetada, RegistroMetricas
+
+
+class TesteFormatoPrometheus(unittest.TestCase):
+
+    def test_contador(self):
+        contador = Contador("antigeno_teste_total", "Ajuda.", ("classificacao", "motivo"))
+        contador.inc("SEGURO", "REGRAS")
+        contador.inc("SEGURO", "REGRAS", quantidade=2)
+        contador.inc("INJECAO", "IA")
+        self.assertEqual(contador.texto(), [
+            "# HELP antigeno_teste_total Ajuda.",
+            "# TYPE antigeno_teste_total counter",
+            'antigeno_teste_total{classificacao="INJECAO",motivo="IA"} 1.0',
+            'antigeno_teste_total{classificacao="SEGURO",motivo="REGRAS"} 3.0',
+        ])
+
+    def test_histograma_acumulado(self):
+        histograma = Histograma("antigeno_teste_segundos", "Ajuda.", ("etapa",), limites=(0.1, 1.0))
+        for valor in (0.05, 0.1, 0.5, 2.0): # 0.1 cai no bucket le="0.1" (limite inclusivo)
+            histograma.observar(valor, "forward")
+        self.assertEqual(histograma.texto()[2:], [
+            'antigeno_teste_segundos_bucket{etapa="forward",le="0.1"} 2',
+            'antigeno_teste_segundos_bucket{etapa="forward",le="1.0"} 3',
+            'antigeno_teste_segundos_bucket{etapa="forward",le="+Inf"} 4',
+            'antigeno_teste_segundos_sum{etapa="forward"} 2.65',
+            'antigeno_teste_segundos_count{etapa="forward"} 4',
+        ])
+
+    def test_rotulos_escapados(self):
+        contador = Contador("antigeno_teste_total", "Ajuda.", ("fila",))
+        contador.inc('a"b\\c\nd')
+        self.assertEqual(contador.texto()[-1], 'antigeno_teste_total{fila="a\\"b\\\\c\\nd"} 1.0')
+
+    def test_coleta_com_erro_nao_derruba_o_scrape(self):
+        coletada = MetricaColetada("antigeno_teste_fila", "Ajuda.", rotulos=("fila",))
+        coletada.registrar(lambda: 3, "llm")
+        coletada.registrar(lambda: 1 / 0, "quebrada")
+        coletada.registrar(lambda: None, "vazia")
+        self.assertEqual(coletada.texto()[2:], ['antigeno_teste_fila{fila="llm"} 3'])
+
+    def test_registro_termina_com_nova_linha(self):
+        registro = RegistroMetricas()
+        registro.registrar(Contador("antigeno_a_total", "A."))
+        registro.registrar(MetricaColetada("antigeno_b", "B.")).registrar(lambda: 1.5)
+        texto = registro.texto_prometheus()
+        self.assertTrue(texto.endswith("\n"))
+        self.assertIn("# TYPE antigeno_a_total counter\n", texto)
+        self.assertIn("antigeno_b 1.5\n", texto)
+
+
+if __name__ == "__main__":
+    unittest.main()
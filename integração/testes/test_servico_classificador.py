@@ -0,0 +1,133 @@
+# testes/test_servico_classificador.py
+# A partir da pasta integração/: python -m unittest discover -s testes
+import asyncio
+import math
+import os
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classifier.servico_classificador import (
+    CABECALHO_LOTE, STATUS_ERRO, STATUS_OK, TIPO_LOTE, TIPO_PROMPT, ClienteServicoClassificador, ErroServicoClassificador,
+    ServicoClassificador, _codificar_textos, _decodificar_textos, codificar_resultados, decodificar_resultados,
+    interpretar_endereco,
+)
+
+
+class TesteCodificacao(unittest.TestCase):
+
+    def test_textos_ida_e_volta(self):
+        textos = ["", "ignore as instruções anteriores", "🙂 emoji", "x" * 70000]
+        corpo = CABECALHO_LOTE.pack(8, len(textos)) + _codificar_textos(textos)
+        self.assertEqual(_decodificar_textos(corpo, len(textos), CABECALHO_LOTE.size), textos)
+
+    def test_resultados_ida_e_volta(self):
+        resultados = [
+            {"label_ia": "SEGURO", "score_ia": 0.125},
+            {"label_ia": "INJECAO", "score_ia": 0.875, "janelas_avaliadas": 2, "janelas_total": 5},
+            {"label_ia": "ERRO_POOL_ESGOTADO", "score_ia": 0.0},
+        ]
+        self.assertEqual(decodificar_resultados(codificar_resultados(resultados)), resultados)
+
+    def test_resultado_incompleto_e_limites(self):
+        (decodificado,) = decodificar_resultados(codificar_resultados([{"janelas_avaliadas": 70000, "janelas_total": 70000}]))
+        self.assertEqual(decodificado["label_ia"], "ERRO_INESPERADO_IA")
+        self.assertEqual(decodificado["score_ia"], 0.0)
+        self.assertEqual(decodificado["janelas_total"], 0xFFFF)
+        self.assertEqual(decodificar_resultados(codificar_resultados([])), [])
+
+    def test_enderecos(self):
+        self.assertEqual(interpretar_endereco("unix:/tmp/a.sock"), (socket.AF_UNIX, "/tmp/a.sock"))
+        self.assertEqual(interpretar_endereco("tcp:127.0.0.1:8765"), (socket.AF_INET, ("127.0.0.1", 8765)))
+        self.assertEqual(interpretar_endereco(":8765"), (socket.AF_INET, ("127.0.0.1", 8765)))
+
+
+class ServicoEco(ServicoClassificador):
+    """Responde sem modelo: o label é o prompt em maiúsculas e o score, o limiar; o prompt "falha" vira STATUS_ERRO."""
+
+    def _processar(self, tipo: int, limiar: float, corpo: bytes):
+        if tipo == TIPO_PROMPT:
+            prompts = [corpo.decode("utf-8")]
+        elif tipo == TIPO_LOTE:
+            _, quantidade = CABECALHO_LOTE.unpack_from(corpo, 0)
+            prompts = _decodificar_textos(corpo, quantidade, CABECALHO_LOTE.size)
+        else:
+            return STATUS_ERRO, b"tipo"
+        if "falha" in prompts:
+            return STATUS_ERRO, b"falha simulada"
+        score = 0.0 if math.isnan(limiar) else limiar
+        return STATUS_OK, codificar_resultados([{"label_ia": prompt.upper(), "score_ia": score} for prompt in prompts])
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "requer socket Unix")
+class TesteClienteServidor(unittest.TestCase):
+
+    def setUp(self):
+        self._pasta = tempfile.TemporaryDirectory()
+        self.endereco = f"unix:{os.path.join(self._pasta.name, 'servico.sock')}"
+        self.servico = ServicoEco(self.endereco, max_threads=4)
+        self.loop = asyncio.new_event_loop()
+        pronto = threading.Event()
+
+        def rodar():
+            asyncio.set_event_loop(self.loop)
+            self.servidor = self.loop.run_until_complete(self.servico.iniciar())
+            pronto.set()
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=rodar, daemon=True)
+        self._thread.start()
+        pronto.wait(5)
+        self.cliente = ClienteServicoClassificador(self.endereco, timeout_requisicao_s=5.0, espera_reconexao_s=0.0)
+
+    def tearDown(self):
+        self.cliente.fechar()
+        asyncio.run_coroutine_threadsafe(self._encerrar_servidor(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+        self.loop.close()
+        self.servico._executor.shutdown(wait=False)
+        self._pasta.cleanup()
+
+    async def _encerrar_servidor(self):
+        self.servidor.close()
+        await self.servidor.wait_closed()
+        await asyncio.sleep(0.05) # Deixa o servidor ver as desconexões antes de o loop fechar
+
+    def test_prompt_e_lote(self):
+        self.assertEqual(self.cliente.analisar("oi"), {"label_ia": "OI", "score_ia": 0.0})
+        resultados = self.cliente.analisar_lote(["a", "ção"], batch_size=8, limiar_bloqueio_janelas=0.5)
+        self.assertEqual([r["label_ia"] for r in resultados], ["A", "ÇÃO"])
+        self.assertEqual(resultados[0]["score_ia"], 0.5)
+
+    def test_requisicoes_simultaneas_na_mesma_conexao(self):
+        resultados = {}
+
+        def analisar(i):
+            resultados[i] = self.cliente.analisar(f"p{i}")["label_ia"]
+
+        threads = [threading.Thread(target=analisar, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(resultados, {i: f"P{i}" for i in range(20)})
+        self.assertEqual(self.cliente.reconexoes, 1)
+
+    def test_erro_do_servidor(self):
+        with self.assertRaises(ErroServicoClassificador):
+            self.cliente.analisar("falha")
+        self.assertEqual(self.cliente.analisar("ok")["label_ia"], "OK") # A conexão continua usável
+
+    def test_servico_fora_do_ar(self):
+        cliente = ClienteServicoClassificador(f"unix:{os.path.join(self._pasta.name, 'nada.sock')}")
+        with self.assertRaises(ErroServicoClassificador):
+            cliente.analisar("oi")
+
+
+if __name__ == "__main__":
+    unittest.main()